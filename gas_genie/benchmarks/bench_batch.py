@@ -0,0 +1,116 @@
+"""A dashboard refresh: many /assist calls vs one /assist/batch request.
+
+Starts the server against local upstream stand-ins and answers --items
+distinct gas questions per refresh, either as separate /assist requests
+(at most --connections at a time, like a browser) or as one /assist/batch
+request. Reports the median refresh wall time, the slowest single item for
+comparison, and server CPU time per refresh.
+
+Run from the gas_genie directory:
+
+    python -m benchmarks.bench_batch --items 24 --refreshes 5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+
+import aiohttp
+
+from .bench_load import assist_request, free_port, process_cpu_seconds, start_app, wait_healthy
+from .fake_upstreams import ThreadedServer, create_etherscan_app, create_fireworks_app
+
+
+def prompts(items: int, refresh: int):
+    # Distinct per refresh so the response cache does not answer them
+    return [f"Should I send a swap now? (panel {i}, refresh {refresh})" for i in range(items)]
+
+
+async def separate(session: aiohttp.ClientSession, base_url: str, questions, connections: int) -> float:
+    semaphore = asyncio.Semaphore(connections)
+
+    async def ask(prompt: str):
+        async with semaphore:
+            result = await assist_request(session, base_url, prompt)
+            if not result.ok:
+                raise RuntimeError("request failed")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(prompt) for prompt in questions))
+    return time.perf_counter() - start
+
+
+async def batch(session: aiohttp.ClientSession, base_url: str, questions) -> float:
+    body = {"items": [{"id": str(i), "prompt": prompt} for i, prompt in enumerate(questions)]}
+    start = time.perf_counter()
+    done = set()
+    async with session.post(f"{base_url}/assist/batch", json=body) as response:
+        if response.status != 200:
+            raise RuntimeError(f"batch failed with {response.status}")
+        async for line in response.content:
+            if line.startswith(b"data: "):
+                event = json.loads(line[6:])
+                if event["type"] == "message" and event["content"].startswith("Error:"):
+                    raise RuntimeError(event["content"])
+                if event["type"] == "done" and "id" in event:
+                    done.add(event["id"])
+    if len(done) != len(questions):
+        raise RuntimeError(f"only {len(done)} of {len(questions)} items finished")
+    return time.perf_counter() - start
+
+
+async def main(args):
+    with ThreadedServer(create_etherscan_app(latency=args.etherscan_latency)) as etherscan, \
+            ThreadedServer(create_fireworks_app(ttft=args.ttft, tokens_per_second=args.tps,
+                                                max_tokens=args.tokens)) as fireworks:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        env = {
+            **os.environ,
+            "ETHERSCAN_API_KEY": "batch-test",
+            "FIREWORKS_API_KEY": "batch-test",
+            "ETHERSCAN_BASE_URL": f"{etherscan.base_url}/api",
+            "FIREWORKS_BASE_URL": f"{fireworks.base_url}/inference/v1",
+            "GAS_BACKEND": "etherscan",
+            "LOG_LEVEL": "WARNING",
+            "ASSIST_BATCH_CONCURRENCY": str(args.batch_concurrency),
+        }
+        env.pop("GAS_HISTORY_PATH", None)
+        server = start_app(env, port)
+        try:
+            await wait_healthy(base_url, server)
+            async with aiohttp.ClientSession() as session:
+                single = await separate(session, base_url, prompts(1, -1), 1)
+                for mode in ("separate", "batch"):
+                    walls = []
+                    cpu_before = process_cpu_seconds(server.pid)
+                    for refresh in range(args.refreshes):
+                        questions = prompts(args.items, refresh if mode == "batch" else refresh + args.refreshes)
+                        if mode == "batch":
+                            walls.append(await batch(session, base_url, questions))
+                        else:
+                            walls.append(await separate(session, base_url, questions, args.connections))
+                    cpu_after = process_cpu_seconds(server.pid)
+                    cpu = f"{(cpu_after - cpu_before) / args.refreshes * 1000:.0f} ms" if cpu_before is not None else "n/a"
+                    print(f"{mode:<9} {args.items} items  refresh p50 {statistics.median(walls) * 1000:>7.0f} ms  "
+                          f"(one item alone {single * 1000:.0f} ms)  server cpu/refresh {cpu}")
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=24)
+    parser.add_argument("--refreshes", type=int, default=5)
+    parser.add_argument("--connections", type=int, default=6, help="concurrent /assist requests, as a browser allows")
+    parser.add_argument("--batch-concurrency", type=int, default=8, help="ASSIST_BATCH_CONCURRENCY")
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--tps", type=float, default=100.0)
+    parser.add_argument("--tokens", type=int, default=30)
+    parser.add_argument("--etherscan-latency", type=float, default=0.05)
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,77 @@
+"""Per-call latency of Etherscan fetches: session-per-call vs the pooled session.
+
+Run from the gas_genie directory:
+
+    python -m benchmarks.bench_etherscan_client --calls 500
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+import aiohttp
+
+from src.gas_genie.providers.gas_price_provider import GasPriceProvider
+from src.gas_genie.scheduler import Scheduler, UpstreamScheduler
+from .fake_upstreams import create_etherscan_app, start_server
+
+
+def summarize(name: str, samples):
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    print(f"{name:<22} mean={statistics.mean(samples) * 1000:7.3f} ms  "
+          f"p50={p(0.50):7.3f} ms  p95={p(0.95):7.3f} ms  p99={p(0.99):7.3f} ms")
+
+
+async def session_per_call(url: str, calls: int):
+    """The previous behaviour: a fresh ClientSession (and TCP connection) per fetch."""
+    samples = []
+    params = {"module": "gastracker", "action": "gasoracle", "apikey": "bench"}
+    for _ in range(calls):
+        start = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, params=params) as response:
+                await response.json()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def pooled_session(url: str, calls: int):
+    """The provider's pooled keep-alive session (snapshot cache disabled, no rate limit)."""
+    scheduler = Scheduler({"etherscan": UpstreamScheduler("etherscan")})
+    provider = GasPriceProvider(api_key="bench", base_url=url, cache_ttl=0, stale_ttl=0, scheduler=scheduler)
+    await provider.start()
+    samples = []
+    try:
+        for _ in range(calls):
+            start = time.perf_counter()
+            await provider._fetch_gas_prices()
+            samples.append(time.perf_counter() - start)
+    finally:
+        await provider.close()
+    return samples
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated server latency in seconds")
+    args = parser.parse_args()
+
+    runner, base_url = await start_server(create_etherscan_app(latency=args.latency))
+    url = f"{base_url}/api"
+    try:
+        # Warm up both paths so imports and first-connection costs aren't measured
+        await session_per_call(url, 5)
+        await pooled_session(url, 5)
+
+        summarize("session per call", await session_per_call(url, args.calls))
+        summarize("pooled session", await pooled_session(url, args.calls))
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main())
@@ -0,0 +1,44 @@
+"""Block ingestion rate of the eth_feeHistory backend against a local JSON-RPC node.
+
+Backfills a range of blocks through GasPriceProvider (backend="rpc") for
+several batch sizes and reports blocks per second. Run from the gas_genie
+directory:
+
+    python -m benchmarks.bench_fee_history_ingest --blocks 20000 --batch-sizes 1 10 50
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from src.gas_genie.providers.gas_price_provider import GasPriceProvider
+from .fake_upstreams import create_jsonrpc_app, start_server
+
+
+async def main(args):
+    app = create_jsonrpc_app(latency=args.latency)
+    runner, base_url = await start_server(app)
+    try:
+        print(f"{'batch size':>10} {'blocks':>8} {'http reqs':>10} {'seconds':>8} {'blocks/s':>10}")
+        for batch_size in args.batch_sizes:
+            provider = GasPriceProvider(backend="rpc", rpc_url=f"{base_url}/", backfill_blocks=0)
+            provider.fee_history.batch_size = batch_size
+            await provider.start()
+            requests_before = app["state"]["requests"]
+            start = time.perf_counter()
+            blocks = await provider.backfill(args.blocks)
+            elapsed = time.perf_counter() - start
+            requests = app["state"]["requests"] - requests_before
+            print(f"{batch_size:>10} {blocks:>8} {requests:>10} {elapsed:>8.2f} {blocks / elapsed:>10.0f}")
+            await provider.close()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--blocks", type=int, default=20000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated node round trip (s)")
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,48 @@
+"""Time to first chunk and chunks per response for each model stream flush policy.
+
+Streams answers from a local Fireworks stand-in (sub-word tokens at a fixed
+rate after a fixed time to first token) through ModelProvider.query_stream
+under every policy in FLUSH_POLICIES, and reports what query_stream itself
+measures per policy. One untimed round under every policy comes first, so
+connection setup and first-call costs do not land on whichever policy runs
+first. Run from the gas_genie directory:
+
+    python -m benchmarks.bench_flush_policy
+"""
+import asyncio
+import logging
+
+from src.gas_genie.providers.model_provider import ModelProvider
+from src.gas_genie.providers.flush_policy import FLUSH_POLICIES
+from .fake_upstreams import ThreadedServer, create_fireworks_app
+
+TTFT = 0.1
+TOKENS_PER_SECOND = 100
+TOKENS = 150
+RESPONSES = 5
+
+
+async def main():
+    app = create_fireworks_app(ttft=TTFT, tokens_per_second=TOKENS_PER_SECOND, max_tokens=TOKENS)
+    with ThreadedServer(app) as fireworks:
+        model = ModelProvider(api_key="bench", base_url=f"{fireworks.base_url}/inference/v1")
+        print(f"{TOKENS} tokens at {TOKENS_PER_SECOND}/s after {TTFT * 1000:.0f} ms, {RESPONSES} responses per policy\n")
+        print(f"{'policy':<12} {'first chunk':>12} {'chunks':>8} {'chars/chunk':>12}")
+        for policy in FLUSH_POLICIES.values():
+            async for _ in model.query_stream("warm-up", casual=False, flush=policy):
+                pass
+        model.flush_stats.clear()
+        for name, policy in FLUSH_POLICIES.items():
+            chars = 0
+            for _ in range(RESPONSES):
+                async for chunk in model.query_stream("bench", casual=False, flush=policy):
+                    chars += len(chunk)
+            stats = model.stream_stats()[name]
+            chunks = stats["avg_chunks"]
+            print(f"{name:<12} {stats['avg_first_chunk_ms']:>9.1f} ms {chunks:>8.1f} "
+                  f"{chars / RESPONSES / chunks:>12.1f}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+"""Model time to first token with and without hedging, breaker and fallback.
+
+Runs ModelProvider.query_stream() against a local Fireworks stand-in whose
+first token is occasionally very late (--slow-rate of requests wait
+--slow-ttft seconds) and reports p50/p95/p99 time to first chunk, error
+counts and upstream requests per stream for each configuration:
+
+    baseline       no hedging, no fallback (the previous behaviour)
+    hedged         a duplicate request after --hedge-after seconds
+    primary_down   the primary model always fails, no fallback
+    fallback       the primary model always fails, fallback model and breaker
+
+It then checks that a long stream admitted before an outage does not close
+the primary's breaker when it finally succeeds.
+
+Run from the gas_genie directory:
+
+    python -m benchmarks.bench_hedging --requests 400 --concurrency 16
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+from src.gas_genie.providers.model_provider import ModelProvider
+from src.gas_genie.scheduler import Scheduler, UpstreamScheduler
+from .bench_load import summarize
+from .fake_upstreams import ThreadedServer, create_fireworks_app
+
+PRIMARY = "accounts/fireworks/models/deepseek-v3"
+FALLBACK = "accounts/fireworks/models/llama-v3p1-8b-instruct"
+CONFIGURATIONS = {
+    # name: (hedge, fallback models, primary fails)
+    "baseline": (False, [], False),
+    "hedged": (True, [], False),
+    "primary_down": (False, [], True),
+    "fallback": (True, [FALLBACK], True),
+}
+
+
+async def run(provider: ModelProvider, requests: int, concurrency: int):
+    ttfts = []
+    errors = 0
+    queue = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in queue:
+            start = time.perf_counter()
+            first = None
+            async for chunk in provider.query_stream("Should I send now?", casual=False):
+                if first is None:
+                    first = time.perf_counter() - start
+                    if chunk.startswith("Error:"):
+                        errors += 1
+                        first = None
+                        break
+            if first is not None:
+                ttfts.append(first)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return ttfts, errors
+
+
+async def stale_success_check() -> bool:
+    """True if a success admitted before the breaker opened leaves it open."""
+    failing = set()
+    app = create_fireworks_app(ttft=0.05, tokens_per_second=20, max_tokens=40, failing_models=failing)
+    with ThreadedServer(app) as server:
+        scheduler = Scheduler({"fireworks": UpstreamScheduler("fireworks")})
+        provider = ModelProvider(api_key="bench", base_url=f"{server.base_url}/inference/v1", scheduler=scheduler)
+        provider.model = PRIMARY
+        provider.fallback_models = []
+        provider.hedge_after = 0
+        breaker = provider._breaker(PRIMARY)
+        breaker.min_requests = 3
+        breaker.cooldown = 60
+
+        async def answer() -> str:
+            return "".join([chunk async for chunk in provider.query_stream("Should I send now?", casual=False)])
+
+        long_stream = asyncio.create_task(answer())  # About 2s of tokens
+        await asyncio.sleep(0.5)
+        failing.add(PRIMARY)  # The outage starts while it is streaming
+        for _ in range(breaker.min_requests):
+            await answer()
+        during = breaker.state
+        completed = not (await long_stream).startswith("Error:")
+        after = breaker.state
+    ok = during == "open" and completed and after == "open"
+    print(f"stale success  breaker {during} during the outage, {after} after an earlier stream completed "
+          f"-> {'ok' if ok else 'FAILED'}")
+    return ok
+
+
+async def main(args):
+    for name, (hedge, fallback_models, primary_fails) in CONFIGURATIONS.items():
+        app = create_fireworks_app(
+            ttft=args.ttft, tokens_per_second=args.tps, max_tokens=args.tokens,
+            slow_rate=args.slow_rate, slow_ttft=args.slow_ttft,
+            failing_models=(PRIMARY,) if primary_fails else ()
+        )
+        with ThreadedServer(app) as server:
+            # No upstream limits: the benchmark measures latency, not admission
+            scheduler = Scheduler({"fireworks": UpstreamScheduler("fireworks")})
+            provider = ModelProvider(api_key="bench", base_url=f"{server.base_url}/inference/v1", scheduler=scheduler)
+            provider.model = PRIMARY
+            provider.fallback_models = fallback_models
+            provider.hedge_after = args.hedge_after if hedge else 0
+            ttfts, errors = await run(provider, args.requests, args.concurrency)
+            upstream = app["state"]["requests"]
+            ttft = summarize(ttfts)
+            print(f"{name:<13} ttft p50/p95/p99 {ttft['p50']}/{ttft['p95']}/{ttft['p99']} ms  "
+                  f"errors {errors}/{args.requests}  upstream requests/stream {upstream / args.requests:.2f}  "
+                  f"breakers {[(m.rsplit('/', 1)[-1], s['state']) for m, s in provider.model_stats().items()]}")
+    return 0 if await stale_success_check() else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--ttft", type=float, default=0.1, help="usual time to first token, seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="fraction of requests with a late first token")
+    parser.add_argument("--slow-ttft", type=float, default=3.0, help="time to first token of the slow requests")
+    parser.add_argument("--hedge-after", type=float, default=0.3)
+    parser.add_argument("--tps", type=float, default=500.0)
+    parser.add_argument("--tokens", type=int, default=20)
+    logging.basicConfig(level=logging.ERROR)
+    sys.exit(asyncio.run(main(parser.parse_args())))
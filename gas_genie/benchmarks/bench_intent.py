@@ -0,0 +1,130 @@
+"""Query routing accuracy and cost, substring keywords vs the compiled intent classifier.
+
+Runs a labeled query set through the previous routing (substring keyword
+checks in GasGenie.assist and ModelProvider.is_casual_conversation) and
+through intent.classify. Reports routing accuracy, the share of queries
+answered from a template without a model call, and classification time per
+query. Run from the gas_genie directory:
+
+    python -m benchmarks.bench_intent
+"""
+import timeit
+
+from src.gas_genie.intent import classify
+
+# (query, expected intent)
+LABELED = [
+    ("hi", "casual"),
+    ("Hello there!", "casual"),
+    ("hey, how are you?", "casual"),
+    ("good morning", "casual"),
+    ("thanks for the help", "casual"),
+    ("who are you?", "casual"),
+    ("what can you do", "casual"),
+    ("bye", "casual"),
+    ("current gas price?", "gas_data"),
+    ("What is the gas price right now?", "gas_data"),
+    ("gas?", "gas_data"),
+    ("fast tier?", "gas_data"),
+    ("safe?", "gas_data"),
+    ("what's the fast tier now", "gas_data"),
+    ("what's the safe gas price", "gas_data"),
+    ("how much is standard gas in gwei", "gas_data"),
+    ("current base fee", "gas_data"),
+    ("gas congestion right now?", "gas_data"),
+    ("gwei now", "gas_data"),
+    # Congestion without a gas word goes to the model, with gas data
+    ("Is the network busy?", "gas"),
+    ("how congested is the network", "gas"),
+    ("Should I send my transaction now or wait?", "gas"),
+    ("should I send now?", "gas"),
+    ("is it better to wait?", "gas"),
+    ("When is the best time to send a swap to save on fees?", "gas"),
+    ("Will gas prices go down in the next hour?", "gas"),
+    ("My transaction is stuck, how do I speed it up?", "gas"),
+    ("How much fee should I pay for a swap?", "gas"),
+    ("Is it worth paying the fast gas price for an NFT mint?", "gas"),
+    ("what is the gas trend today", "gas"),
+    ("Can I cancel a pending tx?", "gas"),
+    # Conceptual gas questions need an explanation from the model, not the price template
+    ("what is gas?", "gas"),
+    ("what is a gas limit?", "gas"),
+    ("Explain EIP-1559 fees", "gas"),
+    ("what does gas mean in ethereum?", "gas"),
+    ("why are gas fees so high", "gas"),
+    ("how much gas does a swap use?", "gas"),
+    ("how does the base fee work?", "gas"),
+    ("are fees low", "gas"),
+    ("What is the price of bitcoin?", "general"),
+    ("Which wallet supports hardware keys?", "general"),
+    ("Explain what a smart contract is", "general"),
+    ("What is this thing called proof of stake?", "general"),
+    ("Tell me a joke about the weather", "general"),
+    ("How do rollups work?", "general"),
+    ("Write a short poem about mountains", "general"),
+    ("Why is the sky blue?", "general"),
+    ("What does the ethereum merge change for stakers?", "general"),
+    ("Should I learn Rust or Go?", "general"),
+    # Everyday uses of tier and network words must not get a gas template
+    ("what is the lightning network?", "general"),
+    ("what is a neural network?", "general"),
+    ("how busy is the mall today?", "general"),
+    ("quick question: what is a DAO?", "general"),
+    ("what is a low-level language?", "general"),
+    ("what's the average block time?", "general"),
+    ("what is normal?", "general"),
+    ("what is the tip of the day?", "general"),
+    ("what is the top tier university?", "general"),
+]
+
+GAS_KEYWORDS = ["gas", "price", "fee", "transaction", "send", "wait", "network", "congestion"]
+CASUAL_KEYWORDS = [
+    "hi", "hello", "hey", "good morning", "good afternoon", "good evening", "greetings",
+    "how are you", "what's up", "thanks", "thank you", "bye", "goodbye",
+    "who are you", "what can you do", "help", "tell me about yourself",
+    "thanks for the info", "thanks for the help", "goodjob", "how is your day going"
+]
+
+
+def legacy_route(query: str) -> str:
+    """Previous routing: substring checks, no template answers."""
+    lowered = query.lower()
+    if any(keyword in lowered for keyword in GAS_KEYWORDS):
+        return "gas"
+    if any(keyword in lowered for keyword in CASUAL_KEYWORDS):
+        return "casual"
+    return "general"
+
+
+def current_route(query: str) -> str:
+    return classify(query).name
+
+
+def coarse(intent: str) -> str:
+    """Both gas intents need gas data; the legacy router cannot tell them apart."""
+    return "gas" if intent == "gas_data" else intent
+
+
+def main():
+    print(f"{len(LABELED)} labeled queries\n")
+    print(f"{'router':<8} {'accuracy':>9} {'coarse':>8} {'template':>9} {'us/query':>9}")
+    for name, route in (("legacy", legacy_route), ("current", current_route)):
+        routed = [route(query) for query, _ in LABELED]
+        exact = sum(got == want for got, (_, want) in zip(routed, LABELED))
+        rough = sum(coarse(got) == coarse(want) for got, (_, want) in zip(routed, LABELED))
+        templated = sum(got == "gas_data" for got in routed)
+        per_query = min(timeit.repeat(
+            lambda: [route(query) for query, _ in LABELED], number=200, repeat=5
+        )) / (200 * len(LABELED)) * 1e6
+        print(f"{name:<8} {exact / len(LABELED):>8.0%} {rough / len(LABELED):>8.0%} "
+              f"{templated / len(LABELED):>8.0%} {per_query:>9.2f}")
+
+    misses = [(query, want, current_route(query)) for query, want in LABELED if current_route(query) != want]
+    if misses:
+        print("\nmisrouted by the classifier:")
+        for query, want, got in misses:
+            print(f"  {query!r}: expected {want}, got {got}")
+
+
+if __name__ == "__main__":
+    main()
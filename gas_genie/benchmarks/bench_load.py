@@ -0,0 +1,308 @@
+"""End-to-end load test of the Gas Genie server against local upstream stand-ins.
+
+Starts the fake Etherscan and Fireworks servers in this process, runs the
+real app under uvicorn in a subprocess pointed at them, and drives it with
+closed-loop clients at each requested concurrency. For every scenario and
+concurrency it reports throughput, p50/p95/p99 time to first byte (first SSE
+message for /assist) and total latency, error counts, and server CPU time
+per request (Linux only, read from /proc). Results are written as JSON so
+runs can be compared across commits. Run from the gas_genie directory:
+
+    python -m benchmarks.bench_load
+    python -m benchmarks.bench_load --scenarios assist --concurrency 1,16,64 --ttft 0.3 --error-rate 0.05
+    python -m benchmarks.bench_load --unique-queries --output /tmp/load.json
+    python -m benchmarks.bench_load --scenarios gas,assist_data --workers 4
+
+Scenarios:
+    assist       POST /assist with gas questions (SSE)
+    assist_data  POST /assist with direct data questions answered from templates
+    gas          GET /v1/gas
+    gas_304      GET /v1/gas with If-None-Match
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List, Optional
+
+import aiohttp
+
+from .fake_upstreams import ThreadedServer, create_etherscan_app, create_fireworks_app
+
+ASSIST_QUERIES = [
+    "Should I send my transaction now or wait?",
+    "How much fee should I pay for a swap?",
+    "Will gas prices go down in the next hour?",
+    "Is it worth paying the fast gas price for an NFT mint?",
+]
+DATA_QUERIES = ["current gas price?", "fast tier?", "base fee now", "is the network busy?"]
+SCENARIOS = ("assist", "assist_data", "gas", "gas_304")
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of values (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples: List[float]) -> Dict[str, Optional[float]]:
+    return {f"p{p}": round(percentile(samples, p) * 1000, 3) if samples else None for p in (50, 95, 99)}
+
+
+def process_cpu_seconds(pid: int) -> Optional[float]:
+    """User + system CPU time of a process and its live children, from /proc (None where unavailable)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        total = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except (OSError, IndexError, ValueError):
+        return None
+    # uvicorn workers run as child processes
+    return total + sum(process_cpu_seconds(child) or 0.0 for child in children)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Result:
+    __slots__ = ("ok", "ttfb", "latency")
+
+    def __init__(self, ok: bool, ttfb: Optional[float], latency: float):
+        self.ok = ok
+        self.ttfb = ttfb
+        self.latency = latency
+
+
+async def assist_request(session: aiohttp.ClientSession, base_url: str, prompt: str) -> Result:
+    start = time.perf_counter()
+    ttfb = None
+    ok = True
+    body = {"query": {"prompt": prompt, "id": "load"}}
+    async with session.post(f"{base_url}/assist", json=body) as response:
+        if response.status != 200:
+            await response.read()
+            return Result(False, None, time.perf_counter() - start)
+        buffer = b""
+        async for data in response.content.iter_any():
+            buffer += data
+            while b"\n\n" in buffer:
+                frame, buffer = buffer.split(b"\n\n", 1)
+                if not frame.startswith(b"data: "):
+                    continue
+                event = json.loads(frame[6:])
+                if event["type"] == "message":
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - start
+                    if event["content"].startswith("Error:"):
+                        ok = False
+                elif event["type"] == "error":
+                    ok = False
+    return Result(ok and ttfb is not None, ttfb, time.perf_counter() - start)
+
+
+async def gas_request(session: aiohttp.ClientSession, base_url: str, etag: Optional[str]) -> Result:
+    start = time.perf_counter()
+    headers = {"If-None-Match": etag} if etag else {}
+    async with session.get(f"{base_url}/v1/gas", headers=headers) as response:
+        ttfb = time.perf_counter() - start
+        await response.read()
+        ok = response.status == 200 or (etag is not None and response.status == 304)
+    return Result(ok, ttfb, time.perf_counter() - start)
+
+
+async def run_level(base_url: str, scenario: str, concurrency: int, duration: float,
+                    unique_queries: bool, server_pid: int) -> Dict[str, Any]:
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=120)
+    results: List[Result] = []
+    counter = 0
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        etag = None
+        if scenario == "gas_304":
+            async with session.get(f"{base_url}/v1/gas") as response:
+                etag = response.headers.get("ETag")
+
+        async def worker(deadline: float):
+            nonlocal counter
+            while time.perf_counter() < deadline:
+                counter += 1
+                try:
+                    if scenario in ("assist", "assist_data"):
+                        queries = ASSIST_QUERIES if scenario == "assist" else DATA_QUERIES
+                        prompt = queries[counter % len(queries)]
+                        if unique_queries:
+                            prompt = f"{prompt} (request {counter})"
+                        results.append(await assist_request(session, base_url, prompt))
+                    else:
+                        results.append(await gas_request(session, base_url, etag))
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    results.append(Result(False, None, 0.0))
+
+        cpu_before = process_cpu_seconds(server_pid)
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(started + duration) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        cpu_after = process_cpu_seconds(server_pid)
+
+    completed = [r for r in results if r.ok]
+    cpu_per_request = None
+    if cpu_before is not None and cpu_after is not None and results:
+        cpu_per_request = round((cpu_after - cpu_before) / len(results) * 1000, 3)
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(completed),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(completed) / elapsed, 2),
+        "ttfb_ms": summarize([r.ttfb for r in completed]),
+        "latency_ms": summarize([r.latency for r in completed]),
+        "server_cpu_ms_per_request": cpu_per_request,
+    }
+
+
+def start_app(env: Dict[str, str], port: int, workers: int = 1) -> subprocess.Popen:
+    """Start the server through its own entry point (LOG_LEVEL in env silences access logs)."""
+    env = {**env, "HOST": "127.0.0.1", "PORT": str(port), "GAS_WORKERS": str(workers)}
+    command = [sys.executable, "-m", "src.gas_genie.main"]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+async def wait_healthy(base_url: str, server: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited: {server.stderr.read().decode()[-2000:]}")
+            try:
+                async with session.get(f"{base_url}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not become healthy")
+
+
+async def main(args: argparse.Namespace):
+    fireworks_app = create_fireworks_app(
+        ttft=args.ttft, tokens_per_second=args.tokens_per_second,
+        max_tokens=args.max_tokens, error_rate=args.error_rate
+    )
+    with ThreadedServer(create_etherscan_app(latency=args.etherscan_latency)) as etherscan, \
+            ThreadedServer(fireworks_app) as fireworks:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        env = {
+            **os.environ,
+            "ETHERSCAN_API_KEY": "load-test",
+            "FIREWORKS_API_KEY": "load-test",
+            "ETHERSCAN_BASE_URL": f"{etherscan.base_url}/api",
+            "FIREWORKS_BASE_URL": f"{fireworks.base_url}/inference/v1",
+            "GAS_BACKEND": "etherscan",
+            "LOG_LEVEL": "WARNING",
+        }
+        env.pop("GAS_HISTORY_PATH", None)
+        if args.no_cache:
+            env["RESPONSE_CACHE_TTL"] = "0"
+        shared_dir = None
+        if args.workers > 1:
+            shared_dir = tempfile.mkdtemp(prefix="gas-genie-load-")
+            env["GAS_SHARED_DIR"] = shared_dir
+        server = start_app(env, port, args.workers)
+        try:
+            await wait_healthy(base_url, server)
+            levels = []
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    level = await run_level(base_url, scenario, concurrency, args.duration,
+                                            args.unique_queries, server.pid)
+                    levels.append(level)
+                    print(f"{scenario:<12} c={concurrency:<4} {level['throughput_rps']:>9.1f} req/s  "
+                          f"ttfb p50/p95/p99 {level['ttfb_ms']['p50']}/{level['ttfb_ms']['p95']}/{level['ttfb_ms']['p99']} ms  "
+                          f"latency p50/p95/p99 {level['latency_ms']['p50']}/{level['latency_ms']['p95']}/{level['latency_ms']['p99']} ms  "
+                          f"errors {level['errors']}/{level['requests']}  "
+                          f"cpu {level['server_cpu_ms_per_request']} ms/req")
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+            if shared_dir:
+                shutil.rmtree(shared_dir, ignore_errors=True)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "duration_seconds": args.duration,
+            "workers": args.workers,
+            "ttft": args.ttft,
+            "tokens_per_second": args.tokens_per_second,
+            "max_tokens": args.max_tokens,
+            "error_rate": args.error_rate,
+            "etherscan_latency": args.etherscan_latency,
+            "unique_queries": args.unique_queries,
+            "response_cache": not args.no_cache,
+        },
+        "results": levels,
+    }
+    output = args.output or os.path.join("benchmarks", "results", f"load-{report['revision'] or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {output}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=["assist", "gas"],
+                        help=f"comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 8, 32],
+                        help="comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario and concurrency")
+    parser.add_argument("--ttft", type=float, default=0.2, help="fake model time to first token, seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--max-tokens", type=int, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of model requests that fail")
+    parser.add_argument("--etherscan-latency", type=float, default=0.05)
+    parser.add_argument("--unique-queries", action="store_true",
+                        help="make every prompt distinct, defeating the response cache and coalescing")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache in the server")
+    parser.add_argument("--workers", type=int, default=1, help="server worker processes sharing one gas snapshot")
+    parser.add_argument("--output", help="JSON report path (default benchmarks/results/load-<revision>.json)")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,82 @@
+"""Concurrent LLM streaming throughput: blocking iteration vs the async stream.
+
+Drives N concurrent ModelProvider.query_stream() calls against a local
+Fireworks stand-in and reports wall time, aggregate throughput and the
+worst event-loop stall observed while streaming. Run from the gas_genie
+directory:
+
+    python -m benchmarks.bench_model_streaming --concurrency 1 4 16 64
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from src.gas_genie.providers.model_provider import ModelProvider
+from .fake_upstreams import ThreadedServer, create_fireworks_app
+
+
+async def legacy_stream(provider: ModelProvider, prompt: str):
+    """The previous implementation: synchronous iteration inside an async generator."""
+    completion = provider.client.chat.completions.create(
+        model=provider.model,
+        messages=[{"role": "user", "content": prompt}],
+        stream=True,
+        max_tokens=provider.max_tokens
+    )
+    for chunk in completion:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Return the largest delay seen by a ticker that should wake every interval."""
+    worst = 0.0
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        worst = max(worst, loop.time() - start - interval)
+    return worst
+
+
+async def run(stream_factory, concurrency: int):
+    async def consume():
+        chars = 0
+        async for chunk in stream_factory():
+            chars += len(chunk)
+        return chars
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(consume() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, sum(results), await lag_task
+
+
+async def main(args):
+    app = create_fireworks_app(ttft=args.ttft, tokens_per_second=args.tps, max_tokens=args.tokens)
+    with ThreadedServer(app) as server:
+        provider = ModelProvider(api_key="bench", base_url=f"{server.base_url}/inference/v1")
+        prompt = "Should I send my transaction now?"
+        modes = {
+            "blocking": lambda: legacy_stream(provider, prompt),
+            "async": lambda: provider.query_stream(prompt),
+        }
+        print(f"{'mode':<9} {'N':>4} {'wall s':>8} {'streams/s':>10} {'chars/s':>10} {'max loop lag ms':>16}")
+        for name, factory in modes.items():
+            for n in args.concurrency:
+                elapsed, chars, lag = await run(factory, n)
+                print(f"{name:<9} {n:>4} {elapsed:>8.2f} {n / elapsed:>10.2f} {chars / elapsed:>10.0f} {lag * 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--ttft", type=float, default=0.2, help="fake time to first token (s)")
+    parser.add_argument("--tps", type=float, default=200.0, help="fake tokens per second per stream")
+    parser.add_argument("--tokens", type=int, default=100, help="tokens per response")
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,113 @@
+"""Prompt construction cost and cacheable prefix, before and after per-snapshot rendering.
+
+For a set of different user queries against one gas snapshot, compares the
+previous layout (data block and query interleaved in one user message, built
+per request) with the current one (system prompt + pre-rendered snapshot
+block, then the query). Reports build time per request, the byte-identical
+prefix shared by all requests, and prompt tokens reported by a local
+Fireworks stand-in. Run from the gas_genie directory:
+
+    python -m benchmarks.bench_prompt_prefix
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import timeit
+
+from src.gas_genie.gas_genie import GasGenie
+from src.gas_genie.prompts import GAS_QUERY_TEMPLATE
+from .fake_upstreams import ThreadedServer, create_etherscan_app, create_fireworks_app
+
+QUERIES = [
+    "What gas price should I use right now?",
+    "Should I send my transaction now or wait?",
+    "Is the network congested enough that I should wait?",
+    "How much fee should I pay for a swap?",
+    "Will gas prices go down in the next hour?",
+]
+
+
+def legacy_prompt(gas_data, query: str) -> str:
+    """The per-request f-string the agent used to build."""
+    current_prices = gas_data["current_prices"]
+    price_trend = gas_data["price_trend"]
+    network_metrics = gas_data["network_metrics"]
+    return f"""Current gas prices and network conditions:
+- Safe: {current_prices.get('safe', 'N/A')} Gwei
+- Propose: {current_prices.get('propose', 'N/A')} Gwei
+- Fast: {current_prices.get('fast', 'N/A')} Gwei
+- Base Fee: {current_prices.get('suggested_base_fee', 'N/A')} Gwei
+
+Network Status:
+- Base Fee: {network_metrics.get('base_fee', 'N/A')} Gwei
+- Gas Used Ratio: {network_metrics.get('gas_used_ratio', 'N/A')}
+- Congestion Level: {network_metrics.get('congestion_level', 'N/A')}
+
+Price Trend:
+- Trend: {price_trend.get('trend', 'unknown')}
+- Change: {price_trend.get('change_percentage', 0):.2f}%
+- Current Price: {price_trend.get('current_price', 'N/A')} Gwei
+- Previous Price: {price_trend.get('previous_price', 'N/A')} Gwei
+
+Recommendation:
+- Suggested Action: {gas_data.get('suggestion', 'monitor')}
+- Recommended Price: {gas_data.get('recommended_price', 'N/A')} Gwei
+- Confidence: {gas_data.get('confidence', 0) * 100:.1f}%
+
+User query: {query}
+
+Please provide a detailed analysis and recommendation based on the above data. Consider:
+1. Current network conditions and their impact
+2. Price trends and their implications
+3. Specific recommendations for the user's query
+4. Alternative options if applicable
+5. Any risks or considerations to be aware of"""
+
+
+def shared_prefix(payloads) -> int:
+    prefix = os.path.commonprefix(payloads)
+    return len(prefix.encode())
+
+
+async def main():
+    with ThreadedServer(create_etherscan_app()) as etherscan, ThreadedServer(create_fireworks_app(ttft=0, tokens_per_second=0, max_tokens=5)) as fireworks:
+        os.environ.setdefault("ETHERSCAN_API_KEY", "bench")
+        os.environ.setdefault("FIREWORKS_API_KEY", "bench")
+        os.environ["ETHERSCAN_BASE_URL"] = f"{etherscan.base_url}/api"
+        os.environ["FIREWORKS_BASE_URL"] = f"{fireworks.base_url}/inference/v1"
+        agent = GasGenie("bench")
+        model = agent.model_provider
+        gas_data = await agent.get_gas_data()
+        system = {"role": "system", "content": model.system_prompt}
+
+        def legacy_messages(query):
+            return [system, {"role": "user", "content": legacy_prompt(gas_data, query)}]
+
+        _, context = await agent.get_gas_context()
+
+        def current_messages(query):
+            return [system, {"role": "system", "content": f"Context: {context}"},
+                    {"role": "user", "content": GAS_QUERY_TEMPLATE.format(query=query)}]
+
+        for name, build in (("legacy", legacy_messages), ("current", current_messages)):
+            per_request = min(timeit.repeat(lambda: build(QUERIES[0]), number=5000, repeat=5)) / 5000 * 1e6
+            payloads = [json.dumps(build(q)) for q in QUERIES]
+            print(f"{name:<8} build {per_request:6.2f} us/request   shared prefix {shared_prefix(payloads):5d} of "
+                  f"{len(payloads[0].encode()):5d} bytes")
+
+        # Prompt tokens as reported in the stream's usage block
+        model.usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        start = time.perf_counter()
+        for query in QUERIES:
+            async for _ in agent.assist(query, "bench"):
+                pass
+        print(f"assist   {len(QUERIES)} requests in {time.perf_counter() - start:.2f}s, "
+              f"{model.usage['prompt_tokens'] / max(model.usage['requests'], 1):.0f} prompt tokens/request")
+        await agent.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""Micro-benchmark of the recommendation engine.
+
+Times the pure recommend() function, the analytics it consumes, and the
+memoized per-snapshot path used by request handlers. Run from the gas_genie
+directory:
+
+    python -m benchmarks.bench_recommendation --requests 1000
+"""
+import argparse
+import logging
+import random
+import time
+import timeit
+
+from src.gas_genie import recommendation
+from src.gas_genie.analytics import compute_analytics
+from src.gas_genie.price_history import PriceHistory
+from src.gas_genie.providers.gas_price_provider import GasPriceProvider, GasSnapshot
+
+
+def sample(i: int):
+    propose = 20 + random.uniform(-2, 2)
+    return {
+        "safe": propose * 0.9, "propose": propose, "fast": propose * 1.2,
+        "suggested_base_fee": propose * 0.85, "gas_used_ratio": [random.random() for _ in range(5)],
+        "last_block": 19_000_000 + i, "timestamp": time.time() - 12 * (300 - i)
+    }
+
+
+def per_call(stmt, number: int) -> float:
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+
+def main(args):
+    history = PriceHistory(capacity=1000)
+    for i in range(300):
+        history.append(sample(i))
+    prices = history[-1]
+    analytics = compute_analytics(history, version=1)
+
+    print(f"recommend() (pure)          {per_call(lambda: recommendation.recommend(1, prices, analytics), 20000):8.2f} us/call")
+    print(f"compute_analytics() (300)   {per_call(lambda: compute_analytics(history, version=1), 2000):8.2f} us/call")
+
+    provider = GasPriceProvider(api_key="bench")
+    provider.price_history = history
+    provider._snapshot = GasSnapshot(1, prices, time.monotonic())
+    calls = {"recommend": 0}
+    original = recommendation.recommend
+
+    def counting_recommend(*a, **kw):
+        calls["recommend"] += 1
+        return original(*a, **kw)
+
+    import src.gas_genie.providers.gas_price_provider as gas_price_provider
+    gas_price_provider.recommend = counting_recommend
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        provider.get_recommendation(provider._snapshot).to_dict()
+    elapsed = time.perf_counter() - start
+    gas_price_provider.recommend = original
+    print(f"memoized, {args.requests} requests      {elapsed / args.requests * 1e6:8.2f} us/request, "
+          f"recommend() ran {calls['recommend']} time(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    logging.basicConfig(level=logging.WARNING)
+    main(parser.parse_args())
@@ -0,0 +1,81 @@
+"""SSE streaming cost per response, per-chunk JSON and DEBUG logging vs the SSE layer.
+
+Streams simulated model responses (small chunks arriving in bursts, as they
+do from the upstream) through the previous generate_response loop, which
+encoded every chunk twice and logged at DEBUG, and through sse.sse_frames,
+which coalesces chunks and encodes them with a preencoded frame template.
+Reports CPU time per response and frames per response. Run from the
+gas_genie directory:
+
+    python -m benchmarks.bench_sse_encoding
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+
+from src.gas_genie.sse import sse_frames
+
+CHUNKS = 300          # chunks per response
+BURST = 3             # chunks delivered per network read
+READ_INTERVAL = 0.003  # seconds between reads
+CONCURRENCY = 20
+
+logger = logging.getLogger("bench.sse")
+
+
+async def model_stream():
+    for i in range(CHUNKS):
+        if i % BURST == 0:
+            await asyncio.sleep(READ_INTERVAL)
+        yield f"tok{i} "
+
+
+async def legacy_frames(source):
+    """The loop main.generate_response used to run."""
+    try:
+        async for chunk in source:
+            logger.debug(f"Received chunk from agent: {chunk[:50]}...")
+            if not chunk or not isinstance(chunk, str):
+                continue
+            event_data = {"type": "message", "content": chunk}
+            logger.debug(f"Sending event: {json.dumps(event_data)}")
+            yield f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
+    finally:
+        yield f"data: {json.dumps({'type': 'done', 'content': ''}, ensure_ascii=False)}\n\n"
+
+
+async def run(name, frames_for, level):
+    logger.setLevel(level)
+    logging.getLogger("src.gas_genie").setLevel(level)
+
+    async def one():
+        frames = 0
+        async for frame in frames_for(model_stream()):
+            frames += 1
+        return frames
+
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    frames = await asyncio.gather(*(one() for _ in range(CONCURRENCY)))
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    print(f"{name:<26} {cpu / CONCURRENCY * 1e3:7.2f} ms CPU/response   "
+          f"{sum(frames) / CONCURRENCY:6.1f} frames/response   {wall:.2f}s wall")
+
+
+async def main():
+    # Log records go nowhere, so only formatting and dispatch are measured
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logging.getLogger().addHandler(handler)
+    print(f"{CONCURRENCY} concurrent responses of {CHUNKS} chunks\n")
+    await run("legacy (DEBUG)", legacy_frames, logging.DEBUG)
+    await run("legacy (INFO)", legacy_frames, logging.INFO)
+    await run("sse_frames, no coalescing", lambda source: sse_frames(source, flush_interval=0), logging.INFO)
+    await run("sse_frames, 20 ms window", lambda source: sse_frames(source, flush_interval=0.02), logging.INFO)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
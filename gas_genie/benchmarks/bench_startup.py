@@ -0,0 +1,140 @@
+"""Cold-start time of the server, as Cloud Run sees it.
+
+Prints the import-time breakdown of src.gas_genie.main per top-level
+package (from python -X importtime), then starts the server --runs times
+against local upstream stand-ins and reports the median time from spawn to
+the first healthy /health response and to the first /v1/gas 200, plus the
+startup milestones the app records in /stats. Exits with status 1 when the
+median time to healthy exceeds --budget seconds, so it can gate CI.
+
+Run from the gas_genie directory:
+
+    python -m benchmarks.bench_startup --runs 5 --budget 2
+    python -m benchmarks.bench_startup --mode eager
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Any
+
+import aiohttp
+
+from .bench_load import free_port, start_app
+from .fake_upstreams import ThreadedServer, create_etherscan_app, create_fireworks_app
+
+MODULE = "src.gas_genie.main"
+
+
+def import_breakdown(env: Dict[str, str], top: int = 12):
+    """Import time in ms of MODULE, attributed to each top-level package by self time."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {MODULE}"],
+                            env=env, capture_output=True, text=True, check=True)
+    totals = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if not own.strip().isdigit():
+            continue  # Header line
+        name = name.strip()
+        package = ".".join(name.split(".")[:3]) if name.startswith("src.") else name.split(".")[0]
+        totals[package] += int(own) / 1000
+    total = sum(totals.values())
+    print(f"import {MODULE}: {total:.0f} ms")
+    for package, ms in sorted(totals.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<28} {ms:>7.1f} ms")
+
+
+async def measure(env: Dict[str, str], timeout: float) -> Dict[str, Any]:
+    """Spawn the server once; seconds to healthy and to first gas data, and its startup profile."""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = start_app(env, port)
+    healthy = gas = None
+    try:
+        async with aiohttp.ClientSession() as session:
+            while time.perf_counter() - started < timeout:
+                if server.poll() is not None:
+                    raise RuntimeError(f"Server exited: {server.stderr.read().decode()[-2000:]}")
+                try:
+                    if healthy is None:
+                        async with session.get(f"{base_url}/health") as response:
+                            if response.status == 200:
+                                healthy = time.perf_counter() - started
+                    if healthy is not None:
+                        async with session.get(f"{base_url}/v1/gas") as response:
+                            if response.status == 200:
+                                gas = time.perf_counter() - started
+                                break
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.01)
+            if gas is None:
+                raise RuntimeError("Server did not serve gas data in time")
+            profile = {}
+            for _ in range(100):  # Warm-up runs after /health, so wait for its last milestone
+                async with session.get(f"{base_url}/stats") as response:
+                    profile = (await response.json()).get("startup_ms", {})
+                if "prewarmed" in profile:
+                    break
+                await asyncio.sleep(0.05)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return {"healthy": healthy, "gas": gas, "profile": profile}
+
+
+async def main(args) -> int:
+    with ThreadedServer(create_etherscan_app(latency=args.etherscan_latency)) as etherscan, \
+            ThreadedServer(create_fireworks_app()) as fireworks:
+        env = {
+            **os.environ,
+            "ETHERSCAN_API_KEY": "startup-test",
+            "FIREWORKS_API_KEY": "startup-test",
+            "ETHERSCAN_BASE_URL": f"{etherscan.base_url}/api",
+            "FIREWORKS_BASE_URL": f"{fireworks.base_url}/inference/v1",
+            "GAS_BACKEND": "etherscan",
+            "LOG_LEVEL": "WARNING",
+            "STARTUP_MODE": args.mode,
+        }
+        for name in ("GAS_HISTORY_PATH", "GAS_SHARED_DIR"):
+            env.pop(name, None)
+        import_breakdown(env)
+
+        runs = []
+        for _ in range(args.runs):
+            runs.append(await measure(env, args.timeout))
+    healthy = statistics.median(run["healthy"] for run in runs)
+    gas = statistics.median(run["gas"] for run in runs)
+    milestones = defaultdict(list)
+    for run in runs:
+        for milestone, ms in run["profile"].items():
+            milestones[milestone].append(ms)
+    print(f"\n{args.runs} cold starts, STARTUP_MODE={args.mode}")
+    print(f"  spawn to healthy     {healthy * 1000:>7.0f} ms (median)")
+    print(f"  spawn to gas data    {gas * 1000:>7.0f} ms (median)")
+    for milestone, values in milestones.items():
+        print(f"  in-process {milestone:<12} {statistics.median(values):>7.0f} ms (median)")
+    if healthy > args.budget:
+        print(f"\nFAIL: median time to healthy {healthy:.2f}s exceeds the {args.budget:.2f}s budget")
+        return 1
+    print(f"\nOK: within the {args.budget:.2f}s budget")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds from spawn to healthy (median)")
+    parser.add_argument("--mode", choices=("background", "eager"), default="background", help="STARTUP_MODE")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--etherscan-latency", type=float, default=0.05)
+    logging.basicConfig(level=logging.ERROR)
+    sys.exit(asyncio.run(main(parser.parse_args())))
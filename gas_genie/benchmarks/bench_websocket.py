@@ -0,0 +1,120 @@
+"""Idle WebSocket sessions per worker: memory, idle CPU and gas update fan-out.
+
+Starts the server against local upstream stand-ins with a short gas poll
+interval, opens --sessions WebSocket sessions that only listen, and reports
+server memory per session, server CPU while the sessions sit idle, and for
+each pushed gas update how long it took to reach the first and the last
+session after the first one saw it.
+
+Run from the gas_genie directory:
+
+    python -m benchmarks.bench_websocket --sessions 2000 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+from collections import defaultdict
+from typing import Optional
+
+import aiohttp
+
+from .bench_load import free_port, process_cpu_seconds, start_app, wait_healthy
+from .fake_upstreams import ThreadedServer, create_etherscan_app, create_fireworks_app
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """Resident memory of a process, from /proc (None where unavailable)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+async def listen(session: aiohttp.ClientSession, url: str, received, opened: list, target: int, ready: asyncio.Event):
+    async with session.ws_connect(url, heartbeat=None) as ws:
+        opened.append(ws)
+        if len(opened) == target:
+            ready.set()
+        async for message in ws:
+            event = json.loads(message.data)
+            if event["type"] == "gas_delta":
+                received[event["content"]["version"]].append(time.perf_counter())
+
+
+async def main(args):
+    with ThreadedServer(create_etherscan_app(latency=args.etherscan_latency)) as etherscan, \
+            ThreadedServer(create_fireworks_app()) as fireworks:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        env = {
+            **os.environ,
+            "ETHERSCAN_API_KEY": "ws-test",
+            "FIREWORKS_API_KEY": "ws-test",
+            "ETHERSCAN_BASE_URL": f"{etherscan.base_url}/api",
+            "FIREWORKS_BASE_URL": f"{fireworks.base_url}/inference/v1",
+            "GAS_BACKEND": "etherscan",
+            "LOG_LEVEL": "WARNING",
+            "GAS_POLL_INTERVAL": str(args.poll_interval),
+            "GAS_CACHE_TTL": str(args.poll_interval),
+        }
+        env.pop("GAS_HISTORY_PATH", None)
+        server = start_app(env, port)
+        try:
+            await wait_healthy(base_url, server)
+            received = defaultdict(list)
+            connector = aiohttp.TCPConnector(limit=0)
+            async with aiohttp.ClientSession(connector=connector) as session:
+                rss_before = rss_bytes(server.pid)
+                ready = asyncio.Event()
+                opened = []
+                started = time.perf_counter()
+                listeners = [asyncio.create_task(listen(session, f"{base_url}/ws", received, opened, args.sessions, ready))
+                             for _ in range(args.sessions)]
+                await asyncio.wait_for(ready.wait(), args.timeout)
+                connect_time = time.perf_counter() - started
+                await asyncio.sleep(1)  # Let the initial "gas" events go out
+                received.clear()
+                rss_after = rss_bytes(server.pid)
+                cpu_before = process_cpu_seconds(server.pid)
+                await asyncio.sleep(args.duration)
+                cpu_after = process_cpu_seconds(server.pid)
+                for listener in listeners:
+                    listener.cancel()
+                await asyncio.gather(*listeners, return_exceptions=True)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    print(f"{args.sessions} sessions connected in {connect_time:.2f}s")
+    if rss_before is not None:
+        print(f"server memory   {(rss_after - rss_before) / args.sessions / 1024:.1f} KiB per session "
+              f"({rss_after / 2**20:.0f} MiB total)")
+    if cpu_before is not None:
+        print(f"server cpu      {(cpu_after - cpu_before) / args.duration * 100:.1f}% of a core while idle "
+              f"(gas updates every {args.poll_interval:g}s)")
+    complete = {version: times for version, times in received.items() if len(times) == args.sessions}
+    spreads = [(max(times) - min(times)) * 1000 for times in complete.values()]
+    if spreads:
+        print(f"gas updates     {len(complete)} reached every session; first to last session "
+              f"p50 {statistics.median(spreads):.0f} ms, max {max(spreads):.0f} ms")
+    else:
+        print("gas updates     none reached every session")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--duration", type=float, default=10.0, help="idle seconds to measure")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="GAS_POLL_INTERVAL for the server")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--etherscan-latency", type=float, default=0.05)
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(main(parser.parse_args()))
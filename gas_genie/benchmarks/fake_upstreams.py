@@ -0,0 +1,211 @@
+"""Local stand-ins for the upstream services Gas Genie talks to.
+
+These run in-process on 127.0.0.1 so benchmarks are reproducible and never
+touch the real Etherscan or Fireworks APIs.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from aiohttp import web
+
+
+def create_etherscan_app(latency: float = 0.0) -> web.Application:
+    """Build an aiohttp app that mimics Etherscan's gastracker/gasoracle endpoint."""
+    state = {"requests": 0, "block": 19_000_000}
+
+    async def api(request: web.Request) -> web.Response:
+        state["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if request.query.get("action") != "gasoracle":
+            return web.json_response({"status": "0", "message": "NOTOK", "result": "Unknown action"})
+        state["block"] += 1
+        propose = round(random.uniform(10, 30), 2)
+        ratios = ",".join(f"{random.uniform(0.3, 1.0):.6f}" for _ in range(5))
+        return web.json_response({
+            "status": "1",
+            "message": "OK",
+            "result": {
+                "LastBlock": str(state["block"]),
+                "SafeGasPrice": str(round(propose * 0.9, 2)),
+                "ProposeGasPrice": str(propose),
+                "FastGasPrice": str(round(propose * 1.2, 2)),
+                "suggestBaseFee": str(round(propose * 0.85, 6)),
+                "gasUsedRatio": ratios
+            }
+        })
+
+    app = web.Application()
+    app["state"] = state
+    app.router.add_get("/api", api)
+    return app
+
+
+def create_fireworks_app(
+    ttft: float = 0.2,
+    tokens_per_second: float = 200.0,
+    max_tokens: int = 200,
+    error_rate: float = 0.0,
+    slow_rate: float = 0.0,
+    slow_ttft: float = 5.0,
+    failing_models: tuple = ()
+) -> web.Application:
+    """Build an aiohttp app that streams OpenAI-style chat completion chunks over SSE.
+
+    ttft is the delay before the first token, tokens_per_second the steady
+    generation rate, and error_rate the fraction of requests answered with a 500.
+    A slow_rate fraction of requests waits slow_ttft instead of ttft (a latency
+    tail), and requests for any of failing_models always get a 500.
+    """
+    state = {"requests": 0, "errors": 0, "tokens": 0, "models": {}}
+    # Sub-word tokens carrying their leading space, as BPE models emit them
+    words = (" gas", " is", " low", " right", " now,", " so", " send", " your", " trans", "action.")
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        state["requests"] += 1
+        body = await request.json()
+        model = body.get("model", "fake")
+        state["models"][model] = state["models"].get(model, 0) + 1
+        if model in failing_models or random.random() < error_rate:
+            state["errors"] += 1
+            return web.json_response({"error": {"message": "injected failure"}}, status=500)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        created = int(time.time())
+        n_tokens = min(int(body.get("max_tokens") or max_tokens), max_tokens)
+        try:
+            await asyncio.sleep(slow_ttft if random.random() < slow_rate else ttft)
+            interval = 1.0 / tokens_per_second if tokens_per_second else 0
+            for i in range(n_tokens):
+                chunk = {
+                    "id": "fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {"content": words[i % len(words)]}, "finish_reason": None}]
+                }
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                state["tokens"] += 1
+                if interval:
+                    await asyncio.sleep(interval)
+            # Rough token count (4 characters per token) for the usage block
+            prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4
+            final = {
+                "id": "fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": n_tokens,
+                          "total_tokens": prompt_tokens + n_tokens}
+            }
+            await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+            await response.write_eof()
+        except ConnectionResetError:
+            pass  # Client went away (e.g. it timed out); stop generating
+        return response
+
+    app = web.Application()
+    app["state"] = state
+    app.router.add_post("/inference/v1/chat/completions", chat_completions)
+    return app
+
+
+def create_jsonrpc_app(
+    head: int = 19_000_000,
+    blocks_per_second: float = 0.0,
+    latency: float = 0.0
+) -> web.Application:
+    """Build an aiohttp app that answers the JSON-RPC calls used for fee history.
+
+    Supports eth_blockNumber, eth_feeHistory and eth_getBlockByNumber, both as
+    single requests and as batches. Block data is derived deterministically
+    from the block number; with blocks_per_second > 0 the head keeps advancing.
+    latency is added to every HTTP request, batched or not.
+    """
+    state = {"requests": 0, "calls": 0, "started": time.monotonic()}
+    genesis_time = 1_700_000_000
+
+    def current_head() -> int:
+        return head + int((time.monotonic() - state["started"]) * blocks_per_second)
+
+    def base_fee(block: int) -> int:
+        return int((15 + 5 * ((block * 7919) % 97) / 97) * 1e9)
+
+    def fee_history(count: int, newest: int, percentiles):
+        newest = min(newest, current_head())
+        oldest = newest - count + 1
+        blocks = range(oldest, newest + 1)
+        return {
+            "oldestBlock": hex(oldest),
+            "baseFeePerGas": [hex(base_fee(b)) for b in range(oldest, newest + 2)],
+            "gasUsedRatio": [((b * 104729) % 1000) / 1000 for b in blocks],
+            "reward": [[hex(int((0.1 + p / 50) * 1e9)) for p in percentiles] for b in blocks]
+        }
+
+    def call(method: str, params: list):
+        if method == "eth_blockNumber":
+            return hex(current_head())
+        if method == "eth_feeHistory":
+            newest = current_head() if params[1] == "latest" else int(params[1], 16)
+            return fee_history(int(params[0], 16), newest, params[2] if len(params) > 2 else [])
+        if method == "eth_getBlockByNumber":
+            block = current_head() if params[0] == "latest" else int(params[0], 16)
+            if block > current_head():
+                return None
+            return {"number": hex(block), "timestamp": hex(genesis_time + 12 * block)}
+        raise KeyError(method)
+
+    def handle(item):
+        state["calls"] += 1
+        try:
+            return {"jsonrpc": "2.0", "id": item.get("id"), "result": call(item["method"], item.get("params", []))}
+        except KeyError:
+            return {"jsonrpc": "2.0", "id": item.get("id"), "error": {"code": -32601, "message": "Method not found"}}
+
+    async def rpc(request: web.Request) -> web.Response:
+        state["requests"] += 1
+        body = await request.json()
+        if latency:
+            await asyncio.sleep(latency)
+        if isinstance(body, list):
+            return web.json_response([handle(item) for item in body])
+        return web.json_response(handle(body))
+
+    app = web.Application()
+    app["state"] = state
+    app.router.add_post("/", rpc)
+    return app
+
+
+async def start_server(app: web.Application, port: int = 0):
+    """Start an app on 127.0.0.1 and return (runner, base_url)."""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+class ThreadedServer:
+    """Run an app on its own event loop in a daemon thread.
+
+    Needed when the code under test may block the caller's event loop, which
+    would otherwise also stall an in-process stand-in server.
+    """
+
+    def __init__(self, app: web.Application):
+        self.app = app
+        self.base_url = None
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        future = asyncio.run_coroutine_threadsafe(start_server(self.app), self._loop)
+        self._runner, self.base_url = future.result()
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
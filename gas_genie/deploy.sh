@@ -15,6 +15,9 @@ gcloud auth configure-docker -q
 docker push $IMAGE_NAME
 
 # Deploy to Cloud Run with proper configuration
+# To keep gas price history across restarts, mount a volume (e.g. a GCS bucket
+# with --add-volume/--add-volume-mount) and add GAS_HISTORY_PATH=<mount>/gas_history.bin
+# to the environment variables below.
 gcloud run deploy $SERVICE_NAME \
   --image $IMAGE_NAME \
   --platform managed \
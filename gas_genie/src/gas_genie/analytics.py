@@ -0,0 +1,104 @@
+import logging
+from typing import Dict, Any
+
+import numpy as np
+
+from .price_history import PriceHistory
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("safe", "propose", "fast")
+PERCENTILES = (10, 50, 90)
+
+
+def _ewma(values: np.ndarray, span: int) -> float:
+    """Exponentially weighted mean of the series, weighted towards the latest value."""
+    alpha = 2.0 / (span + 1)
+    weights = (1 - alpha) ** np.arange(len(values) - 1, -1, -1)
+    return float(weights @ values / weights.sum())
+
+
+def _slope(t: np.ndarray, values: np.ndarray) -> float:
+    """Least-squares slope of values against t (units of values per unit of t)."""
+    tc = t - t.mean()
+    denom = tc @ tc
+    if denom == 0:
+        return 0.0
+    return float(tc @ (values - values.mean()) / denom)
+
+
+def compute_analytics(
+    history: PriceHistory,
+    version: int = 0,
+    window: int = 300,
+    ewma_span: int = 20,
+    volatility_window: int = 20,
+    trend_threshold: float = 5.0
+) -> Dict[str, Any]:
+    """Compute trend and distribution statistics over the newest `window` samples.
+
+    The trend is classified from the least-squares fit of the propose price over
+    the window rather than from the last two samples, so a single noisy reading
+    no longer flips it. trend_threshold is the fitted change over the window, in
+    percent, needed to call a trend increasing or decreasing.
+    """
+    n = min(len(history), window)
+    if n == 0:
+        return {"version": version, "samples": 0, "trend": {"trend": "unknown", "change_percentage": 0}}
+
+    prices = np.column_stack([history.column(tier, last=n) for tier in TIERS])
+    base_fee = history.column("suggested_base_fee", last=n)
+    ratios = history.gas_used_ratio_means(last=n)
+    t = history.column("timestamp", last=n)
+    if t[0] > 0:
+        t = t - t[0]
+    else:
+        t = np.arange(n, dtype=np.float64)  # Samples without timestamps
+
+    propose = prices[:, 1]
+    current = float(propose[-1])
+    percentiles = np.percentile(prices, PERCENTILES, axis=0)
+
+    if n < 2:
+        trend = {"trend": "stable", "change_percentage": 0, "current_price": current, "previous_price": current}
+        slope = 0.0
+        volatility = 0.0
+    else:
+        slope = _slope(t, propose)
+        mean = propose.mean()
+        fitted_change = slope * (t[-1] - t[0]) / mean * 100 if mean else 0.0
+        if fitted_change > trend_threshold:
+            direction = "increasing"
+        elif fitted_change < -trend_threshold:
+            direction = "decreasing"
+        else:
+            direction = "stable"
+        trend = {
+            "trend": direction,
+            "change_percentage": float(fitted_change),
+            "current_price": current,
+            "previous_price": float(propose[-2])
+        }
+        previous = propose[-volatility_window - 1:-1]
+        returns = np.diff(propose[-volatility_window - 1:]) / np.where(previous == 0, 1, previous)
+        volatility = float(returns.std() * 100)
+
+    return {
+        "version": version,
+        "samples": n,
+        "window_seconds": float(t[-1] - t[0]),
+        "trend": trend,
+        "ewma": {tier: _ewma(prices[:, i], ewma_span) for i, tier in enumerate(TIERS)},
+        "slope": slope,  # Propose Gwei per second (per sample if samples carry no timestamps)
+        "volatility_percentage": volatility,
+        "percentiles": {
+            tier: {f"p{q}": float(percentiles[j, i]) for j, q in enumerate(PERCENTILES)}
+            for i, tier in enumerate(TIERS)
+        },
+        "base_fee_ewma": _ewma(base_fee, ewma_span),
+        "gas_used_ratio": {
+            "latest": float(ratios[-1]),
+            "mean": float(ratios.mean()),
+            "ewma": _ewma(ratios, ewma_span)
+        }
+    }
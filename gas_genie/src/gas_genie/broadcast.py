@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, Any, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StreamInterrupted(Exception):
+    """The shared upstream stream was cancelled before it finished."""
+
+
+class StreamBroadcast:
+    """Fan one upstream chunk stream out to any number of subscribers.
+
+    A producer task drains the source into a shared buffer. Each subscriber
+    replays the chunks produced so far and then follows the live tail, so a
+    client that attaches late receives the same full answer. The buffer stops
+    accepting new subscribers once it holds more than max_bytes; the upstream
+    is cancelled if every subscriber goes away before it finishes.
+
+    A subscriber counts from the moment subscribe() is called, not from its
+    first read, so a client that has joined but not started reading keeps
+    the upstream alive.
+    """
+
+    def __init__(
+        self,
+        source: AsyncIterator[str],
+        max_bytes: int,
+        on_complete: Optional[Callable[[List[str]], None]] = None,
+        on_done: Optional[Callable[["StreamBroadcast"], None]] = None
+    ):
+        self.chunks: List[str] = []
+        self.bytes = 0
+        self.max_bytes = max_bytes
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._abandoned = False
+        self._on_complete = on_complete
+        self._on_done = on_done
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._run(source))
+
+    @property
+    def joinable(self) -> bool:
+        return not self.done and not self._abandoned and self.bytes <= self.max_bytes
+
+    async def _run(self, source: AsyncIterator[str]):
+        completed = False
+        try:
+            async with aclosing(source):
+                async for chunk in source:
+                    self.chunks.append(chunk)
+                    self.bytes += len(chunk)
+                    self._notify()
+            completed = True
+        except asyncio.CancelledError:
+            # Subscribers get an ordinary error, not a cancellation of their own task
+            self.error = StreamInterrupted("The answer was interrupted before it finished")
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            if self._on_done is not None:
+                self._on_done(self)
+            if completed and self._on_complete is not None:
+                self._on_complete(self.chunks)
+
+    def _notify(self):
+        # Wake everyone waiting on the current event and arm a fresh one
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def subscribe(self) -> "_Subscription":
+        """An iterator over every chunk of the stream, from the beginning.
+
+        The caller must exhaust or aclose() it.
+        """
+        self.subscribers += 1
+        return _Subscription(self)
+
+    def _unsubscribe(self):
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.done:
+            logger.debug("All subscribers left, cancelling upstream stream")
+            self._abandoned = True
+            self._task.cancel()
+
+
+class _Subscription:
+    """One subscriber's position in a StreamBroadcast; counted until exhausted or closed."""
+    __slots__ = ("broadcast", "position", "_subscribed")
+
+    def __init__(self, broadcast: StreamBroadcast):
+        self.broadcast = broadcast
+        self.position = 0
+        self._subscribed = True
+
+    def __aiter__(self) -> "_Subscription":
+        return self
+
+    async def __anext__(self) -> str:
+        broadcast = self.broadcast
+        while True:
+            if self.position < len(broadcast.chunks):
+                chunk = broadcast.chunks[self.position]
+                self.position += 1
+                return chunk
+            if broadcast.done:
+                self._release()
+                if broadcast.error is not None:
+                    raise broadcast.error
+                raise StopAsyncIteration
+            if not self._subscribed:
+                raise StopAsyncIteration
+            await broadcast._changed.wait()
+
+    async def aclose(self):
+        self._release()
+
+    def _release(self):
+        if self._subscribed:
+            self._subscribed = False
+            self.broadcast._unsubscribe()
+
+
+class InflightStreams:
+    """Registry of in-progress generations so identical requests share one upstream stream."""
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes or int(os.getenv("INFLIGHT_MAX_BYTES", str(64 * 1024)))
+        self._streams: Dict[Hashable, StreamBroadcast] = {}
+        self.started = 0
+        self.joined = 0
+
+    def joinable(self, key: Hashable) -> bool:
+        """Whether subscribe(key, ...) would join a generation already in progress."""
+        broadcast = self._streams.get(key)
+        return broadcast is not None and broadcast.joinable
+
+    def subscribe(
+        self,
+        key: Hashable,
+        factory: Callable[[], AsyncIterator[str]],
+        on_complete: Optional[Callable[[List[str]], None]] = None
+    ) -> AsyncIterator[str]:
+        """Attach to the in-flight stream for key, starting one from factory() if needed."""
+        broadcast = self._streams.get(key)
+        if broadcast is not None and broadcast.joinable:
+            self.joined += 1
+        else:
+            broadcast = StreamBroadcast(
+                factory(),
+                self.max_bytes,
+                on_complete=on_complete,
+                on_done=lambda finished: self._remove(key, finished)
+            )
+            self._streams[key] = broadcast
+            self.started += 1
+        return broadcast.subscribe()
+
+    def _remove(self, key: Hashable, broadcast: StreamBroadcast):
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._streams), "started": self.started, "joined": self.joined}
@@ -0,0 +1,88 @@
+import json
+import zlib
+from typing import Dict, Any
+
+from .recommendation import Recommendation
+
+
+class GasDocument:
+    """A pre-serialized JSON body for one API view of one snapshot version."""
+    __slots__ = ("version", "etag", "body")
+
+    def __init__(self, version: int, body: bytes):
+        self.version = version
+        self.body = body
+        # The version orders documents within a worker; the checksum keeps
+        # ETags from different workers (with independent counters) distinct
+        self.etag = f'"{version}-{zlib.crc32(body):08x}"'
+
+
+def _dumps(data: Dict[str, Any]) -> bytes:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def render_gas_documents(recommendation: Recommendation) -> Dict[str, GasDocument]:
+    """Serialize every API view of a snapshot's recommendation."""
+    prices = recommendation.current_prices
+    recommendation_view = {
+        "version": recommendation.version,
+        "block": prices.get("last_block"),
+        "timestamp": prices.get("timestamp"),
+        "recommended_price": recommendation.recommended_price,
+        "confidence": recommendation.confidence,
+        "suggestion": recommendation.suggestion,
+        "price_trend": recommendation.price_trend,
+        "network_metrics": {
+            "base_fee": recommendation.base_fee,
+            "gas_used_ratio": recommendation.gas_used_ratio,
+            "congestion_level": recommendation.congestion_level
+        }
+    }
+    gas_view = {
+        "version": recommendation.version,
+        "block": prices.get("last_block"),
+        "timestamp": prices.get("timestamp"),
+        "prices": {
+            "safe": prices.get("safe"),
+            "propose": prices.get("propose"),
+            "fast": prices.get("fast"),
+            "suggested_base_fee": prices.get("suggested_base_fee"),
+            "gas_used_ratio": prices.get("gas_used_ratio")
+        },
+        "analytics": recommendation.analytics,
+        "recommendation": {k: v for k, v in recommendation_view.items() if k not in ("version", "block", "timestamp")}
+    }
+    return {
+        "gas": GasDocument(recommendation.version, _dumps(gas_view)),
+        "recommendation": GasDocument(recommendation.version, _dumps(recommendation_view))
+    }
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header value matches etag (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def cache_control(age: float, max_age: float, stale: float) -> str:
+    """Cache-Control for a snapshot of the given age.
+
+    Shared caches may serve it until the snapshot would be refreshed here, and
+    keep serving it while revalidating for as long as we would serve it stale.
+    """
+    remaining = max(0, int(max_age - age))
+    return f"public, max-age={remaining}, stale-while-revalidate={max(0, int(stale - max_age))}"
+
+
+def document_headers(document: GasDocument, age: float, max_age: float, stale: float) -> Dict[str, str]:
+    return {"ETag": document.etag, "Cache-Control": cache_control(age, max_age, stale)}
+
@@ -1,15 +1,22 @@
+import asyncio
 import logging
 import os
+from contextlib import aclosing
 from dotenv import load_dotenv
-from typing import AsyncIterator, Dict, Any
-from .providers.gas_price_provider import GasPriceProvider
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+from .providers.gas_price_provider import GasPriceProvider, GasSnapshot
 from .providers.model_provider import ModelProvider
+from .providers.flush_policy import FlushPolicy, get_flush_policy
+from .response_cache import ResponseCache
+from .broadcast import InflightStreams, StreamInterrupted
+from .sessions import GasUpdates
+from .intent import classify
+from .metrics import ASSIST_REQUESTS
+from .timing import RequestTimer, StartupProfile
+from .scheduler import Scheduler, Overloaded, PRIORITY_HIGH, PRIORITY_NORMAL
+from .gas_api import GasDocument, render_gas_documents
+from .prompts import GAS_QUERY_TEMPLATE, GENERAL_QUERY_TEMPLATE, render_gas_context, render_gas_answer
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
@@ -19,175 +26,312 @@ class GasGenie:
     def __init__(self, name: str):
         """Initialize the Gas Genie agent."""
         self.name = name
+        # Upstream rate limits and queues, shared by both providers
+        self.scheduler = Scheduler()
         
         # Initialize model provider
         model_api_key = os.getenv("FIREWORKS_API_KEY")
         if not model_api_key:
             raise ValueError("FIREWORKS_API_KEY is not set")
-        self.model_provider = ModelProvider(api_key=model_api_key)
+        self.model_provider = ModelProvider(api_key=model_api_key, scheduler=self.scheduler)
         
         # Initialize gas price provider
         etherscan_api_key = os.getenv("ETHERSCAN_API_KEY")
-        if not etherscan_api_key:
+        if not etherscan_api_key and os.getenv("GAS_BACKEND", "etherscan") == "etherscan":
             raise ValueError("ETHERSCAN_API_KEY is not set")
-        self.gas_provider = GasPriceProvider(api_key=etherscan_api_key)
+        self.gas_provider = GasPriceProvider(api_key=etherscan_api_key, scheduler=self.scheduler)
+        self._gas_context: Optional[Tuple[int, str]] = None  # (snapshot version, rendered block)
+        self._gas_documents: Optional[Tuple[int, Dict[str, GasDocument]]] = None  # (snapshot version, API bodies)
+        self.response_cache = ResponseCache()
+        self.inflight = InflightStreams()
+        # Gas changes pushed to WebSocket sessions
+        self.gas_updates = GasUpdates(self.gas_provider)
+        # Generations a single batch request may run at once
+        self.batch_concurrency = int(os.getenv("ASSIST_BATCH_CONCURRENCY", "8"))
+
+    async def start(self):
+        """Open long-lived upstream connections and start the gas poller."""
+        await self.gas_provider.start()
+        self.gas_provider.start_polling()
+
+    async def prewarm(self, profile: StartupProfile = None):
+        """Load what the first requests need: the model client and a gas snapshot.
+
+        Failures are logged, not raised; requests load whatever is still
+        missing on demand.
+        """
+        profile = profile or StartupProfile()
+
+        async def model_client():
+            await self.model_provider.prewarm()
+            profile.mark("model_client")
+
+        async def gas_snapshot():
+            await self.gas_provider.get_snapshot()
+            profile.mark("gas_snapshot")
+
+        for name, result in zip(("model client", "gas snapshot"), await asyncio.gather(
+                model_client(), gas_snapshot(), return_exceptions=True)):
+            if isinstance(result, Exception):
+                logger.warning(f"Prewarming the {name} failed: {str(result)}")
+        profile.mark("prewarmed")
+
+    async def close(self):
+        """Release upstream connections."""
+        await self.gas_updates.close()
+        await self.gas_provider.close()
 
     async def get_gas_data(self) -> Dict[str, Any]:
         """Get gas price data."""
         try:
-            # Get current prices first
-            current_prices = await self.gas_provider.get_current_gas_prices()
-            if not current_prices:
+            # Read the shared snapshot; the recommendation is computed once per
+            # snapshot version and reused by every request that sees it
+            snapshot = await self.gas_provider.get_snapshot()
+            if not snapshot.prices:
                 raise ValueError("Failed to get current gas prices")
-            
-            # Add to price history for trend analysis
-            self.gas_provider.price_history.append(current_prices)
-            
-            # Get price trend
-            price_trend = self.gas_provider._analyze_price_trend()
-            
-            # Get network metrics
-            gas_used_ratio = current_prices.get("gas_used_ratio", [0])[0]
-            base_fee = current_prices.get("suggested_base_fee", 0)
-            
-            # Calculate optimal price
-            optimal_price = current_prices["propose"]
-            confidence = 0.8
-            
-            # Adjust based on network congestion
-            if gas_used_ratio > 0.9:  # High congestion
-                optimal_price = current_prices["fast"]
-                confidence = 0.9
-            elif gas_used_ratio < 0.5:  # Low congestion
-                optimal_price = current_prices["safe"]
-                confidence = 0.7
-                
-            # Adjust based on price trend
-            if price_trend["trend"] == "increasing":
-                optimal_price = min(optimal_price * 1.1, current_prices["fast"])
-                confidence *= 0.9
-            elif price_trend["trend"] == "decreasing":
-                optimal_price = max(optimal_price * 0.9, current_prices["safe"])
-                confidence *= 0.9
-                
-            # Determine suggestion
-            if optimal_price > current_prices["fast"] * 1.1:
-                suggestion = "wait"
-            elif optimal_price < current_prices["propose"] * 0.9:
-                suggestion = "send"
-            else:
-                suggestion = "monitor"
-            
-            # Return a single dictionary, not a generator
-            return {
-                "recommended_price": optimal_price,
-                "confidence": confidence,
-                "suggestion": suggestion,
-                "current_prices": current_prices,
-                "price_trend": price_trend,
-                "network_metrics": {
-                    "base_fee": base_fee,
-                    "gas_used_ratio": gas_used_ratio,
-                    "congestion_level": "high" if gas_used_ratio > 0.9 else "medium" if gas_used_ratio > 0.7 else "low"
-                }
-            }
+            return self.gas_provider.get_recommendation(snapshot).to_dict()
         except Exception as e:
             logger.error(f"Error getting gas data: {str(e)}", exc_info=True)
             raise
 
-    async def assist(self, query: str, query_id: str) -> AsyncIterator[str]:
-        """Process gas-related queries and provide recommendations."""
+    async def get_gas_context(self, snapshot: GasSnapshot = None) -> Tuple[int, str]:
+        """Get (snapshot version, gas data block for the model), rendered once per version."""
+        snapshot = snapshot or await self.gas_provider.get_snapshot()
+        cached = self._gas_context
+        if cached is None or cached[0] != snapshot.version:
+            recommendation = self.gas_provider.get_recommendation(snapshot)
+            cached = (snapshot.version, render_gas_context(recommendation))
+            self._gas_context = cached
+        return cached
+
+    async def get_gas_document(self, view: str) -> Tuple[GasSnapshot, GasDocument]:
+        """Get the snapshot and its serialized JSON API view, rendered once per version."""
+        snapshot = await self.gas_provider.get_snapshot()
+        if not snapshot.prices:
+            raise ValueError("Failed to get current gas prices")
+        cached = self._gas_documents
+        if cached is None or cached[0] != snapshot.version:
+            recommendation = self.gas_provider.get_recommendation(snapshot)
+            cached = (snapshot.version, render_gas_documents(recommendation))
+            self._gas_documents = cached
+        return snapshot, cached[1][view]
+
+    async def open_assist(
+        self,
+        query: str,
+        query_id: str,
+        flush: FlushPolicy = None,
+        timer: RequestTimer = None,
+        snapshot: GasSnapshot = None
+    ) -> AsyncIterator[str]:
+        """Route a query and secure what its answer needs, then return the answer stream.
+
+        Everything that can turn the request away (the gas snapshot and
+        admission to the model) happens before anything is streamed, so the
+        caller can still answer with an HTTP status: Overloaded is raised when
+        an upstream queue is full, other failures become a one-chunk error
+        stream. flush and timer are as for assist(); snapshot, if given, is
+        used instead of the current one.
+        """
+        timer = timer or RequestTimer()
         try:
-            # Check if the query is about gas prices
-            gas_keywords = ["gas", "price", "fee", "transaction", "send", "wait", "network", "congestion"]
-            is_gas_query = any(keyword in query.lower() for keyword in gas_keywords)
+            intent = classify(query)
+            ASSIST_REQUESTS.labels(intent.name).inc()
+            timer.mark("classify")
+            timer.info["intent"] = intent.name
+            
+            if intent.name == "gas_data":
+                # Direct data questions are answered from the snapshot without the model
+                snapshot = snapshot or await self.gas_provider.get_snapshot()
+                timer.mark("gas_snapshot")
+                answer = render_gas_answer(intent.slots, self.gas_provider.get_recommendation(snapshot))
+                timer.mark("prompt_render")
+                timer.info["source"] = "template"
+                return self._replay([answer], timer)
             
-            if is_gas_query:
-                # Get gas data only if the query is about gas prices
-                gas_data = await self.get_gas_data()
-                
-                if not gas_data:
-                    yield "Error: Failed to get gas price data"
-                    return
-                
-                current_prices = gas_data.get('current_prices', {})
-                if not current_prices:
-                    yield "Error: No current gas prices available"
-                    return
-                
-                price_trend = gas_data.get('price_trend', {})
-                network_metrics = gas_data.get('network_metrics', {})
-                
-                # Build comprehensive prompt for gas-related queries
-                prompt = f"""Current gas prices and network conditions:
-- Safe: {current_prices.get('safe', 'N/A')} Gwei
-- Propose: {current_prices.get('propose', 'N/A')} Gwei
-- Fast: {current_prices.get('fast', 'N/A')} Gwei
-- Base Fee: {current_prices.get('suggested_base_fee', 'N/A')} Gwei
-
-Network Status:
-- Base Fee: {network_metrics.get('base_fee', 'N/A')} Gwei
-- Gas Used Ratio: {network_metrics.get('gas_used_ratio', 'N/A')}
-- Congestion Level: {network_metrics.get('congestion_level', 'N/A')}
-
-Price Trend:
-- Trend: {price_trend.get('trend', 'unknown')}
-- Change: {price_trend.get('change_percentage', 0):.2f}%
-- Current Price: {price_trend.get('current_price', 'N/A')} Gwei
-- Previous Price: {price_trend.get('previous_price', 'N/A')} Gwei
-
-Recommendation:
-- Suggested Action: {gas_data.get('suggestion', 'monitor')}
-- Recommended Price: {gas_data.get('recommended_price', 'N/A')} Gwei
-- Confidence: {gas_data.get('confidence', 0) * 100:.1f}%
-
-User query: {query}
-
-Please provide a detailed analysis and recommendation based on the above data. Consider:
-1. Current network conditions and their impact
-2. Price trends and their implications
-3. Specific recommendations for the user's query
-4. Alternative options if applicable
-5. Any risks or considerations to be aware of"""
+            if intent.needs_gas_data:
+                # Gas data goes in a per-snapshot context block ahead of the query
+                version, context = await self.get_gas_context(snapshot)
+                timer.mark("gas_snapshot")
+                prompt = GAS_QUERY_TEMPLATE.format(query=query)
+                cache_key = self.response_cache.make_key(query, intent.name, version)
             else:
                 # For non-gas queries, use a simpler prompt
-                prompt = f"""User query: {query}
-
-Please provide a helpful and friendly response. Keep it concise and natural."""
+                context = None
+                prompt = GENERAL_QUERY_TEMPLATE.format(query=query)
+                cache_key = self.response_cache.make_key(query, intent.name)
+            casual = intent.name == "casual"
+            timer.mark("prompt_render")
             
-            # Get the generator from query_stream
-            response_generator = self.model_provider.query_stream(prompt)
+            # Replay an identical answer for the same snapshot without calling the model
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                timer.info["source"] = "cache"
+                return self._replay(cached, timer)
             
-            # Stream the model response
-            async for chunk in response_generator:
-                if chunk and isinstance(chunk, str):
-                    yield chunk
-                
+            # Identical requests arriving while an answer is still being generated
+            # attach to that generation instead of starting their own
+            def on_complete(chunks):
+                # Only complete, successful answers are cached (errors are yielded as a chunk)
+                if chunks and not chunks[0].startswith("Error:") and not chunks[-1].startswith("Error:"):
+                    self.response_cache.put(cache_key, chunks)
+
+            # A new generation first needs admission to the model; short
+            # conversational answers go ahead of queued gas analyses
+            slot = None
+            if not self.inflight.joinable(cache_key):
+                priority = PRIORITY_HIGH if casual else PRIORITY_NORMAL
+                slot = await self.scheduler["fireworks"].acquire(priority)
+                if self.inflight.joinable(cache_key):
+                    # An identical request started generating while this one queued
+                    slot.release()
+                    slot = None
+
+            timer.info["source"] = "joined" if slot is None else "model"
+            response_generator = self.inflight.subscribe(
+                cache_key,
+                lambda: self.model_provider.query_stream(
+                    prompt, context=context, casual=casual, flush=flush, timer=timer, slot=slot
+                ),
+                on_complete=on_complete
+            )
+            return self._follow(response_generator, timer)
+
+        except Overloaded:
+            raise
+        except Exception as e:
+            logger.error(f"Error in assist: {str(e)}", exc_info=True)
+            return self._replay([f"Error: {str(e)}"], timer)
+
+    async def open_batch(
+        self,
+        items: List[Tuple[str, str]],
+        flush: FlushPolicy = None,
+        timer: RequestTimer = None,
+        timers: Dict[str, RequestTimer] = None
+    ) -> AsyncIterator[List[Tuple[str, Optional[str]]]]:
+        """Answer several (id, query) items against one gas snapshot, interleaving their streams.
+
+        The snapshot and its recommendation are resolved once, before
+        anything is streamed (Overloaded is raised if that cannot be
+        admitted). Up to batch_concurrency items are then answered at a time.
+        The returned stream yields the (item id, chunk) events that are ready
+        at each wake-up; an item's last event has chunk None. An item the
+        model cannot admit ends with an error chunk instead of failing the
+        batch. timers, if given, maps item ids to their RequestTimer.
+        """
+        timer = timer or RequestTimer()
+        try:
+            snapshot = await self.gas_provider.get_snapshot()
+            self.gas_provider.get_recommendation(snapshot)
+        except Overloaded:
+            raise
+        except Exception as e:
+            # Items that need gas data will report the failure themselves
+            logger.error(f"Error getting gas data for batch: {str(e)}")
+            snapshot = None
+        timer.mark("gas_snapshot")
+        timer.info["items"] = len(items)
+        return self._multiplex(items, flush, snapshot, timers or {})
+
+    async def _multiplex(
+        self,
+        items: List[Tuple[str, str]],
+        flush: Optional[FlushPolicy],
+        snapshot: Optional[GasSnapshot],
+        timers: Dict[str, RequestTimer]
+    ) -> AsyncIterator[List[Tuple[str, Optional[str]]]]:
+        # Bounded so generation pauses while the client is not reading
+        events: asyncio.Queue = asyncio.Queue(maxsize=self.batch_concurrency * 16)
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+        async def answer(item_id: str, query: str):
+            timer = timers.get(item_id) or RequestTimer()
+            try:
+                async with semaphore:
+                    try:
+                        stream = await self.open_assist(query, item_id, flush=flush, timer=timer, snapshot=snapshot)
+                    except Overloaded as e:
+                        stream = self._replay([f"Error: {str(e)}"], timer)
+                    async with aclosing(stream):
+                        async for chunk in stream:
+                            await events.put((item_id, chunk))
+            except Exception as e:
+                logger.error(f"Error in batch item {item_id}: {str(e)}", exc_info=True)
+                await events.put((item_id, f"Error: {str(e)}"))
+            await events.put((item_id, None))
+
+        tasks = [asyncio.ensure_future(answer(item_id, query)) for item_id, query in items]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                ready = [await events.get()]
+                while not events.empty():
+                    ready.append(events.get_nowait())
+                remaining -= sum(1 for _, chunk in ready if chunk is None)
+                yield ready
+        finally:
+            # The client went away: stop the remaining generations
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _replay(chunks, timer: RequestTimer) -> AsyncIterator[str]:
+        """Stream an answer that is already complete (template, cache or error)."""
+        timer.mark("first_token")
+        for chunk in chunks:
+            yield chunk
+        timer.mark("last_token")
+
+    @staticmethod
+    async def _follow(response_generator: AsyncIterator[str], timer: RequestTimer) -> AsyncIterator[str]:
+        """Stream the model response; closing promptly lets an abandoned generation be cancelled upstream."""
+        try:
+            async with aclosing(response_generator):
+                async for chunk in response_generator:
+                    if chunk and isinstance(chunk, str):
+                        timer.mark("first_token")
+                        yield chunk
+            timer.mark("last_token")
+        except StreamInterrupted:
+            raise  # Partly sent already; the transport reports it as an error event
         except Exception as e:
             logger.error(f"Error in assist: {str(e)}", exc_info=True)
             yield f"Error: {str(e)}"
 
+    async def assist(
+        self,
+        query: str,
+        query_id: str,
+        flush: FlushPolicy = None,
+        timer: RequestTimer = None
+    ) -> AsyncIterator[str]:
+        """Process gas-related queries and provide recommendations.
+
+        flush selects how model output is grouped into chunks for this caller.
+        timer, if given, records the stages of the request and where the
+        answer came from (template, cache, joined or model).
+        """
+        try:
+            stream = await self.open_assist(query, query_id, flush=flush, timer=timer)
+        except Overloaded as e:
+            yield f"Error: {str(e)}"
+            return
+        async with aclosing(stream):
+            async for chunk in stream:
+                yield chunk
+
     async def query(self, query: str) -> str:
         """Query the model with a single prompt and return the complete response."""
         try:
-            gas_data = await self.get_gas_data()
-            if not gas_data:
-                return "Error: Failed to get gas price data"
-            
-            current_prices = gas_data.get('current_prices', {})
-            if not current_prices:
-                return "Error: No current gas prices available"
-            
-            prompt = f"""Current gas prices:
-- Safe: {current_prices.get('safe', 'N/A')} Gwei
-- Propose: {current_prices.get('propose', 'N/A')} Gwei
-- Fast: {current_prices.get('fast', 'N/A')} Gwei
-- Base Fee: {current_prices.get('suggested_base_fee', 'N/A')} Gwei
-
-User query: {query}"""
+            _, context = await self.get_gas_context()
+            prompt = GAS_QUERY_TEMPLATE.format(query=query)
             
             response = ""
-            async for chunk in self.model_provider.query_stream(prompt):
+            # The caller wants the whole answer, so fewer, larger chunks are cheaper
+            stream = self.model_provider.query_stream(prompt, context=context, casual=False, flush=get_flush_policy("window"))
+            async for chunk in stream:
                 if chunk and isinstance(chunk, str):
                     response += chunk
             return response
@@ -0,0 +1,155 @@
+import logging
+import os
+import struct
+import time
+import zlib
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from .price_history import PriceHistory
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GGHIST01"
+HEADER = struct.Struct("<8sHH4x")  # magic, record size, ratio width, padding
+
+
+def record_dtype(ratio_width: int) -> np.dtype:
+    """Little-endian on-disk layout of one history sample; crc covers every field before it."""
+    return np.dtype([
+        ("timestamp", "<f8"),
+        ("last_block", "<u4"),
+        ("safe", "<f8"),
+        ("propose", "<f8"),
+        ("fast", "<f8"),
+        ("suggested_base_fee", "<f8"),
+        ("gas_used_ratio", "<f4", (ratio_width,)),
+        ("gas_used_ratio_count", "u1"),
+        ("crc", "<u4"),
+    ])
+
+
+class HistoryStore:
+    """Append-only file of fixed-size gas history records.
+
+    Every sample is appended as one packed record with a CRC32, so a crash in
+    the middle of a write can at worst leave a torn record at the end of the
+    file; load() drops it. On startup the file is memory-mapped and copied
+    into the in-memory PriceHistory in one vectorized step.
+
+    The file is rewritten (to a temporary file, then atomically renamed) once
+    it holds more than max_records * compact_factor records, keeping only the
+    newest max_records samples that are younger than max_age seconds.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ratio_width: int = 5,
+        max_records: int = None,
+        max_age: float = None,
+        compact_factor: float = 1.5
+    ):
+        self.path = path
+        self.ratio_width = ratio_width
+        self.dtype = record_dtype(ratio_width)
+        self.max_records = max_records or int(os.getenv("GAS_HISTORY_CAPACITY", "50000"))
+        self.max_age = max_age if max_age is not None else float(os.getenv("GAS_HISTORY_RETENTION", str(7 * 24 * 3600)))
+        self.compact_factor = compact_factor
+        self._header = HEADER.pack(MAGIC, self.dtype.itemsize, ratio_width)
+        self._fd: Optional[int] = None
+        self._records = 0
+
+    def _read_records(self) -> np.ndarray:
+        """Memory-map the valid records of the file (empty if missing or incompatible)."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return np.empty(0, dtype=self.dtype)
+        if size < HEADER.size:
+            return np.empty(0, dtype=self.dtype)
+        with open(self.path, "rb") as f:
+            header = f.read(HEADER.size)
+        if header != self._header:
+            logger.warning(f"Ignoring gas history file {self.path} with an incompatible header")
+            return np.empty(0, dtype=self.dtype)
+
+        count = (size - HEADER.size) // self.dtype.itemsize
+        if count == 0:
+            return np.empty(0, dtype=self.dtype)
+        records = np.memmap(self.path, dtype=self.dtype, mode="r", offset=HEADER.size, shape=(count,))
+        # Only the tail can be torn by a crash; drop trailing records that fail their CRC
+        while count and not self._valid(records[count - 1]):
+            count -= 1
+        if count < len(records):
+            logger.warning(f"Dropped {len(records) - count} torn record(s) from {self.path}")
+        return records[:count]
+
+    def _valid(self, record) -> bool:
+        data = record.tobytes()
+        return zlib.crc32(data[:-4]) == int(record["crc"])
+
+    def load(self, history: PriceHistory) -> int:
+        """Fill history with the retained records and open the file for appending."""
+        start = time.perf_counter()
+        records = self._read_records()
+        if self.max_age and len(records):
+            records = records[records["timestamp"] >= time.time() - self.max_age]
+        history.load_records(records)
+        loaded = len(history)
+        # Rewrite the file so torn or expired records don't linger behind new appends
+        self._rewrite(records[-self.max_records:])
+        logger.info(f"Loaded {loaded} gas history samples from {self.path} in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return loaded
+
+    def append(self, sample: Dict[str, Any]):
+        """Append one sample as returned by GasPriceProvider."""
+        if self._fd is None:
+            self._open()
+        record = np.zeros(1, dtype=self.dtype)
+        for name in ("timestamp", "last_block", "safe", "propose", "fast", "suggested_base_fee"):
+            record[name] = sample.get(name) or 0
+        ratios = (sample.get("gas_used_ratio") or [])[:self.ratio_width]
+        record["gas_used_ratio"][0, :len(ratios)] = ratios
+        record["gas_used_ratio_count"] = len(ratios)
+        data = record.tobytes()
+        record["crc"] = zlib.crc32(data[:-4])
+        os.write(self._fd, record.tobytes())
+        self._records += 1
+        if self._records > self.max_records * self.compact_factor:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the file keeping only the retained records."""
+        records = self._read_records()
+        if self.max_age and len(records):
+            records = records[records["timestamp"] >= time.time() - self.max_age]
+        before = self._records
+        self._rewrite(records[-self.max_records:])
+        logger.debug(f"Compacted gas history {self.path}: {before} -> {self._records} records")
+
+    def _rewrite(self, records: np.ndarray):
+        records = np.array(records)  # Detach from the memmap before replacing the file
+        self.close()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._header)
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._records = len(records)
+        self._open()
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size == 0:
+            os.write(self._fd, self._header)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
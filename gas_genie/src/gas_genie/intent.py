@@ -0,0 +1,110 @@
+import re
+from typing import Dict, Optional
+
+# One compiled alternation scanned once per query. Every term is anchored on
+# word boundaries, so "hi" no longer matches "which" or "this".
+_TERMS = {
+    "greeting": r"hi|hello|hey|yo|greetings|good (?:morning|afternoon|evening)|how are you|how is your day going"
+                r"|what'?s up|thanks?(?: you)?|thx|bye|goodbye|good ?job|who are you|what can you do"
+                r"|tell me about yourself|help",
+    # Explicit gas words: only these (or a tier lookup) unlock template answers
+    "gas": r"gas|gwei|fees?|base ?fee|priority (?:fee|tip)|miner tip|gas ?price",
+    # Tier words are everyday English ("quick question", "low-level", "average
+    # block time"), so they only count next to a gas word, "tier" or on their own
+    "tier": r"safe|slow|low|propose|proposed|standard|average|normal|fast|rapid|quick",
+    "tier_word": r"tiers?",
+    # Sending or waiting is what this agent advises on, so it implies gas
+    "timing": r"wait|waiting|send|sending|now or later|hold off",
+    "advice": r"should|when|now or|best time|recommend\w*|worth|cheap\w*|save|predict\w*|trend\w*|going (?:up|down)|will",
+    # Conceptual questions about gas need an explanation, not today's numbers
+    "explain": r"what (?:is|are) an?|explain\w*|why|mean|means|meaning|defin\w*|how (?:does|do)|limits?|units?"
+               r"|uses?|consumes?|eip-?\d+",
+    "data": r"current|currently|now|right now|today|what(?:'?s| is| are) the|how much|how high|how low|level|value",
+    # Phrases rather than bare "network"/"busy", which match the lightning network or a busy mall
+    "congestion": r"congest\w*|block (?:space )?utili[sz]ation|blocks? (?:are )?full"
+                  r"|network (?:is )?busy|busy network|how busy is (?:the )?network|network (?:load|activity|traffic)",
+    "transaction": r"transactions?|txs?|speed ?up|cancel|stuck|pending|replace",
+}
+_PATTERN = re.compile(
+    r"\b(?:" + "|".join(f"(?P<{name}>{terms})" for name, terms in _TERMS.items()) + r")\b"
+)
+_TIERS = {
+    "safe": "safe", "slow": "safe", "low": "safe",
+    "propose": "propose", "proposed": "propose", "standard": "propose", "average": "propose", "normal": "propose",
+    "fast": "fast", "rapid": "fast", "quick": "fast",
+}
+# A query that is nothing but a lookup, such as "gas?", "fast?" or "safe tier"
+_LOOKUP_WORD = r"(?:" + _TERMS["tier"] + "|" + _TERMS["gas"] + r"|prices?|tiers?)"
+_BARE_LOOKUP = re.compile(r"\s*" + _LOOKUP_WORD + r"(?:\s+" + _LOOKUP_WORD + r")?\s*[?.!]*\s*")
+# Words that ask for a number even without a data word ("what is gas price")
+_PRICE_WORDS = re.compile(r"\b(?:gwei|prices?|base ?fee)\b")
+# Direct data questions are short; longer questions go to the model
+_MAX_DATA_QUERY_WORDS = 8
+
+
+class Intent:
+    """Routing decision for a query: an intent name plus extracted slots.
+
+    Intents:
+      casual   -- greetings and small talk; short model answer, no gas data
+      gas_data -- a direct question about current numbers; answered from a template
+      gas      -- gas or transaction question that needs analysis; model with gas data
+      general  -- anything else; model without gas data
+    """
+    __slots__ = ("name", "slots")
+
+    def __init__(self, name: str, slots: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.slots = slots or {}
+
+    @property
+    def needs_gas_data(self) -> bool:
+        return self.name in ("gas", "gas_data")
+
+    def __repr__(self) -> str:
+        return f"Intent({self.name!r}, {self.slots!r})"
+
+
+def classify(query: str) -> Intent:
+    """Classify a query in a single regex pass."""
+    lowered = query.lower()
+    hits = {}
+    tier = None
+    for match in _PATTERN.finditer(lowered):
+        group = match.lastgroup
+        hits[group] = hits.get(group, 0) + 1
+        if group == "tier" and tier is None:
+            tier = _TIERS[match.group()]
+
+    gas = hits.get("gas", 0)
+    congestion = hits.get("congestion", 0)
+    bare = _BARE_LOOKUP.fullmatch(lowered) is not None
+    if not (gas or hits.get("tier_word") or bare):
+        tier = None  # A tier word outside a gas context is just a word
+    about_gas = (gas or congestion or hits.get("transaction", 0) or hits.get("timing", 0)
+                 or tier is not None)
+
+    if not about_gas:
+        if hits.get("greeting"):
+            return Intent("casual")
+        return Intent("general")
+
+    words = len(query.split())
+    # Only a gas word or a tier in gas context, asked for as data ("current",
+    # "what's the", "how much", a price word) or on its own, is enough evidence
+    # to skip the model
+    if (not hits.get("advice") and not hits.get("timing") and not hits.get("transaction")
+            and not hits.get("explain") and words <= _MAX_DATA_QUERY_WORDS
+            and (gas or tier is not None) and (hits.get("data") or bare or _PRICE_WORDS.search(lowered))):
+        if "base fee" in lowered or "basefee" in lowered:
+            return Intent("gas_data", {"metric": "base_fee"})
+        # "gas used" is read as the gas word by the scan, so look for the phrase here
+        if (congestion or "gas used" in lowered) and not tier:
+            return Intent("gas_data", {"metric": "congestion"})
+        slots = {"metric": "price"}
+        if tier:
+            slots["tier"] = tier
+        return Intent("gas_data", slots)
+
+    slots = {"tier": tier} if tier else {}
+    return Intent("gas", slots)
@@ -1,22 +1,81 @@
-from fastapi import FastAPI, Request, HTTPException
+import time
+_import_started = time.perf_counter()  # Before the heavy imports, for the startup profile
+
+from fastapi import FastAPI, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 import logging
 import asyncio
 from .gas_genie import GasGenie
-from .providers.model_provider import ModelProvider
+from .gas_api import etag_matches, document_headers
+from .sse import sse_frames, batch_sse_frames, encode_event, encode_item_event
+from .timing import RequestTimer, StartupProfile, log_access
+from .providers.flush_policy import get_flush_policy
+from .scheduler import Overloaded
+from .sessions import Session, CLOSE_TRY_AGAIN_LATER
+from . import metrics
 import os
 import json
 import traceback
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
 
 # Configure logging
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+startup = StartupProfile(_import_started)
+startup.mark("imports")
+
+# "background" starts serving at once and loads the model client and first gas
+# snapshot after the port is bound; "eager" loads them before serving
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background")
+
+# Created by the lifespan, so only a process that serves requests builds one
+# (not the supervisor of a multi-worker server)
+agent: Optional[GasGenie] = None
+
+def create_agent() -> GasGenie:
+    global agent
+    if agent is None:
+        logger.info("Initializing GasGenie...")
+        agent = GasGenie("Gas Genie")
+        startup.mark("agent_init")
+        logger.info("Agent initialization complete")
+    return agent
+
+async def warm_up():
+    await agent.start()
+    await agent.prewarm(startup)
+    logger.info(f"Startup profile (ms since import): {startup.to_dict()}")
+
+def on_warm_up_done(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background warm-up failed: {task.exception()}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Tie the agent's upstream connections to the app lifecycle."""
+    create_agent()
+    if STARTUP_MODE == "eager":
+        await warm_up()
+        warming = None
+    else:
+        warming = asyncio.create_task(warm_up())
+        warming.add_done_callback(on_warm_up_done)
+    lag_monitor = asyncio.create_task(metrics.monitor_event_loop_lag())
+    startup.mark("serving")
+    try:
+        yield
+    finally:
+        lag_monitor.cancel()
+        if warming is not None and not warming.done():
+            warming.cancel()
+        await agent.close()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -27,79 +86,162 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize the agent
-logger.info("Initializing ModelProvider...")
-model_provider = ModelProvider(api_key=os.getenv("FIREWORKS_API_KEY"))
-logger.info("Initializing GasGenie...")
-agent = GasGenie("Gas Genie")
-logger.info("Agent initialization complete")
+# Values the agent already counts are read when /metrics is scraped
+metrics.register_callback(
+    "gasgenie_response_cache_hits_total", "Response cache hits.", "counter",
+    lambda: agent.response_cache.hits
+)
+metrics.register_callback(
+    "gasgenie_response_cache_misses_total", "Response cache misses.", "counter",
+    lambda: agent.response_cache.misses
+)
+metrics.register_callback(
+    "gasgenie_response_cache_hit_ratio", "Response cache hits over lookups.", "gauge",
+    lambda: agent.response_cache.stats()["hit_ratio"]
+)
+metrics.register_callback(
+    "gasgenie_inflight_streams", "Model generations in progress.", "gauge",
+    lambda: agent.inflight.stats()["in_flight"]
+)
+metrics.register_callback(
+    "gasgenie_inflight_joined_total", "Requests that joined an in-progress generation.", "counter",
+    lambda: agent.inflight.joined
+)
+for _upstream in ("etherscan", "fireworks"):
+    metrics.register_callback(
+        f"gasgenie_{_upstream}_queued", f"Requests waiting for admission to {_upstream}.", "gauge",
+        lambda upstream=_upstream: agent.scheduler.stats()[upstream]["queued"]
+    )
+    metrics.register_callback(
+        f"gasgenie_{_upstream}_rejected_total", f"Requests shed by {_upstream} admission control.", "counter",
+        lambda upstream=_upstream: agent.scheduler[upstream].rejected
+    )
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
     return {"status": "healthy"}
 
+@app.get("/stats")
+async def stats():
+    """Cache and request coalescing statistics."""
+    return {
+        "response_cache": agent.response_cache.stats(),
+        "inflight": agent.inflight.stats(),
+        "streaming": agent.model_provider.stream_stats(),
+        "scheduler": agent.scheduler.stats(),
+        "models": agent.model_provider.model_stats(),
+        "worker": {"pid": os.getpid(), "gas_leader": agent.gas_provider.is_leader},
+        "startup_ms": startup.to_dict(),
+        "websocket": agent.gas_updates.stats()
+    }
+
+def overloaded_response(e: Overloaded) -> JSONResponse:
+    """429 telling the client when to retry, for a request shed by admission control."""
+    return JSONResponse(
+        status_code=429,
+        content={"error": str(e)},
+        headers={"Retry-After": str(int(e.retry_after))}
+    )
+
+async def gas_document_response(request: Request, view: str) -> Response:
+    """Serve a pre-serialized gas API view, honouring If-None-Match."""
+    try:
+        snapshot, document = await agent.get_gas_document(view)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        logger.error(f"Error getting gas document: {str(e)}")
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    
+    provider = agent.gas_provider
+    headers = document_headers(document, snapshot.age(), provider.cache_ttl, provider.stale_ttl)
+    if etag_matches(request.headers.get("if-none-match"), document.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=document.body, media_type="application/json", headers=headers)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics."""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/v1/gas")
+async def gas(request: Request):
+    """Current gas prices, analytics and recommendation as JSON."""
+    return await gas_document_response(request, "gas")
+
+@app.get("/v1/gas/recommendation")
+async def gas_recommendation(request: Request):
+    """Current gas recommendation as JSON."""
+    return await gas_document_response(request, "recommendation")
+
+async def timed_stream(
+    frames: AsyncIterator[bytes],
+    timer: RequestTimer,
+    query_id: str,
+    route: str = "/assist"
+) -> AsyncIterator[bytes]:
+    """Pass frames through and write the access log line when the response ends."""
+    status = "ok"
+    try:
+        async for frame in frames:
+            yield frame
+    except BaseException:
+        status = "disconnected"
+        raise
+    finally:
+        log_access(timer, route=route, query_id=query_id, status=status)
+
 @app.post("/assist")
 async def assist(request: Request):
-    """Handle assistance requests with streaming response."""
+    """Handle assistance requests with streaming response.
+
+    Send "timing": true in the body (or an X-Timing: 1 header) to receive the
+    request's stage timings as a final "timing" event before "done".
+    """
+    timer = RequestTimer()
     try:
-        logger.info("Received assist request")
         data = await request.json()
-        logger.debug(f"Request data: {json.dumps(data, indent=2)}")
+        timer.mark("parse")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Request data: %s", json.dumps(data, indent=2))
         
         query_text = data.get("query", {}).get("prompt")
         query_id = data.get("query", {}).get("id", "unknown")
         
-        logger.info(f"Processing query: {query_text}")
-        logger.debug(f"Query ID: {query_id}")
-        
         if not query_text:
             logger.error("No query provided in request")
             return JSONResponse(
                 status_code=400,
                 content={"error": "No query provided"}
             )
-            
-        logger.debug("Starting response generation")
         
-        async def generate_response():
-            try:
-                logger.debug("Starting to generate response chunks")
-                logger.debug("Calling agent.assist()")
-                response_generator = agent.assist(query_text, query_id)
-                logger.debug("Got response generator from agent.assist()")
-                
-                async for chunk in response_generator:
-                    logger.debug(f"Received chunk from agent: {chunk[:50]}...")
-                    if not chunk or not isinstance(chunk, str):
-                        logger.debug("Skipping invalid chunk")
-                        continue
-                        
-                    event_data = {
-                        "type": "message",
-                        "content": chunk
-                    }
-                    logger.debug(f"Sending event: {json.dumps(event_data)}")
-                    yield f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
-            except Exception as e:
-                logger.error(f"Error in response generation: {str(e)}")
-                logger.error(f"Traceback: {traceback.format_exc()}")
-                error_data = {
-                    "type": "error",
-                    "content": str(e)
-                }
-                yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
-            finally:
-                logger.debug("Sending completion event")
-                completion_data = {
-                    "type": "done",
-                    "content": ""
-                }
-                yield f"data: {json.dumps(completion_data, ensure_ascii=False)}\n\n"
+        # Chunking of the model output: "word" by default for the chat UI, or
+        # the policy named in the request (e.g. "window" for API consumers)
+        try:
+            flush = get_flush_policy(data.get("flush") or os.getenv("ASSIST_FLUSH_POLICY"))
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        
+        want_timing = bool(data.get("timing")) or request.headers.get("x-timing", "").lower() in ("1", "true")
+        trailer = (lambda: encode_event("timing", timer.to_dict())) if want_timing else None
         
-        logger.debug("Returning streaming response")
+        logger.info("Processing query %s: %s", query_id, query_text)
+        
+        # Routing and upstream admission happen before the response starts,
+        # so a request that would only queue is turned away with a 429
+        try:
+            stream = await agent.open_assist(query_text, query_id, flush=flush, timer=timer)
+        except Overloaded as e:
+            log_access(timer, route="/assist", query_id=query_id, status="overloaded")
+            return overloaded_response(e)
+        
+        # Chunks are coalesced and encoded by the SSE layer; nothing on the
+        # per-chunk path logs or builds intermediate dicts. "immediate" asks
+        # for every token as it arrives, so it skips the coalescing.
+        frames = sse_frames(stream, trailer=trailer, flush_interval=0 if flush.name == "immediate" else None)
         return StreamingResponse(
-            generate_response(),
+            timed_stream(frames, timer, query_id),
             media_type="text/event-stream"
         )
         
@@ -111,7 +253,115 @@ async def assist(request: Request):
             content={"error": str(e)}
         )
 
+# Largest batch /assist/batch accepts
+ASSIST_BATCH_MAX_ITEMS = int(os.getenv("ASSIST_BATCH_MAX_ITEMS", "50"))
+
+@app.post("/assist/batch")
+async def assist_batch(request: Request):
+    """Answer several queries against one gas snapshot over one SSE stream.
+
+    The body is {"items": [{"id": ..., "prompt": ...}, ...]}. Events of all
+    items are interleaved and carry the item's "id"; each item ends with its
+    own "done" event and the stream with an untagged one. "flush" and
+    "timing" are as for /assist, with timing events sent per item.
+    """
+    timer = RequestTimer()
+    try:
+        data = await request.json()
+        timer.mark("parse")
+        
+        items = data.get("items")
+        if not isinstance(items, list) or not items:
+            return JSONResponse(status_code=400, content={"error": "No items provided"})
+        if len(items) > ASSIST_BATCH_MAX_ITEMS:
+            return JSONResponse(
+                status_code=400,
+                content={"error": f"At most {ASSIST_BATCH_MAX_ITEMS} items per batch"}
+            )
+        queries = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not item.get("prompt"):
+                return JSONResponse(status_code=400, content={"error": f"Item {index} has no prompt"})
+            queries.append((str(item.get("id", index)), item["prompt"]))
+        if len({item_id for item_id, _ in queries}) != len(queries):
+            return JSONResponse(status_code=400, content={"error": "Item ids must be unique"})
+        
+        # Batch callers are API consumers, so model output comes in fewer, larger chunks
+        try:
+            flush = get_flush_policy(data.get("flush") or "window")
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        
+        want_timing = bool(data.get("timing")) or request.headers.get("x-timing", "").lower() in ("1", "true")
+        timers = {item_id: RequestTimer(timer.start) for item_id, _ in queries} if want_timing else None
+        trailer = (lambda item_id: encode_item_event(item_id, "timing", timers[item_id].to_dict())) if want_timing else None
+        
+        batch_id = f"batch:{queries[0][0]}+{len(queries) - 1}"
+        logger.info("Processing batch of %d queries", len(queries))
+        
+        try:
+            events = await agent.open_batch(queries, flush=flush, timer=timer, timers=timers)
+        except Overloaded as e:
+            log_access(timer, route="/assist/batch", query_id=batch_id, status="overloaded")
+            return overloaded_response(e)
+        
+        return StreamingResponse(
+            timed_stream(batch_sse_frames(events, trailer=trailer), timer, batch_id, route="/assist/batch"),
+            media_type="text/event-stream"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in batch assist endpoint: {str(e)}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(e)}
+        )
+
+# Sessions one worker accepts before turning new ones away
+WS_MAX_SESSIONS = int(os.getenv("WS_MAX_SESSIONS", "5000"))
+
+@app.websocket("/ws")
+async def websocket_session(websocket: WebSocket):
+    """A persistent session: chat turns multiplexed by id, plus pushed gas updates.
+
+    Send {"type": "assist", "id": ..., "prompt": ...} to start a turn and
+    {"type": "cancel", "id": ...} to stop one. Turn events ("message",
+    "done", "error") carry the turn's id. The server also sends the current
+    gas state as a "gas" event and each later change as a "gas_delta".
+    """
+    if len(agent.gas_updates.sessions) >= WS_MAX_SESSIONS:
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+        return
+    await websocket.accept()
+    await Session(websocket, agent, agent.gas_updates).serve()
+
+def serve_workers(host: str, port: int, workers: int, log_level: str):
+    """Run several uvicorn worker processes on one listening socket."""
+    import socket
+    import uvicorn
+    from uvicorn.supervisors import Multiprocess
+    config = uvicorn.Config("src.gas_genie.main:app", host=host, port=port, workers=workers, log_level=log_level)
+    sock = config.bind_socket()
+    # uvicorn's listener is created without IPPROTO_TCP, so asyncio does not set
+    # TCP_NODELAY on the connections; accepted sockets inherit it from here.
+    # Without it small responses wait ~40 ms for delayed ACKs.
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    Multiprocess(config, target=uvicorn.Server(config).run, sockets=[sock]).run()
+
 if __name__ == "__main__":
     import uvicorn
-    logger.info("Starting server...")
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "8000"))
+    log_level = os.getenv("LOG_LEVEL", "INFO").lower()
+    workers = int(os.getenv("GAS_WORKERS", "1"))
+    if workers > 1:
+        # Workers share one gas snapshot, fetched by whichever of them is elected
+        if not os.getenv("GAS_SHARED_DIR"):
+            import tempfile
+            os.environ["GAS_SHARED_DIR"] = tempfile.mkdtemp(prefix="gas-genie-")
+        logger.info(f"Starting {workers} workers sharing gas data in {os.environ['GAS_SHARED_DIR']}...")
+        serve_workers(host, port, workers, log_level)
+    else:
+        logger.info("Starting server...")
+        uvicorn.run(app, host=host, port=port, log_level=log_level)
@@ -0,0 +1,255 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Metrics are updated from the event loop thread only, so the primitives are
+# plain attribute updates with no locking. Label children are created up
+# front (or once, on first use) and the hot path only does a dict lookup and
+# an add; all formatting happens when /metrics is scraped.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+INTER_TOKEN_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0)
+GENERATION_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    """A named metric with one child value per combination of label values."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 label_values: Iterable[Sequence[str]] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        for values in label_values:
+            self.labels(*values)
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh value for one combination of label values."""
+
+    def labels(self, *values: str):
+        """The child for these label values, created on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._children.items():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].value += amount
+
+
+class Gauge(_Metric):
+    """A value that can go up and down."""
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self._children[()].value = value
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].value += amount
+
+    def dec(self, amount: float = 1.0):
+        self._children[()].value -= amount
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed, preallocated buckets."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 label_values: Iterable[Sequence[str]] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, label_values)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Callback(_Metric):
+    """A counter or gauge read from a function at scrape time, for values other components already keep."""
+
+    def __init__(self, name: str, documentation: str, kind: str, read: Callable[[], float]):
+        self.kind = kind
+        self._read = read
+        super().__init__(name, documentation)
+
+    def _new_child(self):
+        return None
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            f"{self.name} {_format_value(self._read())}"
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.error(f"Failed to render metric {metric.name}: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+INTENTS = ("casual", "gas_data", "gas", "general")
+
+ASSIST_REQUESTS = REGISTRY.register(Counter(
+    "gasgenie_assist_requests_total", "Assist requests by routed intent.",
+    ("intent",), [(intent,) for intent in INTENTS]
+))
+GAS_FETCH_SECONDS = REGISTRY.register(Histogram(
+    "gasgenie_gas_fetch_seconds", "Gas data fetch latency by backend.",
+    ("backend",), [("etherscan",), ("rpc",)]
+))
+GAS_FETCH_ERRORS = REGISTRY.register(Counter(
+    "gasgenie_gas_fetch_errors_total", "Failed gas data fetches by backend.",
+    ("backend",), [("etherscan",), ("rpc",)]
+))
+MODEL_TTFT_SECONDS = REGISTRY.register(Histogram(
+    "gasgenie_model_time_to_first_token_seconds", "Time from sending a model request to its first token."
+))
+MODEL_INTER_TOKEN_SECONDS = REGISTRY.register(Histogram(
+    "gasgenie_model_inter_token_seconds", "Time between consecutive model tokens.", buckets=INTER_TOKEN_BUCKETS
+))
+MODEL_GENERATION_SECONDS = REGISTRY.register(Histogram(
+    "gasgenie_model_generation_seconds", "Total time of a model stream, request to last token.",
+    buckets=GENERATION_BUCKETS
+))
+MODEL_TOKENS = REGISTRY.register(Counter(
+    "gasgenie_model_tokens_total", "Tokens reported by the model API.",
+    ("kind",), [("prompt",), ("completion",)]
+))
+MODEL_ERRORS = REGISTRY.register(Counter(
+    "gasgenie_model_errors_total", "Failed model streams by error kind.",
+    ("kind",), [("timeout",), ("auth",), ("rate_limit",), ("upstream",), ("circuit_open",), ("other",)]
+))
+MODEL_HEDGES = REGISTRY.register(Counter(
+    "gasgenie_model_hedges_total", "Duplicate model requests sent after a late first token, and how many won.",
+    ("outcome",), [("fired",), ("won",)]
+))
+MODEL_FALLBACKS = REGISTRY.register(Counter(
+    "gasgenie_model_fallbacks_total", "Model streams served by a fallback model, by model.", ("model",)
+))
+EVENT_LOOP_LAG_SECONDS = REGISTRY.register(Histogram(
+    "gasgenie_event_loop_lag_seconds", "How late the event loop ran a scheduled wakeup.",
+    buckets=LOOP_LAG_BUCKETS
+))
+
+
+async def monitor_event_loop_lag(interval: float = 0.25):
+    """Sample event loop lag until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - expected))
+
+
+def register_callback(name: str, documentation: str, kind: str, read: Callable[[], float]):
+    """Register (or replace) a metric whose value is read at scrape time."""
+    REGISTRY.register(Callback(name, documentation, kind, read))
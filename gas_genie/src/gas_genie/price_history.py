@@ -0,0 +1,147 @@
+import logging
+import os
+from typing import Dict, Any, Iterator, List, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Scalar columns stored per sample, keyed by the sample dict field they hold
+COLUMNS = (
+    ("timestamp", np.float64),
+    ("last_block", np.uint32),
+    ("safe", np.float64),
+    ("propose", np.float64),
+    ("fast", np.float64),
+    ("suggested_base_fee", np.float64),
+)
+
+
+class PriceHistory:
+    """Fixed-capacity history of gas samples stored as NumPy columns.
+
+    Samples are kept in chronological order in preallocated arrays with some
+    slack at the end; when the slack is used up the newest `capacity` samples
+    are shifted back to the front. The live window is therefore always one
+    contiguous slice, so column() hands out zero-copy views. A sample costs
+    about 80 bytes including slack (the gas used ratios of the last
+    `ratio_width` blocks are stored as float32).
+
+    Indexing and iteration return sample dicts, so the class can stand in for
+    the deque of dicts it replaces.
+    """
+
+    def __init__(self, capacity: int = None, ratio_width: int = 5):
+        self.capacity = capacity or int(os.getenv("GAS_HISTORY_CAPACITY", "50000"))
+        if self.capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.ratio_width = ratio_width
+        size = self.capacity + max(self.capacity // 4, 1)
+        self._columns = {name: np.zeros(size, dtype=dtype) for name, dtype in COLUMNS}
+        self._ratios = np.zeros((size, ratio_width), dtype=np.float32)
+        self._ratio_counts = np.zeros(size, dtype=np.uint8)
+        self._end = 0  # One past the newest sample
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the preallocated columns."""
+        return (sum(column.nbytes for column in self._columns.values())
+                + self._ratios.nbytes + self._ratio_counts.nbytes)
+
+    def append(self, sample: Dict[str, Any]):
+        """Record a sample dict as returned by GasPriceProvider."""
+        if self._end == len(self._ratio_counts):
+            self._compact()
+        i = self._end
+        for name, _ in COLUMNS:
+            self._columns[name][i] = sample.get(name) or 0
+        ratios = (sample.get("gas_used_ratio") or [])[:self.ratio_width]
+        self._ratios[i, :len(ratios)] = ratios
+        self._ratios[i, len(ratios):] = 0
+        self._ratio_counts[i] = len(ratios)
+        self._end += 1
+        self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, samples):
+        for sample in samples:
+            self.append(sample)
+
+    def load_records(self, records: np.ndarray):
+        """Replace the contents with a structured array of samples (oldest first).
+
+        records needs a field per column plus "gas_used_ratio" and
+        "gas_used_ratio_count", as written by HistoryStore.
+        """
+        records = records[-self.capacity:]
+        n = len(records)
+        for name, _ in COLUMNS:
+            self._columns[name][:n] = records[name]
+        width = min(self.ratio_width, records.dtype["gas_used_ratio"].shape[0]) if n else 0
+        self._ratios[:n] = 0
+        self._ratios[:n, :width] = records["gas_used_ratio"][:, :width]
+        self._ratio_counts[:n] = np.minimum(records["gas_used_ratio_count"], width) if n else 0
+        self._end = n
+        self._size = n
+
+    def clear(self):
+        self._end = 0
+        self._size = 0
+
+    def _compact(self):
+        """Move the newest capacity - 1 samples to the front to make room for one more."""
+        keep = self.capacity - 1
+        start = self._end - keep
+        for column in self._columns.values():
+            column[:keep] = column[start:self._end]
+        self._ratios[:keep] = self._ratios[start:self._end]
+        self._ratio_counts[:keep] = self._ratio_counts[start:self._end]
+        self._end = keep
+        self._size = min(self._size, keep)
+
+    def _window(self, last: int = None) -> slice:
+        n = self._size if last is None else min(last, self._size)
+        return slice(self._end - n, self._end)
+
+    def column(self, name: str, last: int = None) -> np.ndarray:
+        """Chronological read-only view of one column, optionally only the newest `last` samples."""
+        view = self._columns[name][self._window(last)]
+        view.flags.writeable = False
+        return view
+
+    def gas_used_ratios(self, last: int = None) -> np.ndarray:
+        """(n, ratio_width) view of the gas used ratios; unused slots are zero."""
+        view = self._ratios[self._window(last)]
+        view.flags.writeable = False
+        return view
+
+    def gas_used_ratio_means(self, last: int = None) -> np.ndarray:
+        """Mean gas used ratio of each sample."""
+        window = self._window(last)
+        counts = self._ratio_counts[window]
+        return self._ratios[window].sum(axis=1, dtype=np.float64) / np.maximum(counts, 1)
+
+    def _sample(self, i: int) -> Dict[str, Any]:
+        sample = {name: self._columns[name][i].item() for name, _ in COLUMNS}
+        # float32 storage; round so the dict view doesn't show representation noise
+        sample["gas_used_ratio"] = [round(r, 6) for r in self._ratios[i, :self._ratio_counts[i]].tolist()]
+        return sample
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        if isinstance(index, slice):
+            return [self._sample(self._end - self._size + i) for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("price history index out of range")
+        return self._sample(self._end - self._size + index)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(self._end - self._size, self._end):
+            yield self._sample(i)
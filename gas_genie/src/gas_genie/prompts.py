@@ -0,0 +1,104 @@
+from .recommendation import Recommendation
+
+# Everything in the gas context is derived from the snapshot and rendered once
+# per snapshot version. The user query is sent in a separate, final message so
+# the system prompt plus this block form a byte-identical prefix across
+# requests, which the model provider can serve from its prompt cache.
+GAS_CONTEXT_TEMPLATE = """Current gas prices and network conditions:
+- Safe: {safe} Gwei
+- Propose: {propose} Gwei
+- Fast: {fast} Gwei
+- Base Fee: {suggested_base_fee} Gwei
+
+Network Status:
+- Base Fee: {base_fee} Gwei
+- Gas Used Ratio: {gas_used_ratio}
+- Congestion Level: {congestion_level}
+
+Price Trend:
+- Trend: {trend}
+- Change: {change_percentage:.2f}%
+- Current Price: {current_price} Gwei
+- Previous Price: {previous_price} Gwei
+
+Recommendation:
+- Suggested Action: {suggestion}
+- Recommended Price: {recommended_price} Gwei
+- Confidence: {confidence:.1f}%
+
+When the user asks about gas, provide a detailed analysis and recommendation based on the above data. Consider:
+1. Current network conditions and their impact
+2. Price trends and their implications
+3. Specific recommendations for the user's query
+4. Alternative options if applicable
+5. Any risks or considerations to be aware of"""
+
+GAS_QUERY_TEMPLATE = "User query: {query}"
+
+GENERAL_QUERY_TEMPLATE = """User query: {query}
+
+Please provide a helpful and friendly response. Keep it concise and natural."""
+
+
+def render_gas_context(recommendation: Recommendation) -> str:
+    """Render the snapshot data block for the model."""
+    prices = recommendation.current_prices
+    trend = recommendation.price_trend
+    return GAS_CONTEXT_TEMPLATE.format(
+        safe=prices.get("safe", "N/A"),
+        propose=prices.get("propose", "N/A"),
+        fast=prices.get("fast", "N/A"),
+        suggested_base_fee=prices.get("suggested_base_fee", "N/A"),
+        base_fee=recommendation.base_fee,
+        gas_used_ratio=recommendation.gas_used_ratio,
+        congestion_level=recommendation.congestion_level,
+        trend=trend.get("trend", "unknown"),
+        change_percentage=trend.get("change_percentage", 0),
+        current_price=trend.get("current_price", "N/A"),
+        previous_price=trend.get("previous_price", "N/A"),
+        suggestion=recommendation.suggestion,
+        recommended_price=recommendation.recommended_price,
+        confidence=recommendation.confidence * 100
+    )
+
+
+# Direct data questions ("current gas price?", "fast tier?") are answered from
+# these templates without calling the model.
+TIER_LABELS = {"safe": "Safe", "propose": "Propose", "fast": "Fast"}
+
+GAS_PRICES_ANSWER = ("Current gas prices: Safe {safe} Gwei, Propose {propose} Gwei, Fast {fast} Gwei "
+                     "(base fee {base_fee} Gwei). Suggested action: {suggestion}.")
+GAS_TIER_ANSWER = "The {label} gas price is {price} Gwei right now (base fee {base_fee} Gwei)."
+BASE_FEE_ANSWER = "The current base fee is {base_fee} Gwei."
+CONGESTION_ANSWER = "Network congestion is {congestion_level} right now (gas used ratio {gas_used_ratio:.0%})."
+
+
+def _gwei(value) -> str:
+    try:
+        return f"{float(value):.4g}"
+    except (TypeError, ValueError):
+        return "N/A"
+
+
+def render_gas_answer(slots: dict, recommendation: Recommendation) -> str:
+    """Answer a gas_data intent from the recommendation."""
+    prices = recommendation.current_prices
+    base_fee = _gwei(prices.get("suggested_base_fee"))
+    metric = slots.get("metric", "price")
+    if metric == "congestion":
+        return CONGESTION_ANSWER.format(
+            congestion_level=recommendation.congestion_level,
+            gas_used_ratio=recommendation.gas_used_ratio
+        )
+    if metric == "base_fee":
+        return BASE_FEE_ANSWER.format(base_fee=base_fee)
+    tier = slots.get("tier")
+    if tier:
+        return GAS_TIER_ANSWER.format(label=TIER_LABELS[tier], price=_gwei(prices.get(tier)), base_fee=base_fee)
+    return GAS_PRICES_ANSWER.format(
+        safe=_gwei(prices.get("safe")),
+        propose=_gwei(prices.get("propose")),
+        fast=_gwei(prices.get("fast")),
+        base_fee=base_fee,
+        suggestion=recommendation.suggestion
+    )
@@ -0,0 +1,133 @@
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when every model in the fallback chain is failing fast."""
+
+
+class Admission:
+    """A request let through by a breaker; report how it ended with record() or abandon()."""
+    __slots__ = ("breaker", "epoch", "probe")
+
+    def __init__(self, breaker: "CircuitBreaker", epoch: int, probe: bool):
+        self.breaker = breaker
+        self.epoch = epoch
+        self.probe = probe
+
+    def record(self, ok: bool):
+        self.breaker.record(self, ok)
+
+    def abandon(self):
+        self.breaker.abandon(self)
+
+
+class CircuitBreaker:
+    """Fails fast for a model whose recent requests mostly failed.
+
+    Outcomes from the last window seconds are kept. Once at least
+    min_requests have been seen and the failed fraction reaches threshold,
+    the breaker opens and allow() refuses requests for cooldown seconds.
+    After that a single probe is let through (half open); its success
+    closes the breaker and its failure opens it for another cooldown.
+
+    Every change of state starts a new epoch, and each admission carries
+    the epoch it was let through in. Outcomes from an earlier epoch are
+    ignored, so a long stream admitted before an outage cannot close the
+    breaker by finishing successfully; only the probe decides.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        threshold: float = None,
+        min_requests: int = None,
+        window: float = None,
+        cooldown: float = None
+    ):
+        self.name = name
+        self.threshold = threshold if threshold is not None else float(os.getenv("MODEL_BREAKER_THRESHOLD", "0.5"))
+        self.min_requests = min_requests if min_requests is not None else int(os.getenv("MODEL_BREAKER_MIN_REQUESTS", "10"))
+        self.window = window if window is not None else float(os.getenv("MODEL_BREAKER_WINDOW", "30"))
+        self.cooldown = cooldown if cooldown is not None else float(os.getenv("MODEL_BREAKER_COOLDOWN", "15"))
+        self.state = CLOSED
+        self._outcomes: Deque[Tuple[float, bool]] = deque()  # (time, failed), oldest first
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._epoch = 0
+        self.opened = 0  # Times the breaker has opened
+
+    def _prune(self, now: float):
+        horizon = now - self.window
+        outcomes = self._outcomes
+        while outcomes and outcomes[0][0] < horizon:
+            if outcomes.popleft()[1]:
+                self._failures -= 1
+
+    def allow(self) -> Optional[Admission]:
+        """An Admission if a request may be sent now, else None."""
+        if self.state == CLOSED:
+            return Admission(self, self._epoch, False)
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return None
+            self.state = HALF_OPEN
+            self._epoch += 1
+        if self._probing:
+            return None
+        self._probing = True
+        return Admission(self, self._epoch, True)
+
+    def record(self, admission: Admission, ok: bool):
+        now = time.monotonic()
+        if admission.probe:
+            self._probing = False
+            if ok:
+                logger.info(f"Circuit for {self.name} closed")
+                self.state = CLOSED
+                self._epoch += 1
+                self._outcomes.clear()
+                self._failures = 0
+            else:
+                self._open(now)
+            return
+        if self.state != CLOSED or admission.epoch != self._epoch:
+            return  # Admitted before the breaker last changed state
+        self._outcomes.append((now, not ok))
+        if not ok:
+            self._failures += 1
+        self._prune(now)
+        if len(self._outcomes) >= self.min_requests and self._failures >= self.threshold * len(self._outcomes):
+            self._open(now)
+
+    def abandon(self, admission: Admission):
+        """The admitted request ended without a verdict (e.g. the client went away)."""
+        if admission.probe:
+            self._probing = False
+
+    def _open(self, now: float):
+        if self.state != OPEN:
+            self.opened += 1
+            logger.warning(f"Circuit for {self.name} opened, failing fast for {self.cooldown:.0f}s")
+        self.state = OPEN
+        self._epoch += 1
+        self._opened_at = now
+
+    def stats(self) -> Dict[str, Any]:
+        self._prune(time.monotonic())
+        return {
+            "state": self.state,
+            "recent_requests": len(self._outcomes),
+            "recent_failures": self._failures,
+            "opened": self.opened
+        }
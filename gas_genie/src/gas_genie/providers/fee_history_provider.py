@@ -0,0 +1,169 @@
+from typing import Dict, Any, List, Tuple, Callable, Awaitable, Optional, TYPE_CHECKING
+import asyncio
+import logging
+import os
+import time
+
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger(__name__)
+
+GWEI = 1e9
+MAX_FEE_HISTORY_BLOCKS = 1024  # Per-call cap enforced by geth and most providers
+EXACT_TIMESTAMP_BLOCKS = 64  # Ranges up to this size fetch every block header
+
+
+class FeeHistoryProvider:
+    """Per-block gas samples from a JSON-RPC node via eth_feeHistory.
+
+    Produces the same sample dicts as the Etherscan backend, one per block:
+    safe/propose/fast are the block's base fee plus the 10th/50th/90th
+    percentile priority fee paid in it, suggested_base_fee is the base fee
+    of the following block, and gas_used_ratio holds the ratios of this
+    block and the ones before it, newest first. Large ranges are fetched as
+    JSON-RPC batch requests of up to batch_size calls, several of them
+    concurrently.
+    """
+
+    def __init__(
+        self,
+        rpc_url: str = None,
+        get_session: Callable[[], Awaitable["aiohttp.ClientSession"]] = None,
+        batch_size: int = None,
+        max_concurrency: int = 4,
+        reward_percentiles: Tuple[float, float, float] = (10, 50, 90),
+        ratio_width: int = 5
+    ):
+        self.rpc_url = rpc_url or os.getenv("ETH_RPC_URL")
+        if not self.rpc_url:
+            raise ValueError("ETH_RPC_URL is not set")
+        self._get_session = get_session
+        self.batch_size = batch_size or int(os.getenv("GAS_RPC_BATCH_SIZE", "20"))
+        self.max_concurrency = max_concurrency
+        self.reward_percentiles = list(reward_percentiles)
+        self.ratio_width = ratio_width
+        self.last_block: Optional[int] = None  # Newest block already returned
+        self._request_id = 0
+
+    async def _rpc_batch(self, calls: List[Tuple[str, list]]) -> List[Any]:
+        """Send calls as one JSON-RPC batch and return their results in order."""
+        session = await self._get_session()
+        payload = []
+        for method, params in calls:
+            self._request_id += 1
+            payload.append({"jsonrpc": "2.0", "id": self._request_id, "method": method, "params": params})
+        async with session.post(self.rpc_url, json=payload) as response:
+            if response.status != 200:
+                raise Exception(f"RPC request failed with status {response.status}")
+            data = await response.json(content_type=None)
+        if isinstance(data, dict):  # Some nodes answer a failed batch with a single error object
+            raise Exception(f"RPC error: {data.get('error', data)}")
+        by_id = {item.get("id"): item for item in data}
+        results = []
+        for call in payload:
+            item = by_id.get(call["id"])
+            if item is None:
+                raise Exception(f"RPC response missing id {call['id']}")
+            if "error" in item:
+                raise Exception(f"RPC error in {call['method']}: {item['error']}")
+            results.append(item["result"])
+        return results
+
+    async def _rpc_many(self, calls: List[Tuple[str, list]]) -> List[Any]:
+        """Split calls into batches and run up to max_concurrency batches at a time."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(batch):
+            async with semaphore:
+                return await self._rpc_batch(batch)
+
+        batches = [calls[i:i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return [result for batch in results for result in batch]
+
+    async def block_number(self) -> int:
+        (result,) = await self._rpc_batch([("eth_blockNumber", [])])
+        return int(result, 16)
+
+    async def fetch_range(self, first: int, last: int) -> List[Dict[str, Any]]:
+        """Return one sample per block in [first, last], oldest first."""
+        if last < first:
+            return []
+        chunks = []
+        for end in range(last, first - 1, -MAX_FEE_HISTORY_BLOCKS):
+            count = min(MAX_FEE_HISTORY_BLOCKS, end - first + 1)
+            chunks.append((end - count + 1, end))
+        chunks.reverse()
+
+        # Timestamps: every header for short ranges, otherwise the chunk edges
+        # (interpolated in between, accurate to the odd missed slot)
+        if last - first + 1 <= EXACT_TIMESTAMP_BLOCKS:
+            anchor_blocks = list(range(first, last + 1))
+        else:
+            anchor_blocks = sorted({block for chunk in chunks for block in chunk})
+        calls = [("eth_feeHistory", [hex(end - start + 1), hex(end), self.reward_percentiles]) for start, end in chunks]
+        calls += [("eth_getBlockByNumber", [hex(block), False]) for block in anchor_blocks]
+        results = await self._rpc_many(calls)
+        histories, headers = results[:len(chunks)], results[len(chunks):]
+        anchors = {block: int(header["timestamp"], 16) for block, header in zip(anchor_blocks, headers) if header}
+
+        samples = []
+        for (start, end), history in zip(chunks, histories):
+            samples.extend(self._samples_from_history(start, end, history, anchors))
+        return samples
+
+    def _samples_from_history(self, start: int, end: int, history: Dict[str, Any], anchors: Dict[int, int]):
+        oldest = int(history["oldestBlock"], 16)
+        base_fees = [int(fee, 16) / GWEI for fee in history["baseFeePerGas"]]
+        ratios = history["gasUsedRatio"]
+        rewards = history.get("reward") or [[]] * len(ratios)
+        t_start, t_end = anchors.get(start), anchors.get(end)
+        samples = []
+        for i, ratio in enumerate(ratios):
+            block = oldest + i
+            if block < start or block > end:
+                continue
+            tips = [int(tip, 16) / GWEI for tip in rewards[i]] or [0.0, 0.0, 0.0]
+            base_fee = base_fees[i]
+            if block in anchors:
+                timestamp = anchors[block]
+            elif t_start is not None and t_end is not None and end > start:
+                timestamp = t_start + (t_end - t_start) * (block - start) / (end - start)
+            else:
+                timestamp = time.time()
+            samples.append({
+                "safe": base_fee + tips[0],
+                "propose": base_fee + tips[len(tips) // 2],
+                "fast": base_fee + tips[-1],
+                "suggested_base_fee": base_fees[i + 1] if i + 1 < len(base_fees) else base_fee,
+                # Newest first, as Etherscan reports them; recommend() reads [0] as the current block
+                "gas_used_ratio": [float(r) for r in reversed(ratios[max(0, i - self.ratio_width + 1):i + 1])],
+                "last_block": block,
+                "timestamp": float(timestamp)
+            })
+        return samples
+
+    async def backfill(self, blocks: int) -> List[Dict[str, Any]]:
+        """Fetch the newest `blocks` blocks (or those after last_block, if fewer)."""
+        head = await self.block_number()
+        first = head - blocks + 1
+        if self.last_block is not None:
+            first = max(first, self.last_block + 1)
+        samples = await self.fetch_range(max(first, 0), head)
+        self.last_block = head
+        return samples
+
+    async def fetch_new_samples(self) -> List[Dict[str, Any]]:
+        """Return samples for blocks produced since the last call (the newest block on the first call)."""
+        head = await self.block_number()
+        if self.last_block is None:
+            first = head
+        elif head <= self.last_block:
+            return []
+        else:
+            # Cap catch-up after a long pause; older gaps are left to backfill()
+            first = max(self.last_block + 1, head - MAX_FEE_HISTORY_BLOCKS + 1)
+        samples = await self.fetch_range(first, head)
+        self.last_block = head
+        return samples
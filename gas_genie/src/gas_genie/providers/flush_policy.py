@@ -0,0 +1,92 @@
+from typing import Dict, Optional
+
+_PUNCTUATION = (' ', '.', ',', '!', '?', '\n')
+
+
+class FlushPolicy:
+    """Decides when text buffered from the model stream is yielded to the caller.
+
+    first_immediately -- yield the first delta as soon as it arrives
+    window            -- yield once the oldest buffered text is this many seconds old
+    max_chars         -- yield once this many characters are buffered
+    word_boundary     -- yield the buffered text up to its last complete word
+    min_chars         -- with word_boundary, the least text worth yielding
+
+    Conditions are checked only as deltas arrive; there is no timer. A window
+    is therefore a lower bound: held text goes out with the first delta that
+    arrives after it has aged window seconds, or when the stream ends. Model
+    tokens usually carry their leading space (" low"), so a word is known to
+    be complete only once the next one has started.
+    """
+    __slots__ = ("name", "first_immediately", "window", "max_chars", "word_boundary", "min_chars")
+
+    def __init__(
+        self,
+        name: str,
+        first_immediately: bool = True,
+        window: Optional[float] = None,
+        max_chars: Optional[int] = None,
+        word_boundary: bool = False,
+        min_chars: int = 0
+    ):
+        self.name = name
+        self.first_immediately = first_immediately
+        self.window = window
+        self.max_chars = max_chars
+        self.word_boundary = word_boundary
+        self.min_chars = min_chars
+
+    def flush_length(self, buffer: str, first: bool, held_since: float, now: float) -> int:
+        """How many leading characters of buffer to yield now (0 for none).
+
+        first is True until something has been yielded; held_since is the
+        loop time at which the oldest buffered text arrived.
+        """
+        if first and self.first_immediately:
+            return len(buffer)
+        if self.max_chars is not None and len(buffer) >= self.max_chars:
+            return len(buffer)
+        if self.window is not None and now - held_since >= self.window:
+            return len(buffer)
+        if self.word_boundary and len(buffer) >= self.min_chars:
+            # Up to and including the last whitespace
+            end = max(buffer.rfind(" "), buffer.rfind("\n")) + 1
+            if end >= self.min_chars:
+                return end
+        return 0
+
+    def __repr__(self) -> str:
+        return f"FlushPolicy({self.name!r})"
+
+
+class PunctuationFlushPolicy(FlushPolicy):
+    """The original rule: 10 characters, or a delta ending in a space or punctuation."""
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__("punctuation", first_immediately=False, max_chars=10)
+
+    def flush_length(self, buffer: str, first: bool, held_since: float, now: float) -> int:
+        return len(buffer) if len(buffer) >= 10 or buffer.endswith(_PUNCTUATION) else 0
+
+
+FLUSH_POLICIES: Dict[str, FlushPolicy] = {
+    # Every delta as it arrives
+    "immediate": FlushPolicy("immediate", max_chars=0),
+    "punctuation": PunctuationFlushPolicy(),
+    # Whole words for a typing effect in the UI, first token straight away
+    "word": FlushPolicy("word", word_boundary=True, min_chars=8, max_chars=64),
+    # Few, larger chunks for API consumers, first token straight away
+    "window": FlushPolicy("window", window=0.03, max_chars=256),
+}
+DEFAULT_FLUSH_POLICY = "word"
+
+
+def get_flush_policy(name: Optional[str]) -> FlushPolicy:
+    """Look up a policy by name; None selects the default."""
+    if name is not None and not isinstance(name, str):
+        raise ValueError(f"Flush policy must be a name, not {type(name).__name__}")
+    policy = FLUSH_POLICIES.get(name or DEFAULT_FLUSH_POLICY)
+    if policy is None:
+        raise ValueError(f"Unknown flush policy: {name!r} (expected one of {', '.join(FLUSH_POLICIES)})")
+    return policy
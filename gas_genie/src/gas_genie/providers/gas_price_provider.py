@@ -1,136 +1,469 @@
-from typing import Dict, Any
-import aiohttp
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
+import importlib
 import json
-from datetime import datetime, timedelta
 import os
 import logging
 import asyncio
-from collections import deque
+import time
+from ..analytics import compute_analytics
+from ..price_history import PriceHistory
+from ..recommendation import Recommendation, recommend
+from ..history_store import HistoryStore
+from ..metrics import GAS_FETCH_SECONDS, GAS_FETCH_ERRORS
+from ..scheduler import Scheduler, PRIORITY_HIGH, PRIORITY_LOW
+from ..shared_snapshot import SharedSnapshot
+from .fee_history_provider import FeeHistoryProvider
+
+if TYPE_CHECKING:
+    import aiohttp
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+
+def sample_from_gas_oracle(result: Dict[str, Any]) -> Dict[str, Any]:
+    """A gas sample from an Etherscan gastracker/gasoracle result.
+
+    gasUsedRatio lists the latest blocks newest first, which is the order
+    recommend() and the rpc backend use too.
+    """
+    # Convert gasUsedRatio from comma-separated string to list of floats
+    gas_used_ratios = [float(ratio) for ratio in result.get("gasUsedRatio", "0").split(",")]
+    return {
+        "safe": float(result.get("SafeGasPrice", 0)),
+        "propose": float(result.get("ProposeGasPrice", 0)),
+        "fast": float(result.get("FastGasPrice", 0)),
+        "suggested_base_fee": float(result.get("suggestBaseFee", 0)),
+        "gas_used_ratio": gas_used_ratios,
+        "last_block": int(result.get("LastBlock", 0)),
+        "timestamp": time.time()
+    }
+
+
+class GasSnapshot:
+    """A single gas oracle reading, tagged with a monotonically increasing version."""
+    __slots__ = ("version", "prices", "fetched_at")
+
+    def __init__(self, version: int, prices: Dict[str, Any], fetched_at: float):
+        self.version = version
+        self.prices = prices
+        self.fetched_at = fetched_at  # time.monotonic() of the fetch
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
 class GasPriceProvider:
-    def __init__(self, api_key: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        cache_ttl: float = None,
+        stale_ttl: float = None,
+        base_url: str = None,
+        max_connections: int = None,
+        request_timeout: float = None,
+        keepalive_timeout: float = 30,
+        dns_cache_ttl: int = 300,
+        poll_interval: float = None,
+        poll_mode: str = None,
+        poll_idle_timeout: float = None,
+        history_path: str = None,
+        backend: str = None,
+        rpc_url: str = None,
+        backfill_blocks: int = None,
+        scheduler: Scheduler = None,
+        shared: SharedSnapshot = None
+    ):
         """Initialize the gas price provider."""
         self.api_key = api_key or os.getenv("ETHERSCAN_API_KEY")
-        self.base_url = "https://api.etherscan.io/api"
-        self.price_history = deque(maxlen=100)  # Store last 100 price points
+        self.base_url = base_url or os.getenv("ETHERSCAN_BASE_URL", "https://api.etherscan.io/api")
+        self.price_history = PriceHistory()  # Column store of recent samples, newest last
+
+        # Multi-worker mode: one elected process fetches gas data and publishes
+        # it to shared memory, where the other workers read it
+        shared_dir = os.getenv("GAS_SHARED_DIR")
+        self.shared = shared if shared is not None else (SharedSnapshot(shared_dir) if shared_dir else None)
+        self._shared_sequence = 0
+        self.shared_idle_check = 0.5  # Seconds between checks for other workers' reads while idle
+
+        # Optional on-disk copy of the history so restarts begin with a warm window.
+        # With shared workers it defaults to the shared directory, so a worker
+        # taking over from the leader continues the same history.
+        history_path = history_path or os.getenv("GAS_HISTORY_PATH")
+        if not history_path and self.shared is not None:
+            history_path = os.path.join(self.shared.directory, "gas_history.bin")
+        self.history_store: Optional[HistoryStore] = None
+        if history_path:
+            self.history_store = HistoryStore(history_path, max_records=self.price_history.capacity)
+            if self.shared is None:
+                self.history_store.load(self.price_history)
+
+        # Snapshot cache: fresh for cache_ttl seconds, then served stale (while a
+        # background refresh runs) until stale_ttl, after which callers wait.
+        self.cache_ttl = cache_ttl if cache_ttl is not None else float(os.getenv("GAS_CACHE_TTL", "10"))
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(os.getenv("GAS_STALE_TTL", "60"))
+        if self.stale_ttl < self.cache_ttl:
+            raise ValueError("stale_ttl must be greater than or equal to cache_ttl")
+        self._snapshot: Optional[GasSnapshot] = None
+        self._version = 0
+        self._inflight: Optional[asyncio.Task] = None
+        self._analytics: Optional[Dict[str, Any]] = None
+        self._recommendation: Optional[Recommendation] = None
+
+        # Pooled HTTP client, opened by start() and shared by every fetch
+        self.max_connections = max_connections or int(os.getenv("ETHERSCAN_MAX_CONNECTIONS", "10"))
+        self.request_timeout = request_timeout or float(os.getenv("ETHERSCAN_TIMEOUT", "5"))
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session: Optional["aiohttp.ClientSession"] = None
+        # Admission control keeping Etherscan calls under the account's rate limit
+        self.scheduler = scheduler or Scheduler()
+
+        # Data source: the Etherscan gas oracle, or per-block eth_feeHistory
+        # samples from a JSON-RPC node (backfilled on start, then followed)
+        self.backend = backend or os.getenv("GAS_BACKEND", "etherscan")
+        if self.backend not in ("etherscan", "rpc"):
+            raise ValueError("backend must be 'etherscan' or 'rpc'")
+        self.fee_history: Optional[FeeHistoryProvider] = None
+        self.backfill_blocks = 0
+        if self.backend == "rpc":
+            self.fee_history = FeeHistoryProvider(rpc_url=rpc_url, get_session=self._get_session)
+            if self.price_history:
+                self.fee_history.last_block = self.price_history[-1]["last_block"]
+            self.backfill_blocks = backfill_blocks if backfill_blocks is not None else int(os.getenv("GAS_RPC_BACKFILL_BLOCKS", "0"))
+
+        # Background poller: "interval" records a sample every poll_interval
+        # seconds, "block" polls at that cadence but only records new blocks.
+        self.poll_interval = poll_interval or float(os.getenv("GAS_POLL_INTERVAL", "12"))
+        self.poll_mode = poll_mode or os.getenv("GAS_POLL_MODE", "interval")
+        if self.poll_mode not in ("interval", "block"):
+            raise ValueError("poll_mode must be 'interval' or 'block'")
+        self.poll_idle_timeout = poll_idle_timeout or float(os.getenv("GAS_POLL_IDLE_TIMEOUT", "300"))
+        self._poller: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._last_access = time.monotonic()
         logger.debug(f"Initialized GasPriceProvider with API key: {'present' if self.api_key else 'missing'}")
-        
+
+    async def start(self):
+        """Open the pooled HTTP session used for all Etherscan requests."""
+        if self._session is not None and not self._session.closed:
+            return
+        # aiohttp is a sizeable share of import time; load it off the event loop
+        # when the first session is opened rather than when the app is imported
+        aiohttp = await asyncio.to_thread(importlib.import_module, "aiohttp")
+        if self._session is not None and not self._session.closed:
+            return  # Opened by a concurrent caller meanwhile
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            raise_for_status=False
+        )
+        logger.debug(f"Opened Etherscan session (limit={self.max_connections}, timeout={self.request_timeout}s)")
+        if self.shared is not None and self.shared.try_lead():
+            self._take_over()
+        if self.backfill_blocks and self.is_leader:
+            await self.backfill()
+
+    async def backfill(self, blocks: int = None) -> int:
+        """Load up to `blocks` recent blocks from the JSON-RPC backend into the history."""
+        if self.fee_history is None:
+            raise ValueError("Backfill requires the rpc backend")
+        samples = await self.fee_history.backfill(blocks or self.backfill_blocks)
+        self._publish(samples)
+        logger.info(f"Backfilled {len(samples)} blocks of gas history")
+        return len(samples)
+
+    def start_polling(self):
+        """Start the background sampler that keeps the snapshot and history fresh."""
+        if self._poller is not None and not self._poller.done():
+            return
+        self._last_access = time.monotonic()
+        self._poller = asyncio.create_task(self._poll_loop())
+        logger.debug(f"Started gas poller (mode={self.poll_mode}, interval={self.poll_interval}s)")
+
+    async def stop_polling(self):
+        """Stop the background sampler."""
+        if self._poller is None:
+            return
+        self._poller.cancel()
+        try:
+            await self._poller
+        except asyncio.CancelledError:
+            pass
+        self._poller = None
+        logger.debug("Stopped gas poller")
+
+    @property
+    def is_polling(self) -> bool:
+        return self._poller is not None and not self._poller.done()
+
+    @property
+    def is_leader(self) -> bool:
+        """Whether this process fetches gas data (always, unless workers share a snapshot)."""
+        return self.shared is None or self.shared.is_leader
+
+    def _take_over(self):
+        """Start fetching for every worker, continuing the shared history and version sequence."""
+        if self.history_store is not None:
+            self.history_store.load(self.price_history)
+        if self.fee_history is not None and self.price_history:
+            self.fee_history.last_block = self.price_history[-1]["last_block"]
+        current = self._read_shared()
+        if current is not None:
+            self._version = max(self._version, current.version)
+
+    def _idle(self) -> bool:
+        idle = time.monotonic() - self._last_access
+        if self.shared is not None:
+            idle = min(idle, time.time() - self.shared.last_access())
+        return idle > self.poll_idle_timeout
+
+    async def _poll_loop(self):
+        """Refresh the snapshot on a fixed cadence, pausing while nobody is reading.
+
+        With shared workers only the leader refreshes; the others stand by to
+        take over if the leader exits.
+        """
+        while True:
+            if not self.is_leader:
+                if not self.shared.try_lead():
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                self._take_over()
+            if self._idle():
+                logger.debug("Gas poller idle, pausing")
+                if self.shared is None:
+                    self._wake.clear()
+                    await self._wake.wait()
+                else:
+                    # Other workers' reads are only visible in the shared region
+                    while self._idle():
+                        await asyncio.sleep(self.shared_idle_check)
+                logger.debug("Gas poller resumed")
+            try:
+                await asyncio.shield(self._start_refresh(PRIORITY_LOW))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass  # Already logged by _on_refresh_done; keep serving the last snapshot
+            await asyncio.sleep(self.poll_interval)
+
+    async def close(self):
+        """Stop polling, cancel any in-flight refresh and close the pooled HTTP session."""
+        await self.stop_polling()
+        if self._inflight is not None and not self._inflight.done():
+            self._inflight.cancel()
+            try:
+                await self._inflight
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._inflight = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+            logger.debug("Closed Etherscan session")
+        if self.history_store is not None:
+            self.history_store.close()
+        if self.shared is not None:
+            self.shared.close()
+
+    async def _get_session(self) -> "aiohttp.ClientSession":
+        # Lazily open the session for callers that don't manage the lifecycle
+        # (scripts, tests); the app opens it explicitly from its lifespan.
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    async def get_snapshot(self) -> GasSnapshot:
+        """Return the cached gas snapshot, refreshing it if it has expired.
+
+        Concurrent callers share a single in-flight Etherscan request. A snapshot
+        older than cache_ttl but younger than stale_ttl is returned immediately
+        while a refresh runs in the background.
+        """
+        self._last_access = time.monotonic()
+        if not self._wake.is_set():
+            self._wake.set()  # Resume a paused poller
+        if not self.is_leader:
+            return await self._get_shared_snapshot()
+
+        snapshot = self._snapshot
+        if snapshot is not None:
+            age = snapshot.age()
+            if age < self.cache_ttl:
+                return snapshot
+            if age < self.stale_ttl:
+                # A running poller owns refreshes; otherwise revalidate in the background
+                if not self.is_polling:
+                    self._start_refresh(PRIORITY_LOW)
+                return snapshot
+        return await asyncio.shield(self._start_refresh(PRIORITY_HIGH))
+
+    async def _get_shared_snapshot(self) -> GasSnapshot:
+        """Follower path: the snapshot the leader published, never an upstream call."""
+        self.shared.touch()
+        snapshot = self._read_shared()
+        if snapshot is not None and snapshot.age() < self.stale_ttl:
+            return snapshot
+        # Nothing usable yet: wait for the leader (which notices the read above
+        # if it was idle), or take over if it has gone away
+        deadline = time.monotonic() + self.request_timeout
+        while time.monotonic() < deadline:
+            if self.shared.try_lead():
+                self._take_over()
+                return await self.get_snapshot()
+            await asyncio.sleep(0.05)
+            snapshot = self._read_shared()
+            if snapshot is not None and snapshot.age() < self.stale_ttl:
+                return snapshot
+        raise Exception("Gas data is not available from the leader process")
+
+    def _read_shared(self) -> Optional[GasSnapshot]:
+        """The snapshot in the shared region, decoded once per publication."""
+        sequence = self.shared.sequence()
+        if sequence != self._shared_sequence:
+            published = self.shared.read()
+            if published is None:
+                return self._snapshot
+            self._shared_sequence, payload = published
+            data = json.loads(payload)
+            # Wall-clock fetch time from the leader, as this process's monotonic clock
+            fetched_at = time.monotonic() - max(0.0, time.time() - data["fetched_at"])
+            self._snapshot = GasSnapshot(data["version"], data["prices"], fetched_at)
+            self._analytics = data["analytics"]
+        return self._snapshot
+
+    def _share(self, snapshot: GasSnapshot):
+        """Publish a snapshot and its analytics to the other workers (leader only)."""
+        if self.shared is None:
+            return
+        payload = json.dumps({
+            "version": snapshot.version,
+            "prices": snapshot.prices,
+            "fetched_at": time.time() - snapshot.age(),
+            "analytics": self.get_analytics()
+        }, separators=(",", ":")).encode()
+        self.shared.publish(payload)
+        self._shared_sequence = self.shared.sequence()
+
+    def _start_refresh(self, priority: int = PRIORITY_LOW) -> asyncio.Task:
+        """Start a snapshot refresh unless one is already in flight.
+
+        priority is used to queue for the Etherscan rate limit: callers with
+        nothing to serve go ahead of background revalidation.
+        """
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._refresh_snapshot(priority))
+            self._inflight.add_done_callback(self._on_refresh_done)
+        return self._inflight
+
+    def _on_refresh_done(self, task: asyncio.Task):
+        # Retrieve the exception so background refresh failures are logged, not lost.
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Gas snapshot refresh failed: {task.exception()}")
+
+    async def _refresh_snapshot(self, priority: int = PRIORITY_LOW) -> GasSnapshot:
+        """Fetch fresh prices and publish them as a new snapshot version."""
+        started = time.perf_counter()
+        try:
+            if self.fee_history is not None:
+                samples = await self.fee_history.fetch_new_samples()
+            else:
+                samples = [await self._fetch_gas_prices(priority)]
+        except Exception:
+            GAS_FETCH_ERRORS.labels(self.backend).inc()
+            raise
+        finally:
+            GAS_FETCH_SECONDS.labels(self.backend).observe(time.perf_counter() - started)
+        current = self._snapshot
+        if current is not None and (not samples or (
+                self.poll_mode == "block" and samples[-1]["last_block"] == current.prices["last_block"])):
+            # Same block: the oracle data hasn't changed, only its freshness has
+            snapshot = GasSnapshot(current.version, current.prices, time.monotonic())
+            self._snapshot = snapshot
+            self._share(snapshot)
+            return snapshot
+        if not samples:
+            raise Exception("No gas samples available")
+        return self._publish(samples)
+
+    def _publish(self, samples: List[Dict[str, Any]]) -> Optional[GasSnapshot]:
+        """Record samples (oldest first) in the history and publish the newest as a snapshot."""
+        if not samples:
+            return self._snapshot
+        for prices in samples:
+            self.price_history.append(prices)  # One history point per upstream reading
+            if self.history_store is not None:
+                self.history_store.append(prices)
+        self._version += 1
+        snapshot = GasSnapshot(self._version, samples[-1], time.monotonic())
+        self._snapshot = snapshot
+        self._share(snapshot)
+        logger.debug(f"Published gas snapshot v{snapshot.version}")
+        return snapshot
+
     async def get_current_gas_prices(self) -> Dict[str, float]:
+        """Get current gas prices from the shared snapshot cache."""
+        snapshot = await self.get_snapshot()
+        return snapshot.prices
+
+    async def _fetch_gas_prices(self, priority: int = PRIORITY_LOW) -> Dict[str, Any]:
         """Fetch current gas prices from Etherscan API."""
         try:
-            url = f"{self.base_url}?module=gastracker&action=gasoracle&apikey={self.api_key}"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status != 200:
-                        raise Exception(f"API request failed with status {response.status}")
-                    
-                    data = await response.json()
-                    if data.get("status") != "1":
-                        raise Exception(f"API error: {data.get('message', 'Unknown error')}")
-                    
-                    result = data.get("result", {})
-                    # Convert gasUsedRatio from comma-separated string to list of floats
-                    gas_used_ratios = [float(ratio) for ratio in result.get("gasUsedRatio", "0").split(",")]
-                    
-                    return {
-                        "safe": float(result.get("SafeGasPrice", 0)),
-                        "propose": float(result.get("ProposeGasPrice", 0)),
-                        "fast": float(result.get("FastGasPrice", 0)),
-                        "suggested_base_fee": float(result.get("suggestBaseFee", 0)),
-                        "gas_used_ratio": gas_used_ratios
-                    }
+            params = {"module": "gastracker", "action": "gasoracle", "apikey": self.api_key}
+            session = await self._get_session()
+            async with self.scheduler["etherscan"].slot(priority), \
+                    session.get(self.base_url, params=params) as response:
+                if response.status != 200:
+                    raise Exception(f"API request failed with status {response.status}")
+                
+                data = await response.json()
+                if data.get("status") != "1":
+                    raise Exception(f"API error: {data.get('message', 'Unknown error')}")
+                
+                return sample_from_gas_oracle(data.get("result", {}))
         except Exception as e:
             logger.error(f"Unexpected error while fetching gas prices: {str(e)}")
             raise
 
+    def get_analytics(self) -> Dict[str, Any]:
+        """Return trend and distribution statistics over the price history.
+
+        The result is computed once per snapshot version and shared by every
+        request that reads the same snapshot.
+        """
+        version = self._snapshot.version if self._snapshot is not None else 0
+        if self._analytics is None or self._analytics["version"] != version:
+            self._analytics = compute_analytics(self.price_history, version=version)
+        return self._analytics
+
     def _analyze_price_trend(self) -> Dict[str, Any]:
         """Analyze price trends from historical data."""
-        if not self.price_history:
-            return {"trend": "unknown", "change_percentage": 0}
-            
-        current = self.price_history[-1]
-        if len(self.price_history) < 2:
-            return {"trend": "stable", "change_percentage": 0}
-            
-        previous = self.price_history[-2]
-        change = ((current["propose"] - previous["propose"]) / previous["propose"]) * 100
-        
-        if change > 5:
-            trend = "increasing"
-        elif change < -5:
-            trend = "decreasing"
-        else:
-            trend = "stable"
-            
-        return {
-            "trend": trend,
-            "change_percentage": change,
-            "current_price": current["propose"],
-            "previous_price": previous["propose"]
-        }
+        return self.get_analytics()["trend"]
+
+    def get_recommendation(self, snapshot: GasSnapshot) -> Recommendation:
+        """Return the recommendation for a snapshot, computed once per snapshot version."""
+        recommendation = self._recommendation
+        if recommendation is None or recommendation.version != snapshot.version:
+            recommendation = recommend(snapshot.version, snapshot.prices, self.get_analytics())
+            self._recommendation = recommendation
+        return recommendation
 
     async def predict_optimal_gas_price(self) -> Dict[str, Any]:
         """Predict the optimal gas price based on historical data and current network conditions."""
-        current_prices = await self.get_current_gas_prices()
-        self.price_history.append(current_prices)  # Add to history for trend analysis
-        price_trend = self._analyze_price_trend()
-        
-        # Enhanced prediction algorithm
-        base_fee = current_prices.get("suggested_base_fee", 0)
-        gas_used_ratio = current_prices.get("gas_used_ratio", [0])[0]  # Use first value as current ratio
-        
-        # Calculate optimal price based on multiple factors
-        optimal_price = current_prices["propose"]
-        confidence = 0.8
-        
-        # Adjust based on network congestion
-        if gas_used_ratio > 0.9:  # High congestion
-            optimal_price = current_prices["fast"]
-            confidence = 0.9
-        elif gas_used_ratio < 0.5:  # Low congestion
-            optimal_price = current_prices["safe"]
-            confidence = 0.7
-            
-        # Adjust based on price trend
-        if price_trend["trend"] == "increasing":
-            optimal_price = min(optimal_price * 1.1, current_prices["fast"])
-            confidence *= 0.9
-        elif price_trend["trend"] == "decreasing":
-            optimal_price = max(optimal_price * 0.9, current_prices["safe"])
-            confidence *= 0.9
-            
-        # Determine suggestion
-        if optimal_price > current_prices["fast"] * 1.1:
-            suggestion = "wait"
-        elif optimal_price < current_prices["propose"] * 0.9:
-            suggestion = "send"
-        else:
-            suggestion = "monitor"
-        
-        return {
-            "recommended_price": optimal_price,
-            "confidence": confidence,
-            "suggestion": suggestion,
-            "current_prices": current_prices,
-            "price_trend": price_trend,
-            "network_metrics": {
-                "base_fee": base_fee,
-                "gas_used_ratio": gas_used_ratio,
-                "congestion_level": "high" if gas_used_ratio > 0.9 else "medium" if gas_used_ratio > 0.7 else "low"
-            }
-        }
+        snapshot = await self.get_snapshot()
+        return self.get_recommendation(snapshot).to_dict()
 
     async def get_transaction_speed_up_options(self, current_gas_price: int) -> Dict[str, Any]:
         """Get options for speeding up a transaction."""
-        current_prices = await self.get_current_gas_prices()
-        price_trend = self._analyze_price_trend()
-        
-        # Get the current gas used ratio (first value from the list)
-        gas_used_ratio = current_prices.get("gas_used_ratio", [0])[0]
+        snapshot = await self.get_snapshot()
+        recommendation = self.get_recommendation(snapshot)
+        current_prices = snapshot.prices
         
         return {
             "current_price": current_gas_price,
@@ -148,9 +481,9 @@ class GasPriceProvider:
                     "price_increase": ((current_prices["fast"] * 1.1 - current_gas_price) / current_gas_price) * 100
                 }
             ],
-            "price_trend": price_trend,
+            "price_trend": recommendation.price_trend,
             "network_metrics": {
-                "gas_used_ratio": gas_used_ratio,
-                "congestion_level": "high" if gas_used_ratio > 0.9 else "medium" if gas_used_ratio > 0.7 else "low"
+                "gas_used_ratio": recommendation.gas_used_ratio,
+                "congestion_level": recommendation.congestion_level
             }
         } 
\ No newline at end of file
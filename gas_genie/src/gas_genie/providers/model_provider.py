@@ -1,28 +1,41 @@
-from datetime import datetime
-from langchain_core.prompts import PromptTemplate
-from fireworks.client import AsyncFireworks
-from typing import AsyncIterator
+from typing import AsyncIterator, Dict, Any, Optional, Tuple
 import logging
 import os
 import asyncio
-from fireworks.client.error import (
-    FireworksError,
-    AuthenticationError,
-    RateLimitError,
-    InvalidRequestError,
-    APITimeoutError,
-    InternalServerError,
-    ServiceUnavailableError,
-    BadGatewayError
+from contextlib import aclosing
+from ..intent import classify
+from .flush_policy import FlushPolicy, get_flush_policy
+from .circuit_breaker import Admission, CircuitBreaker, CircuitOpenError
+from ..timing import RequestTimer, bind_timer, current_timer
+from ..scheduler import Scheduler, Slot, Overloaded, PRIORITY_NORMAL
+from ..metrics import (
+    MODEL_TTFT_SECONDS, MODEL_INTER_TOKEN_SECONDS, MODEL_GENERATION_SECONDS, MODEL_TOKENS, MODEL_ERRORS,
+    MODEL_HEDGES, MODEL_FALLBACKS
 )
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+
+# The Fireworks SDK (with httpx under it) is a large share of cold start, so
+# it is imported when the first client is built, normally by prewarm()
+_sdk = None
+
+
+def _fireworks():
+    """The fireworks.client package, imported on first use."""
+    global _sdk
+    if _sdk is None:
+        import fireworks.client
+        import fireworks.client.error
+        _sdk = fireworks.client
+    return _sdk
+
 
 class ModelProvider:
     def __init__(
         self,
-        api_key: str
+        api_key: str,
+        base_url: str = None,
+        scheduler: Scheduler = None
     ):
         """ Initializes model, sets up Fireworks client, configures system prompt."""
         logger.debug("Initializing ModelProvider")
@@ -33,7 +46,16 @@ class ModelProvider:
         # Model provider API key
         self.api_key = api_key
         # Identifier for specific model that should be used
-        self.model = "accounts/fireworks/models/deepseek-v3"
+        self.model = os.getenv("FIREWORKS_MODEL", "accounts/fireworks/models/deepseek-v3")
+        # Smaller, faster models tried in order when the primary is failing
+        self.fallback_models = [
+            model.strip()
+            for model in os.getenv("FIREWORKS_FALLBACK_MODELS", "accounts/fireworks/models/llama-v3p1-8b-instruct").split(",")
+            if model.strip()
+        ]
+        # Send a duplicate request when the first token is this late (0 disables)
+        self.hedge_after = float(os.getenv("FIREWORKS_HEDGE_AFTER", "2"))
+        self.breakers: Dict[str, CircuitBreaker] = {}
         # Model configuration - optimized for speed
         self.max_tokens = 2048  # Further reduced for faster responses
         self.top_p = 0.8  # Further reduced for faster sampling
@@ -41,12 +63,14 @@ class ModelProvider:
         self.presence_penalty = 0
         self.frequency_penalty = 0
         self.temperature = 0.7
-        self.timeout = 10  # Further reduced timeout
-
-        # Cache for gas data
-        self.gas_data_cache = None
-        self.cache_timeout = 60  # Cache timeout in seconds
-        self.last_cache_update = 0
+        self.timeout = 10  # Max seconds to wait for the first or next chunk from a model
+        # Admission control for the account's concurrency and requests-per-minute limits
+        self.scheduler = scheduler or Scheduler()
+        self.rate_limit_backoff = 5  # Seconds to stop admitting after Fireworks returns 429
+        # Running token totals, from the usage block the API sends with the last chunk
+        self.usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        # Per flush policy: completed responses, chunks yielded and summed time to first chunk
+        self.flush_stats: Dict[str, Dict[str, float]] = {}
 
         # Validate configuration
         if not 0 <= self.temperature <= 2:
@@ -60,13 +84,9 @@ class ModelProvider:
         if not -2 <= self.frequency_penalty <= 2:
             raise ValueError("frequency_penalty must be between -2 and 2")
 
-        # Set up model API
-        logger.debug("Setting up Fireworks client")
-        try:
-            self.client = AsyncFireworks(api_key=self.api_key)
-        except Exception as e:
-            logger.error(f"Failed to initialize Fireworks client: {str(e)}")
-            raise
+        # Model API client, built on first use or by prewarm()
+        self.base_url = base_url or os.getenv("FIREWORKS_BASE_URL")
+        self._client = None
 
         # Set up system prompt
         self.system_prompt = """You are Gas Genie, a friendly and knowledgeable AI assistant specialized in Ethereum gas prices and blockchain transactions. 
@@ -137,24 +157,97 @@ class ModelProvider:
 
         logger.debug("ModelProvider initialized successfully")
 
+    def _create_client(self):
+        logger.debug("Setting up Fireworks client")
+        try:
+            client = _fireworks().AsyncFireworks(api_key=self.api_key, base_url=self.base_url)
+        except Exception as e:
+            logger.error(f"Failed to initialize Fireworks client: {str(e)}")
+            raise
+        # Response headers mark the upstream_connect stage of the request being timed
+        http_client = getattr(getattr(client, "_client_v1", None), "_async_client", None)
+        if http_client is not None:
+            http_client.event_hooks["response"].append(self._on_response_headers)
+        return client
+
+    @property
+    def client(self):
+        """The Fireworks client, created on first use."""
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+
+    async def prewarm(self):
+        """Import the SDK and build the client off the event loop, ahead of the first request."""
+        if self._client is None:
+            client = await asyncio.to_thread(self._create_client)
+            if self._client is None:
+                self._client = client
+
+    def _record_usage(self, usage):
+        """Accumulate token usage reported at the end of a stream."""
+        self.usage["requests"] += 1
+        self.usage["prompt_tokens"] += usage.prompt_tokens
+        self.usage["completion_tokens"] += usage.completion_tokens or 0
+        MODEL_TOKENS.labels("prompt").inc(usage.prompt_tokens)
+        MODEL_TOKENS.labels("completion").inc(usage.completion_tokens or 0)
+        logger.info("Model usage: prompt_tokens=%s, completion_tokens=%s", usage.prompt_tokens, usage.completion_tokens)
+
+    @staticmethod
+    async def _on_response_headers(response):
+        timer = current_timer()
+        if timer is not None:
+            timer.mark("upstream_connect")
+
+    def _record_flush(self, policy: FlushPolicy, chunks: int, first_chunk_seconds: float):
+        stats = self.flush_stats.get(policy.name)
+        if stats is None:
+            stats = self.flush_stats[policy.name] = {"responses": 0, "chunks": 0, "first_chunk_seconds": 0.0}
+        stats["responses"] += 1
+        stats["chunks"] += chunks
+        stats["first_chunk_seconds"] += first_chunk_seconds
+
+    def stream_stats(self) -> Dict[str, Any]:
+        """Average time to first chunk and chunks per response, per flush policy."""
+        return {
+            name: {
+                "responses": stats["responses"],
+                "avg_chunks": stats["chunks"] / stats["responses"],
+                "avg_first_chunk_ms": stats["first_chunk_seconds"] / stats["responses"] * 1000
+            }
+            for name, stats in self.flush_stats.items() if stats["responses"]
+        }
+
+    def model_stats(self) -> Dict[str, Any]:
+        """Circuit breaker state of each model in the fallback chain."""
+        return {model: self._breaker(model).stats() for model in [self.model, *self.fallback_models]}
+
     def is_casual_conversation(self, query: str) -> bool:
         """Determine if the query is a casual conversation."""
-        casual_keywords = [
-            "hi", "hello", "hey", "good morning", "good afternoon", "good evening","greetings",
-            "how are you", "what's up", "thanks", "thank you", "bye", "goodbye",
-            "who are you", "what can you do", "help", "tell me about yourself",
-            "thanks for the info", "thanks for the help","goodjob","how is your day going"
-        ]
-        query_lower = query.lower()
-        return any(keyword in query_lower for keyword in casual_keywords)
+        return classify(query).name == "casual"
 
     async def query_stream(
         self,
         query: str,
-        context: str = None
+        context: str = None,
+        casual: bool = None,
+        flush: FlushPolicy = None,
+        timer: RequestTimer = None,
+        slot: Slot = None,
+        priority: int = PRIORITY_NORMAL
     ) -> AsyncIterator[str]:
-        """Sends query to model and yields the response in chunks."""
-        is_casual = self.is_casual_conversation(query)
+        """Sends query to model and yields the response in chunks.
+
+        casual is the caller's routing decision for the raw user query; when
+        omitted the query itself is classified. flush decides how deltas are
+        grouped into chunks (default "word"). timer, if given, records the
+        upstream_connect, first_token and last_token stages. slot is an
+        admission already granted by the Fireworks scheduler, released when
+        the stream ends; without one the stream queues for it at priority.
+        """
+        is_casual = self.is_casual_conversation(query) if casual is None else casual
+        flush = flush or get_flush_policy(None)
+        bind_timer(timer)
         
         # Use faster parameters for casual conversation
         if is_casual:
@@ -173,65 +266,239 @@ class ModelProvider:
         
         if context:
             messages.insert(1, {"role": "system", "content": f"Context: {context}"})
+
+        if slot is None:
+            try:
+                slot = await self.scheduler["fireworks"].acquire(priority)
+            except Overloaded as e:
+                yield f"Error: {str(e)}"
+                return
         
+        request = {
+            "messages": messages,
+            "stream": True,
+            "max_tokens": max_tokens,
+            "top_p": top_p,
+            "top_k": top_k,
+            "presence_penalty": self.presence_penalty,
+            "frequency_penalty": self.frequency_penalty,
+            "temperature": self.temperature
+        }
+        errors = _fireworks().error
+        admission = None
         try:
-            async with asyncio.timeout(self.timeout):
-                completion = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    stream=True,
-                    max_tokens=max_tokens,
-                    top_p=top_p,
-                    top_k=top_k,
-                    presence_penalty=self.presence_penalty,
-                    frequency_penalty=self.frequency_penalty,
-                    temperature=self.temperature
-                )
-                
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            admission, completion, content = await self._open_stream(request)
+            
+            # The timeout bounds each wait on the upstream stream (gaps between
+            # chunks), not the time spent by our consumer.
+            async with asyncio.timeout(self.timeout) as deadline, aclosing(completion):
                 buffer = ""
-                for chunk in completion:
-                    if not chunk or not chunk.choices:
-                        continue
-                        
-                    choice = chunk.choices[0]
-                    if not choice or not choice.delta:
-                        continue
-                        
-                    content = choice.delta.content
-                    if not content:
-                        continue
-                        
+                held_since = 0.0
+                first_chunk_seconds = 0.0
+                chunks = 0
+                last_token = None
+                async for content in self._deltas(content, completion):
+                    deadline.reschedule(loop.time() + self.timeout)
+                    
+                    now = loop.time()
+                    if last_token is None:
+                        MODEL_TTFT_SECONDS.observe(now - started)
+                        if timer is not None:
+                            timer.mark("first_token")
+                    else:
+                        MODEL_INTER_TOKEN_SECONDS.observe(now - last_token)
+                    last_token = now
+                    if not buffer:
+                        held_since = now
                     buffer += content
-                    # Yield more frequently for faster response
-                    if len(buffer) >= 10 or content.endswith((' ', '.', ',', '!', '?', '\n')):
-                        yield buffer
-                        buffer = ""
+                    length = flush.flush_length(buffer, chunks == 0, held_since, now)
+                    if length:
+                        if chunks == 0:
+                            first_chunk_seconds = now - started
+                        chunks += 1
+                        text, buffer = buffer[:length], buffer[length:]
+                        deadline.reschedule(None)
+                        yield text
+                        deadline.reschedule(loop.time() + self.timeout)
+                        held_since = now
                         
+                deadline.reschedule(None)
+                admission.record(True)
+                admission = None
+                MODEL_GENERATION_SECONDS.observe(loop.time() - started)
+                if timer is not None:
+                    timer.mark("last_token")
                 if buffer:
+                    if chunks == 0:
+                        first_chunk_seconds = loop.time() - started
+                    chunks += 1
                     yield buffer
+                self._record_flush(flush, chunks, first_chunk_seconds)
                 
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer went away; that says nothing about the model's health
+            if admission is not None:
+                admission.abandon()
+                admission = None
+            raise
         except asyncio.TimeoutError:
+            MODEL_ERRORS.labels("timeout").inc()
             yield "Error: Request timed out. Please try again."
-        except AuthenticationError:
+        except errors.AuthenticationError:
+            MODEL_ERRORS.labels("auth").inc()
             yield "Error: Authentication failed. Please check your API key."
-        except RateLimitError:
+        except errors.RateLimitError:
+            MODEL_ERRORS.labels("rate_limit").inc()
             yield "Error: Rate limit exceeded. Please try again later."
-        except (InvalidRequestError, APITimeoutError, InternalServerError, ServiceUnavailableError, BadGatewayError) as e:
+        except (errors.InvalidRequestError, errors.APITimeoutError, errors.InternalServerError,
+                errors.ServiceUnavailableError, errors.BadGatewayError) as e:
+            MODEL_ERRORS.labels("upstream").inc()
             yield f"Error: {str(e)}"
+        except CircuitOpenError:
+            MODEL_ERRORS.labels("circuit_open").inc()
+            yield "Error: The model is temporarily unavailable. Please try again shortly."
         except Exception as e:
+            MODEL_ERRORS.labels("other").inc()
             yield f"Error: {str(e)}"
+        finally:
+            if admission is not None:
+                admission.record(False)  # Failed after the first token
+            slot.release()
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        breaker = self.breakers.get(model)
+        if breaker is None:
+            breaker = self.breakers[model] = CircuitBreaker(model)
+        return breaker
+
+    async def _open_stream(self, request: Dict[str, Any]) -> Tuple[Admission, AsyncIterator, str]:
+        """Start a stream on the first healthy model in the fallback chain.
+
+        Returns (the model's breaker admission, the open completion, its first content
+        delta). A model whose breaker is open is skipped; one that fails or
+        times out before its first token is recorded as failed and the next
+        model is tried. Errors that no other model would fix are raised as is.
+        """
+        errors = _fireworks().error
+        last_error: Optional[Exception] = None
+        for model in [self.model, *self.fallback_models]:
+            admission = self._breaker(model).allow()
+            if admission is None:
+                continue
+            try:
+                completion, content = await self._hedged_first_token(model, request)
+            except (errors.AuthenticationError, errors.InvalidRequestError):
+                admission.abandon()
+                raise
+            except Exception as e:
+                admission.record(False)
+                if isinstance(e, errors.RateLimitError):
+                    self.scheduler["fireworks"].backoff(self.rate_limit_backoff)
+                logger.warning("Model %s failed before its first token: %r", model, e)
+                last_error = e
+                continue
+            except BaseException:
+                admission.abandon()
+                raise
+            if model != self.model:
+                MODEL_FALLBACKS.labels(model).inc()
+            return admission, completion, content
+        raise last_error or CircuitOpenError("Every model's circuit is open")
+
+    async def _hedged_first_token(self, model: str, request: Dict[str, Any]) -> Tuple[AsyncIterator, str]:
+        """Open a stream on model and wait for its first content delta.
+
+        If none has arrived after hedge_after seconds and the scheduler has a
+        slot to spare, an identical request is sent and whichever stream
+        produces a token first is kept; the other is cancelled. Gives up after
+        timeout seconds.
+        """
+        attempts = [asyncio.create_task(self._first_token(model, request))]
+        winner = None
+        hedge_slot = None
+        try:
+            async with asyncio.timeout(self.timeout):
+                if self.hedge_after:
+                    await asyncio.wait(attempts, timeout=self.hedge_after)
+                    if not attempts[0].done():
+                        hedge_slot = self.scheduler["fireworks"].try_acquire()
+                        if hedge_slot is not None:
+                            MODEL_HEDGES.labels("fired").inc()
+                            attempts.append(asyncio.create_task(self._first_token(model, request)))
+                # A failed attempt leaves the other one running
+                pending = set(attempts)
+                while True:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in attempts:
+                        if task in done and task.exception() is None:
+                            winner = task
+                            if task is not attempts[0]:
+                                MODEL_HEDGES.labels("won").inc()
+                            return task.result()
+                    if not pending:
+                        raise attempts[0].exception()
+        finally:
+            for task in attempts:
+                if task is not winner:
+                    task.cancel()
+                    task.add_done_callback(self._discard_attempt)
+            # The surviving stream runs under the caller's slot
+            if hedge_slot is not None:
+                hedge_slot.release()
+
+    @staticmethod
+    def _discard_attempt(task: asyncio.Task):
+        if task.cancelled():
+            return
+        if task.exception() is None:
+            # Finished in the same instant as the winner: close its stream
+            asyncio.create_task(task.result()[0].aclose())
+
+    async def _first_token(self, model: str, request: Dict[str, Any]) -> Tuple[AsyncIterator, str]:
+        """Send one request and read up to its first content delta, leaving the stream open."""
+        completion = self.client.chat.completions.acreate(model=model, **request)
+        try:
+            async for chunk in completion:
+                content = self._content(chunk)
+                if content:
+                    return completion, content
+            return completion, ""
+        except BaseException:
+            await completion.aclose()
+            raise
+
+    def _content(self, chunk) -> Optional[str]:
+        """The text delta of a stream chunk, recording usage if the chunk carries it."""
+        if chunk and chunk.usage:
+            self._record_usage(chunk.usage)
+        if not chunk or not chunk.choices:
+            return None
+        choice = chunk.choices[0]
+        if not choice or not choice.delta:
+            return None
+        return choice.delta.content
+
+    async def _deltas(self, first: str, completion: AsyncIterator) -> AsyncIterator[str]:
+        """The first content delta followed by the rest of the stream's."""
+        if first:
+            yield first
+        async for chunk in completion:
+            content = self._content(chunk)
+            if content:
+                yield content
 
     async def query(
         self,
         query: str
     ) -> str:
         """Sends query to model and returns the complete response as a string."""
-        logger.debug(f"Starting query: {query}")
+        logger.debug("Starting query: %s", query)
         
         chunks = []
-        # Use regular for loop since query_stream is a regular generator
-        for chunk in self.query_stream(query=query):
+        async for chunk in self.query_stream(query=query):
             chunks.append(chunk)
         response = "".join(chunks)
-        logger.debug(f"Completed query with response: {response}")
+        logger.debug("Completed query with response: %s", response)
         return response 
\ No newline at end of file
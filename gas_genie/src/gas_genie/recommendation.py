@@ -0,0 +1,111 @@
+from typing import Dict, Any
+
+
+def _copied(value: Any) -> Any:
+    """A copy of a tree of plain dicts and lists, the shapes snapshots and analytics hold."""
+    if isinstance(value, dict):
+        return {key: _copied(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copied(item) for item in value]
+    return value
+
+
+def congestion_level(gas_used_ratio: float) -> str:
+    return "high" if gas_used_ratio > 0.9 else "medium" if gas_used_ratio > 0.7 else "low"
+
+
+class Recommendation:
+    """Immutable gas recommendation for one snapshot version.
+
+    It is shared by every request for that version, so it keeps its own
+    copies of the snapshot's prices and analytics, and to_dict() hands out
+    fresh copies that callers may modify.
+    """
+    __slots__ = (
+        "version", "recommended_price", "confidence", "suggestion",
+        "current_prices", "price_trend", "analytics",
+        "base_fee", "gas_used_ratio", "congestion_level"
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Recommendation is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Recommendation is immutable")
+
+    def __repr__(self) -> str:
+        return (f"Recommendation(version={self.version}, suggestion={self.suggestion!r}, "
+                f"recommended_price={self.recommended_price}, confidence={self.confidence})")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The dict shape returned by GasGenie.get_gas_data and predict_optimal_gas_price."""
+        return {
+            "recommended_price": self.recommended_price,
+            "confidence": self.confidence,
+            "suggestion": self.suggestion,
+            "current_prices": _copied(self.current_prices),
+            "price_trend": _copied(self.price_trend),
+            "analytics": _copied(self.analytics),
+            "network_metrics": {
+                "base_fee": self.base_fee,
+                "gas_used_ratio": self.gas_used_ratio,
+                "congestion_level": self.congestion_level
+            }
+        }
+
+
+def recommend(version: int, prices: Dict[str, Any], analytics: Dict[str, Any]) -> Recommendation:
+    """Derive the optimal price and wait/send/monitor suggestion from a snapshot.
+
+    Pure: depends only on its arguments and never touches the price history.
+    """
+    prices = _copied(prices)
+    analytics = _copied(analytics)
+    price_trend = analytics["trend"]
+    base_fee = prices.get("suggested_base_fee", 0)
+    gas_used_ratio = (prices.get("gas_used_ratio") or [0])[0]  # Use first value as current ratio
+
+    # Calculate optimal price based on multiple factors
+    optimal_price = prices["propose"]
+    confidence = 0.8
+
+    # Adjust based on network congestion
+    if gas_used_ratio > 0.9:  # High congestion
+        optimal_price = prices["fast"]
+        confidence = 0.9
+    elif gas_used_ratio < 0.5:  # Low congestion
+        optimal_price = prices["safe"]
+        confidence = 0.7
+
+    # Adjust based on price trend
+    if price_trend["trend"] == "increasing":
+        optimal_price = min(optimal_price * 1.1, prices["fast"])
+        confidence *= 0.9
+    elif price_trend["trend"] == "decreasing":
+        optimal_price = max(optimal_price * 0.9, prices["safe"])
+        confidence *= 0.9
+
+    # Determine suggestion
+    if optimal_price > prices["fast"] * 1.1:
+        suggestion = "wait"
+    elif optimal_price < prices["propose"] * 0.9:
+        suggestion = "send"
+    else:
+        suggestion = "monitor"
+
+    return Recommendation(
+        version=version,
+        recommended_price=optimal_price,
+        confidence=confidence,
+        suggestion=suggestion,
+        current_prices=prices,
+        price_trend=price_trend,
+        analytics=analytics,
+        base_fee=base_fee,
+        gas_used_ratio=gas_used_ratio,
+        congestion_level=congestion_level(gas_used_ratio)
+    )
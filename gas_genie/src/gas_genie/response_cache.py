@@ -0,0 +1,111 @@
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+CacheKey = Tuple[str, str, Optional[int]]
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivial variants share a key."""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", query.lower())).strip()
+
+
+class ResponseCache:
+    """LRU + TTL cache of complete model responses, kept as their streamed chunks.
+
+    Keys are (intent, normalized query, snapshot version). Entries for gas
+    queries carry the snapshot version they were generated from and are
+    dropped as soon as a newer version is seen; other entries (version None)
+    only expire by TTL. The cache is bounded by entry count and by the total
+    size of the cached text.
+    """
+
+    def __init__(self, ttl: float = None, max_entries: int = None, max_bytes: int = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+        self.max_entries = max_entries or int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+        self.max_bytes = max_bytes or int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+        self._entries: "OrderedDict[CacheKey, Tuple[float, int, List[str]]]" = OrderedDict()
+        self._bytes = 0
+        self._version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def make_key(self, query: str, intent: str, version: Optional[int] = None) -> CacheKey:
+        return (intent, normalize_query(query), version)
+
+    def get(self, key: CacheKey) -> Optional[List[str]]:
+        """Return the cached chunks for key, or None."""
+        if not self.enabled:
+            return None
+        self._observe_version(key[2])
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, key: CacheKey, chunks: List[str]):
+        """Cache a complete response."""
+        if not self.enabled:
+            return
+        self._observe_version(key[2])
+        if key[2] is not None and key[2] != self._version:
+            return  # Generated from a snapshot that has since been replaced
+        size = sum(len(chunk) for chunk in chunks) + len(key[1])
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, chunks)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _observe_version(self, version: Optional[int]):
+        """Drop entries generated from older snapshots once a newer one is seen."""
+        if version is None or (self._version is not None and version <= self._version):
+            return
+        self._version = version
+        stale = [key for key in self._entries if key[2] is not None and key[2] < version]
+        for key in stale:
+            self._remove(key)
+        if stale:
+            logger.debug("Invalidated %d cached responses for snapshot v%d", len(stale), version)
+
+    def _remove(self, key: CacheKey):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes
+        }
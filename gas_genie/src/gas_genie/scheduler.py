@@ -0,0 +1,240 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lower values are admitted first
+PRIORITY_HIGH = 0     # Cheap requests and callers blocked with nothing to serve
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2      # Background work that can wait
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted to an upstream within its queue deadline."""
+
+    def __init__(self, upstream: str, retry_after: float, reason: str):
+        super().__init__(f"{upstream} is overloaded ({reason}), retry after {retry_after:.0f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills rate tokens per second up to burst."""
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        now = time.monotonic()
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def drain(self, seconds: float):
+        """Withhold tokens for roughly seconds, e.g. after the upstream reported a rate limit."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class Slot:
+    """A held admission; release() is idempotent."""
+    __slots__ = ("_upstream", "_released")
+
+    def __init__(self, upstream: "UpstreamScheduler"):
+        self._upstream = upstream
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._upstream._release()
+
+
+class UpstreamScheduler:
+    """Admission control for one upstream.
+
+    Requests are admitted when a concurrency slot is free and the token
+    bucket (if any) has a token. Otherwise they wait in a bounded priority
+    queue; a request that is still queued after queue_timeout, or that
+    arrives to a full queue, is rejected with Overloaded so the caller can
+    shed it early instead of timing out later. A higher-priority arrival to
+    a full queue displaces the newest request of the lowest priority.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        max_queue: int = 100,
+        queue_timeout: float = 2.0
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst or max(1.0, rate)) if rate else None
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.admitted = 0
+        self.rejected = 0
+
+    def _ready(self) -> float:
+        """0 if a request can be admitted now, else seconds to wait (inf when only a release helps)."""
+        if self.max_concurrency is not None and self.active >= self.max_concurrency:
+            return math.inf
+        return self.bucket.delay() if self.bucket is not None else 0.0
+
+    def _admit_now(self) -> Slot:
+        self.active += 1
+        self.admitted += 1
+        if self.bucket is not None:
+            self.bucket.take()
+        return Slot(self)
+
+    def _retry_after(self) -> float:
+        if self.bucket is not None:
+            return max(1.0, math.ceil(len(self._waiters) / self.bucket.rate))
+        return max(1.0, math.ceil(self.queue_timeout))
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL, timeout: Optional[float] = None) -> Slot:
+        """Wait for admission and return the held Slot; raises Overloaded."""
+        if not self._waiters and self._ready() == 0:
+            return self._admit_now()
+        if len(self._waiters) >= self.max_queue:
+            self._evict_for(priority)
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        self._dispatch()
+        try:
+            return await asyncio.wait_for(waiter, self.queue_timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(self.name, self._retry_after(), "queue deadline exceeded") from None
+        except BaseException:
+            # Cancelled just as we were admitted: hand the slot back
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                waiter.result().release()
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            self._dispatch()
+
+    def try_acquire(self) -> Optional[Slot]:
+        """A Slot if one can be had without queueing, else None (for optional extra work)."""
+        if not self._waiters and self._ready() == 0:
+            return self._admit_now()
+        return None
+
+    def _evict_for(self, priority: int):
+        """Make room in a full queue for priority by shedding the newest lowest-priority waiter."""
+        self._waiters = [entry for entry in self._waiters if not entry[2].done()]
+        heapq.heapify(self._waiters)
+        if len(self._waiters) < self.max_queue:
+            return
+        worst = max(self._waiters, key=lambda entry: (entry[0], entry[1]))
+        self.rejected += 1
+        if worst[0] <= priority:
+            raise Overloaded(self.name, self._retry_after(), "queue full")
+        self._waiters.remove(worst)
+        heapq.heapify(self._waiters)
+        worst[2].set_exception(Overloaded(self.name, self._retry_after(), "shed for a higher priority request"))
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_NORMAL, timeout: Optional[float] = None) -> AsyncIterator[Slot]:
+        held = await self.acquire(priority, timeout)
+        try:
+            yield held
+        finally:
+            held.release()
+
+    def _release(self):
+        self.active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit queued requests in priority order while capacity allows."""
+        while self._waiters:
+            if self._waiters[0][2].done():  # Timed out or cancelled
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._ready()
+            if wait == math.inf:
+                return  # A release will call us again
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(wait, self._on_timer)
+                return
+            _, _, waiter = heapq.heappop(self._waiters)
+            waiter.set_result(self._admit_now())
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def backoff(self, seconds: float):
+        """Stop admitting for about seconds after the upstream itself rate limited us."""
+        if self.bucket is not None:
+            self.bucket.drain(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": sum(1 for _, _, waiter in self._waiters if not waiter.done()),
+            "admitted": self.admitted,
+            "rejected": self.rejected
+        }
+
+
+class Scheduler:
+    """The admission controllers for every upstream, shared by the providers."""
+
+    def __init__(self, upstreams: Optional[Dict[str, UpstreamScheduler]] = None):
+        self.upstreams = upstreams if upstreams is not None else {
+            # Etherscan's free tier allows about 5 calls per second
+            "etherscan": UpstreamScheduler(
+                "etherscan",
+                rate=float(os.getenv("ETHERSCAN_RATE_LIMIT", "5")),
+                max_concurrency=int(os.getenv("ETHERSCAN_MAX_CONNECTIONS", "10")),
+                max_queue=int(os.getenv("ETHERSCAN_MAX_QUEUE", "20")),
+                queue_timeout=float(os.getenv("ETHERSCAN_QUEUE_TIMEOUT", "2"))
+            ),
+            # Fireworks limits concurrent streams and requests per minute per account
+            "fireworks": UpstreamScheduler(
+                "fireworks",
+                rate=float(os.getenv("FIREWORKS_RPM", "600")) / 60,
+                burst=float(os.getenv("FIREWORKS_BURST", "20")),
+                max_concurrency=int(os.getenv("FIREWORKS_MAX_CONCURRENCY", "32")),
+                max_queue=int(os.getenv("FIREWORKS_MAX_QUEUE", "100")),
+                queue_timeout=float(os.getenv("FIREWORKS_QUEUE_TIMEOUT", "2"))
+            ),
+        }
+
+    def __getitem__(self, name: str) -> UpstreamScheduler:
+        return self.upstreams[name]
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: upstream.stats() for name, upstream in self.upstreams.items()}
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Set
+
+from .broadcast import StreamInterrupted
+from .providers.flush_policy import FlushPolicy, get_flush_policy
+from .providers.gas_price_provider import GasPriceProvider
+from .recommendation import Recommendation
+from .scheduler import Overloaded
+from .sse import encode_json
+from .timing import RequestTimer, log_access
+
+logger = logging.getLogger(__name__)
+
+# WebSocket close codes
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_POLICY_VIOLATION = 1008
+
+
+def gas_view(recommendation: Recommendation) -> Dict[str, Any]:
+    """The compact, flat gas state pushed to sessions (deltas are a subset of its keys)."""
+    prices = recommendation.current_prices
+    trend = recommendation.price_trend or {}
+    return {
+        "version": recommendation.version,
+        "block": prices.get("last_block"),
+        "safe": prices.get("safe"),
+        "propose": prices.get("propose"),
+        "fast": prices.get("fast"),
+        "base_fee": recommendation.base_fee,
+        "congestion": recommendation.congestion_level,
+        "trend": trend.get("trend"),
+        "trend_change": trend.get("change_percentage"),
+        "suggestion": recommendation.suggestion,
+        "recommended_price": recommendation.recommended_price,
+        "confidence": recommendation.confidence
+    }
+
+
+class GasUpdates:
+    """Pushes gas snapshot changes to every connected session of this worker.
+
+    One watcher task per worker checks the snapshot version every
+    check_interval seconds while any session is connected, so connected
+    clients keep the gas poller awake. On a new version the changed fields
+    are encoded once and handed to every session; a session that connects
+    later gets the full state.
+    """
+
+    def __init__(self, gas_provider: GasPriceProvider, check_interval: float = None):
+        self.gas_provider = gas_provider
+        self.check_interval = check_interval or float(os.getenv("WS_GAS_CHECK_INTERVAL", "0.5"))
+        self.sessions: Set["Session"] = set()
+        self.current: Optional[Dict[str, Any]] = None
+        self._frame: Optional[bytes] = None  # self.current as a "gas" event
+        self._watcher: Optional[asyncio.Task] = None
+        self.pushed = 0
+
+    def register(self, session: "Session"):
+        self.sessions.add(session)
+        if self.current is not None:
+            session.push_gas("gas", self.current, self._frame)
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch())
+
+    def unregister(self, session: "Session"):
+        self.sessions.discard(session)
+
+    async def _watch(self):
+        while self.sessions:
+            try:
+                snapshot = await self.gas_provider.get_snapshot()
+                if self.current is None or snapshot.version != self.current["version"]:
+                    self._advance(gas_view(self.gas_provider.get_recommendation(snapshot)))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Could not check for gas updates: {str(e)}")
+            await asyncio.sleep(self.check_interval)
+
+    def _advance(self, view: Dict[str, Any]):
+        previous = self.current
+        self.current = view
+        self._frame = encode_json({"type": "gas", "content": view})
+        if previous is None:
+            kind, content, frame = "gas", view, self._frame
+        else:
+            content = {key: value for key, value in view.items() if previous.get(key) != value}
+            kind = "gas_delta"
+            frame = encode_json({"type": kind, "content": content})
+        for session in self.sessions:
+            session.push_gas(kind, content, frame)
+        self.pushed += 1
+
+    async def close(self):
+        if self._watcher is not None and not self._watcher.done():
+            self._watcher.cancel()
+            await asyncio.wait((self._watcher,))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.sessions),
+            "version": self.current["version"] if self.current is not None else None,
+            "pushed": self.pushed
+        }
+
+
+class _Outgoing:
+    """One queued server event; frame is its encoding, or None once it has been merged into."""
+    __slots__ = ("kind", "turn", "content", "frame")
+
+    def __init__(self, kind: str, turn: Optional[str], content: Any, frame: Optional[bytes] = None):
+        self.kind = kind
+        self.turn = turn
+        self.content = content
+        self.frame = frame
+
+    def encode(self) -> str:
+        frame = self.frame
+        if frame is None:
+            event = {"type": self.kind, "content": self.content}
+            if self.turn is not None:
+                event["id"] = self.turn
+            frame = encode_json(event)
+        return frame.decode()
+
+
+class Session:
+    """One WebSocket client: multiplexed chat turns plus pushed gas updates.
+
+    Outgoing events wait in an outbox drained by a writer task that only
+    exists while there is something to send, so an idle session costs its
+    receive loop and little else. A slow client makes the outbox coalesce
+    rather than grow: pending gas updates merge into one, and consecutive
+    chunks of a turn merge into one message. Once max_pending_bytes of chat
+    text is waiting, turns pause until the client catches up, and a client
+    that does not accept a frame within send_timeout is disconnected.
+    """
+    __slots__ = (
+        "websocket", "agent", "updates", "flush", "max_turns", "max_pending_bytes",
+        "send_timeout", "turns", "_outbox", "_gas", "_pending_bytes", "_writer", "_drained", "_closed"
+    )
+
+    def __init__(self, websocket, agent, updates: GasUpdates, flush: FlushPolicy = None):
+        self.websocket = websocket
+        self.agent = agent
+        self.updates = updates
+        self.flush = flush or get_flush_policy(os.getenv("ASSIST_FLUSH_POLICY"))
+        self.max_turns = int(os.getenv("WS_MAX_TURNS", "4"))
+        self.max_pending_bytes = int(os.getenv("WS_MAX_PENDING_BYTES", str(64 * 1024)))
+        self.send_timeout = float(os.getenv("WS_SEND_TIMEOUT", "30"))
+        self.turns: Dict[str, asyncio.Task] = {}
+        self._outbox: Deque[_Outgoing] = deque()
+        self._gas: Optional[_Outgoing] = None  # The unsent gas event, if any
+        self._pending_bytes = 0
+        self._writer: Optional[asyncio.Task] = None
+        self._drained: Optional[asyncio.Event] = None
+        self._closed = False
+
+    async def serve(self):
+        """Run the session until the client disconnects."""
+        self.updates.register(self)
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                self._handle(message.get("text") or message.get("bytes"))
+        finally:
+            self._closed = True
+            self.updates.unregister(self)
+            for task in list(self.turns.values()):
+                task.cancel()
+            pending = list(self.turns.values())
+            if self._writer is not None:
+                self._writer.cancel()
+                pending.append(self._writer)
+            if pending:
+                await asyncio.wait(pending)
+
+    def _handle(self, text):
+        """Dispatch one client message: {"type": "assist", "id", "prompt"[, "flush"]} or {"type": "cancel", "id"}."""
+        try:
+            request = json.loads(text)
+            kind = request.get("type")
+            turn = str(request.get("id", ""))
+        except (TypeError, ValueError, AttributeError):
+            self._send("error", None, "Messages must be JSON objects")
+            return
+        if kind == "cancel":
+            task = self.turns.get(turn)
+            if task is not None:
+                task.cancel()
+            return
+        if kind != "assist":
+            self._send("error", turn or None, f"Unknown message type: {kind}")
+            return
+        if not turn or not request.get("prompt"):
+            self._send("error", turn or None, "assist needs an id and a prompt")
+            return
+        if turn in self.turns:
+            self._send("error", turn, "A turn with this id is still running")
+            return
+        if len(self.turns) >= self.max_turns:
+            self._send("error", turn, f"At most {self.max_turns} turns may run at once")
+            return
+        flush = request.get("flush")
+        if flush is not None and not isinstance(flush, str):
+            self._send("error", turn, "flush must be a policy name")
+            return
+        try:
+            flush = get_flush_policy(flush) if flush else self.flush
+        except ValueError as e:
+            self._send("error", turn, str(e))
+            return
+        task = asyncio.create_task(self._turn(turn, request["prompt"], flush))
+        self.turns[turn] = task
+        task.add_done_callback(lambda _, turn=turn: self.turns.pop(turn, None))
+
+    async def _turn(self, turn: str, prompt: str, flush: FlushPolicy):
+        timer = RequestTimer()
+        status = "ok"
+        try:
+            try:
+                stream = await self.agent.open_assist(prompt, turn, flush=flush, timer=timer)
+            except Overloaded as e:
+                status = "overloaded"
+                self._send("error", turn, str(e))
+                return
+            try:
+                async for chunk in stream:
+                    if chunk:
+                        await self._wait_for_room()
+                        self._send("message", turn, chunk)
+            finally:
+                await stream.aclose()
+            self._send("done", turn, "")
+        except StreamInterrupted as e:
+            status = "error"
+            self._send("error", turn, str(e))
+        except asyncio.CancelledError:
+            status = "cancelled"
+            if not self._closed:
+                self._send("done", turn, "cancelled")
+            raise
+        finally:
+            log_access(timer, route="/ws", query_id=turn, status=status)
+
+    async def _wait_for_room(self):
+        while self._pending_bytes >= self.max_pending_bytes and not self._closed:
+            if self._drained is None:
+                self._drained = asyncio.Event()
+            await self._drained.wait()
+
+    def _send(self, kind: str, turn: Optional[str], content: Any):
+        if self._closed:
+            return
+        last = self._outbox[-1] if self._outbox else None
+        if kind == "message":
+            self._pending_bytes += len(content)
+            if last is not None and last.kind == "message" and last.turn == turn:
+                last.content += content
+                return
+        self._outbox.append(_Outgoing(kind, turn, content))
+        self._start_writer()
+
+    def push_gas(self, kind: str, content: Dict[str, Any], frame: bytes):
+        """Queue a gas event; one still unsent absorbs it instead."""
+        if self._closed:
+            return
+        pending = self._gas
+        if pending is not None:
+            pending.content = {**pending.content, **content}
+            pending.frame = None
+            return
+        self._gas = _Outgoing(kind, None, content, frame)
+        self._outbox.append(self._gas)
+        self._start_writer()
+
+    def _start_writer(self):
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write())
+
+    async def _write(self):
+        try:
+            while self._outbox:
+                outgoing = self._outbox.popleft()
+                if outgoing is self._gas:
+                    self._gas = None
+                elif outgoing.kind == "message":
+                    self._pending_bytes -= len(outgoing.content)
+                    if self._drained is not None and self._pending_bytes < self.max_pending_bytes:
+                        self._drained.set()
+                        self._drained = None
+                await asyncio.wait_for(self.websocket.send_text(outgoing.encode()), self.send_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Closing a WebSocket session that accepted nothing for {self.send_timeout:.0f}s")
+            await self._abort(CLOSE_POLICY_VIOLATION)
+        except Exception:
+            await self._abort(None)  # Disconnected; serve() sees it next
+        finally:
+            self._writer = None
+
+    async def _abort(self, code: Optional[int]):
+        self._closed = True
+        self._outbox.clear()
+        if self._drained is not None:
+            self._drained.set()
+        for task in list(self.turns.values()):
+            task.cancel()
+        if code is not None:
+            try:
+                await asyncio.wait_for(self.websocket.close(code), 1)
+            except Exception:
+                pass
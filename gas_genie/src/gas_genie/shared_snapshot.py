@@ -0,0 +1,125 @@
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Region layout: a 64-byte header followed by the payload.
+#   0  magic      8s
+#   8  sequence   u64  odd while the leader is writing
+#   16 length     u32  payload bytes
+#   24 accessed   f64  time.time() a worker last served gas data
+MAGIC = b"GGSNAP01"
+HEADER_SIZE = 64
+_MAGIC = struct.Struct("<8s")
+_SEQUENCE = struct.Struct("<Q")
+_LENGTH = struct.Struct("<I")
+_ACCESSED = struct.Struct("<d")
+SEQUENCE_OFFSET = 8
+LENGTH_OFFSET = 16
+ACCESSED_OFFSET = 24
+
+
+class SharedSnapshot:
+    """A gas snapshot shared by the worker processes on one host.
+
+    One process at a time holds an exclusive lock on leader.lock in
+    directory; that process fetches gas data and publishes it into an
+    mmap-backed region file, which every worker reads without locking. The
+    region is a seqlock: the leader makes the sequence odd, writes the
+    payload, then makes it even again, and a reader retries if the sequence
+    was odd or changed while it copied the payload. The operating system
+    releases the lock when the leader exits, so another worker can take
+    over with try_lead().
+    """
+
+    def __init__(self, directory: str, size: int = None):
+        if fcntl is None:
+            raise RuntimeError("Shared gas snapshots need fcntl (Linux or macOS)")
+        self.directory = directory
+        self.size = size or int(os.getenv("GAS_SHARED_REGION_BYTES", str(64 * 1024)))
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "gas_snapshot.bin")
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < HEADER_SIZE + self.size:
+                os.ftruncate(fd, HEADER_SIZE + self.size)
+            self._map = mmap.mmap(fd, HEADER_SIZE + self.size)
+        finally:
+            os.close(fd)
+        if self._map[:len(MAGIC)] != MAGIC:
+            _MAGIC.pack_into(self._map, 0, MAGIC)
+        self._lock_fd: Optional[int] = None
+        self._last_touch = 0.0
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_fd is not None
+
+    def try_lead(self) -> bool:
+        """Become the leader if no other process is; True if this process leads."""
+        if self._lock_fd is not None:
+            return True
+        fd = os.open(os.path.join(self.directory, "leader.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        logger.info(f"Process {os.getpid()} is now the gas data leader")
+        return True
+
+    def sequence(self) -> int:
+        """The current sequence number; it changes whenever a snapshot is published."""
+        return _SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0]
+
+    def publish(self, payload: bytes):
+        """Write payload as the current snapshot (leader only)."""
+        if not self.is_leader:
+            raise RuntimeError("Only the leader can publish gas snapshots")
+        if len(payload) > self.size:
+            raise ValueError(f"Gas snapshot of {len(payload)} bytes exceeds the {self.size}-byte shared region")
+        # | 1 also recovers a sequence left odd by a leader that died mid-write
+        sequence = self.sequence() | 1
+        _SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, sequence)
+        _LENGTH.pack_into(self._map, LENGTH_OFFSET, len(payload))
+        self._map[HEADER_SIZE:HEADER_SIZE + len(payload)] = payload
+        _SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, sequence + 1)
+
+    def read(self, attempts: int = 100) -> Optional[Tuple[int, bytes]]:
+        """(sequence, payload) of a consistent copy, or None if nothing has been published yet."""
+        for _ in range(attempts):
+            before = self.sequence()
+            if before & 1:
+                continue  # Write in progress
+            length = _LENGTH.unpack_from(self._map, LENGTH_OFFSET)[0]
+            payload = self._map[HEADER_SIZE:HEADER_SIZE + min(length, self.size)]
+            if self.sequence() == before:
+                return (before, payload) if before else None
+        return None
+
+    def touch(self, interval: float = 1.0):
+        """Record that this worker served gas data, at most once per interval seconds."""
+        now = time.time()
+        if now - self._last_touch >= interval:
+            self._last_touch = now
+            _ACCESSED.pack_into(self._map, ACCESSED_OFFSET, now)
+
+    def last_access(self) -> float:
+        """time.time() at which any worker last served gas data."""
+        return _ACCESSED.unpack_from(self._map, ACCESSED_OFFSET)[0]
+
+    def close(self):
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # Releases the lock for another worker
+            self._lock_fd = None
+        self._map.close()
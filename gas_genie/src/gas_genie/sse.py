@@ -0,0 +1,197 @@
+import asyncio
+import os
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+try:
+    import orjson
+
+    def encode_json(value: Any) -> bytes:
+        return orjson.dumps(value)
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    import json
+
+    def encode_json(value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+# Every event is {"type": ..., "content": ...}; the envelope around the
+# content is encoded once, so a frame costs one string encode and a join.
+_FRAME_PREFIX = {
+    event_type: b'data: {"type":"' + event_type.encode() + b'","content":'
+    for event_type in ("message", "error", "timing", "done")
+}
+_FRAME_SUFFIX = b"}\n\n"
+DONE_FRAME = _FRAME_PREFIX["done"] + b'""' + _FRAME_SUFFIX
+
+
+def encode_event(event_type: str, content: Any) -> bytes:
+    """Encode one SSE data frame; content is any JSON-serializable value."""
+    prefix = _FRAME_PREFIX.get(event_type)
+    if prefix is None:
+        prefix = b'data: {"type":' + encode_json(event_type) + b',"content":'
+    return b"".join((prefix, encode_json(content), _FRAME_SUFFIX))
+
+
+def encode_item_event(item_id: str, event_type: str, content: Any) -> bytes:
+    """Encode one SSE data frame of a batch response, tagged with the item's id."""
+    prefix = _FRAME_PREFIX.get(event_type)
+    if prefix is None:
+        prefix = b'data: {"type":' + encode_json(event_type) + b',"content":'
+    return b"".join((b'data: {"id":', encode_json(item_id), b",", prefix[7:], encode_json(content), _FRAME_SUFFIX))
+
+
+class _ChunkPump:
+    """Reads a chunk stream in its own task into a buffer the consumer drains."""
+
+    def __init__(self, source: AsyncIterator[str], max_bytes: int):
+        self.buffer = []
+        self.size = 0
+        self.max_bytes = max_bytes
+        self.done = False
+        self.error: Optional[Exception] = None
+        self._loop = asyncio.get_running_loop()
+        self._waiter: Optional[asyncio.Future] = None
+        self.task = asyncio.ensure_future(self._run(source))
+
+    async def _run(self, source: AsyncIterator[str]):
+        try:
+            async for chunk in source:
+                self.buffer.append(chunk)
+                self.size += len(chunk)
+                # Wake the consumer for the first held chunk and when the cap is reached
+                if len(self.buffer) == 1 or self.size >= self.max_bytes:
+                    self._wake()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._wake()
+            if hasattr(source, "aclose"):
+                await source.aclose()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def wait(self, deadline: Optional[float] = None):
+        """Wait until woken by the reader, or until the loop time deadline."""
+        self._waiter = self._loop.create_future()
+        timer = self._loop.call_at(deadline, self._wake) if deadline is not None else None
+        try:
+            await self._waiter
+        finally:
+            self._waiter = None
+            if timer is not None:
+                timer.cancel()
+
+    def take(self) -> str:
+        text = "".join(self.buffer)
+        self.buffer.clear()
+        self.size = 0
+        return text
+
+
+async def coalesce(
+    source: AsyncIterator[str],
+    flush_interval: float = None,
+    max_bytes: int = None
+) -> AsyncIterator[str]:
+    """Merge small chunks from source into fewer, larger ones.
+
+    The first chunk is passed through immediately so time to first byte is
+    unchanged. After that, chunks are held until flush_interval seconds have
+    passed since the oldest held chunk or max_bytes are buffered, whichever
+    comes first. An interval of 0 disables coalescing.
+
+    The source is read from a helper task, so it must not be tied to the
+    consumer's task. Model streams reach here through a StreamBroadcast
+    subscription, whose producer runs in its own task.
+    """
+    flush_interval = flush_interval if flush_interval is not None else float(os.getenv("SSE_FLUSH_INTERVAL", "0.02"))
+    max_bytes = max_bytes or int(os.getenv("SSE_FLUSH_BYTES", "512"))
+    if flush_interval <= 0:
+        try:
+            async for chunk in source:
+                yield chunk
+        finally:
+            if hasattr(source, "aclose"):
+                await source.aclose()
+        return
+
+    loop = asyncio.get_running_loop()
+    pump = _ChunkPump(source, max_bytes)
+    first = True
+    try:
+        while True:
+            if not pump.buffer and not pump.done:
+                await pump.wait()
+            if pump.buffer and not first and not pump.done and pump.size < max_bytes:
+                await pump.wait(loop.time() + flush_interval)
+            if pump.buffer:
+                first = False
+                yield pump.take()
+            elif pump.done:
+                if pump.error is not None:
+                    raise pump.error
+                return
+    finally:
+        if not pump.task.done():
+            pump.task.cancel()
+            await asyncio.wait((pump.task,))
+
+
+async def sse_frames(
+    source: AsyncIterator[str],
+    trailer: Optional[Callable[[], Optional[bytes]]] = None,
+    **coalesce_options
+) -> AsyncIterator[bytes]:
+    """Encode a chunk stream as SSE message frames, ending with an error and/or done frame.
+
+    trailer, if given, is called once the stream ends and may return a frame
+    to send just before done.
+    """
+    stream = coalesce(source, **coalesce_options)
+    try:
+        async for chunk in stream:
+            if chunk:
+                yield encode_event("message", chunk)
+    except Exception as e:
+        yield encode_event("error", str(e))
+    finally:
+        await stream.aclose()
+    if trailer is not None:
+        frame = trailer()
+        if frame:
+            yield frame
+    yield DONE_FRAME
+
+
+async def batch_sse_frames(
+    source: AsyncIterator[List[Tuple[str, Optional[str]]]],
+    trailer: Optional[Callable[[str], Optional[bytes]]] = None
+) -> AsyncIterator[bytes]:
+    """Encode interleaved (item id, chunk) events as id-tagged SSE frames.
+
+    Each item's messages end with its own done frame (chunk None marks the
+    end), and the stream ends with an untagged done frame. The events ready
+    at the same time are sent as one write. trailer, if given, is called with
+    an item's id when it ends and may return a frame to send before its done.
+    """
+    try:
+        async for ready in source:
+            frames = []
+            for item_id, chunk in ready:
+                if chunk is None:
+                    if trailer is not None:
+                        frame = trailer(item_id)
+                        if frame:
+                            frames.append(frame)
+                    frames.append(encode_item_event(item_id, "done", ""))
+                elif chunk:
+                    frames.append(encode_item_event(item_id, "message", chunk))
+            yield b"".join(frames)
+    except Exception as e:
+        yield encode_event("error", str(e))
+    finally:
+        if hasattr(source, "aclose"):
+            await source.aclose()
+    yield DONE_FRAME
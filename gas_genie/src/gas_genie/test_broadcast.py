@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+from src.gas_genie.broadcast import InflightStreams, StreamInterrupted
+from src.gas_genie.sse import sse_frames
+
+
+async def slow_answer(release: asyncio.Event):
+    yield "a "
+    await release.wait()
+    yield "b"
+
+
+async def join_then_leave():
+    """A client that joined but has not started reading must keep the generation alive."""
+    inflight = InflightStreams()
+    release = asyncio.Event()
+    first = inflight.subscribe("key", lambda: slow_answer(release))
+    assert await first.__anext__() == "a "
+    joiner = inflight.subscribe("key", lambda: slow_answer(release))
+    assert inflight.stats()["joined"] == 1
+    await first.aclose()  # The only reading client leaves
+    await asyncio.sleep(0)
+    release.set()
+    return [chunk async for chunk in joiner]
+
+
+def test_joiner_keeps_generation_alive():
+    assert asyncio.run(join_then_leave()) == ["a ", "b"]
+
+
+async def interrupted_frames():
+    """An upstream cancelled under a subscriber ends its SSE stream with an error event."""
+    inflight = InflightStreams()
+    release = asyncio.Event()
+    subscription = inflight.subscribe("key", lambda: slow_answer(release))
+    broadcast = subscription.broadcast
+    frames = []
+    async for frame in sse_frames(subscription, flush_interval=0):
+        frames.append(json.loads(frame.decode()[len("data: "):]))
+        if len(frames) == 1:
+            broadcast._task.cancel()
+    return frames
+
+
+def test_interrupted_stream_is_an_error_event():
+    frames = asyncio.run(interrupted_frames())
+    assert [frame["type"] for frame in frames] == ["message", "error", "done"]
+    assert frames[0]["content"] == "a "
+    assert frames[1]["content"] == str(StreamInterrupted("The answer was interrupted before it finished"))
+
+
+if __name__ == "__main__":
+    test_joiner_keeps_generation_alive()
+    test_interrupted_stream_is_an_error_event()
+    print("ok")
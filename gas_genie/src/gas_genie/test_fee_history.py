@@ -0,0 +1,56 @@
+from src.gas_genie.providers.fee_history_provider import FeeHistoryProvider
+from src.gas_genie.providers.gas_price_provider import sample_from_gas_oracle
+from src.gas_genie.recommendation import recommend
+
+GWEI = 10**9
+FIRST_BLOCK = 100
+# Per block, oldest first: base fee, 10th/50th/90th percentile tips (gwei) and gas used ratio
+BLOCKS = [
+    (20, (1, 2, 3), 0.20),
+    (21, (1, 2, 3), 0.40),
+    (22, (1, 2, 4), 0.60),
+    (23, (1, 3, 5), 0.80),
+    (24, (2, 3, 6), 0.95),
+]
+NEXT_BASE_FEE = 25
+ANALYTICS = {"trend": {"trend": "stable", "change_percentage": 0.0}}
+
+
+def rpc_sample():
+    """The newest block's sample as the rpc backend builds it from eth_feeHistory."""
+    history = {
+        "oldestBlock": hex(FIRST_BLOCK),
+        "baseFeePerGas": [hex(base * GWEI) for base, _, _ in BLOCKS] + [hex(NEXT_BASE_FEE * GWEI)],
+        "gasUsedRatio": [ratio for _, _, ratio in BLOCKS],
+        "reward": [[hex(tip * GWEI) for tip in tips] for _, tips, _ in BLOCKS],
+    }
+    last = FIRST_BLOCK + len(BLOCKS) - 1
+    provider = FeeHistoryProvider(rpc_url="http://rpc.invalid")
+    return provider._samples_from_history(FIRST_BLOCK, last, history, {})[-1]
+
+
+def etherscan_sample():
+    """The same newest block as Etherscan's gas oracle reports it."""
+    base, tips, _ = BLOCKS[-1]
+    return sample_from_gas_oracle({
+        "LastBlock": str(FIRST_BLOCK + len(BLOCKS) - 1),
+        "SafeGasPrice": str(base + tips[0]),
+        "ProposeGasPrice": str(base + tips[1]),
+        "FastGasPrice": str(base + tips[2]),
+        "suggestBaseFee": str(NEXT_BASE_FEE),
+        "gasUsedRatio": ",".join(str(ratio) for _, _, ratio in reversed(BLOCKS)),
+    })
+
+
+def test_backends_agree_on_the_recommendation():
+    rpc = recommend(1, rpc_sample(), ANALYTICS).to_dict()
+    etherscan = recommend(1, etherscan_sample(), ANALYTICS).to_dict()
+    assert rpc["network_metrics"] == etherscan["network_metrics"]
+    assert rpc["network_metrics"]["gas_used_ratio"] == BLOCKS[-1][2]
+    for field in ("recommended_price", "confidence", "suggestion"):
+        assert rpc[field] == etherscan[field], field
+
+
+if __name__ == "__main__":
+    test_backends_agree_on_the_recommendation()
+    print("ok")
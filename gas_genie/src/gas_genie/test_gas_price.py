@@ -16,6 +16,7 @@ load_dotenv()
 logger.debug("Environment variables loaded")
 
 async def test_gas_price_provider():
+    provider = None
     try:
         # Initialize the provider with explicit API key
         api_key = os.getenv("ETHERSCAN_API_KEY")
@@ -24,7 +25,8 @@ async def test_gas_price_provider():
             raise Exception("ETHERSCAN_API_KEY not found in environment variables")
         
         logger.debug("Initializing GasPriceProvider...")    
-        provider = GasPriceProvider(api_key=api_key)
+        # Disable the snapshot cache so every call below hits Etherscan
+        provider = GasPriceProvider(api_key=api_key, cache_ttl=0, stale_ttl=0)
         
         # Test 1: Current gas prices
         print("\n=== Test 1: Current Gas Prices ===")
@@ -42,10 +44,9 @@ async def test_gas_price_provider():
         # Test 2: Price trend analysis
         print("\n=== Test 2: Price Trend Analysis ===")
         logger.info("Analyzing price trends...")
-        # Add a few data points to test trend analysis
+        # Add a few data points to test trend analysis (each fetch is recorded in history)
         for _ in range(2):
-            prices = await provider.get_current_gas_prices()
-            provider.price_history.append(prices)
+            await provider.get_current_gas_prices()
             await asyncio.sleep(1)  # Wait a bit between fetches
             
         trend_analysis = provider._analyze_price_trend()
@@ -88,6 +89,10 @@ async def test_gas_price_provider():
     except Exception as e:
         logger.error(f"Error during test: {str(e)}", exc_info=True)
         print(f"An error occurred: {str(e)}")
+    finally:
+        # The provider pools one HTTP session; close it as the app's lifespan does
+        if provider is not None:
+            await provider.close()
 
 if __name__ == "__main__":
     asyncio.run(test_gas_price_provider()) 
\ No newline at end of file
@@ -0,0 +1,73 @@
+import json
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+
+access_logger = logging.getLogger("gas_genie.access")
+
+# Stages of an /assist request, in the order they normally happen
+STAGES = (
+    "parse", "classify", "gas_snapshot", "prompt_render",
+    "upstream_connect", "first_token", "last_token"
+)
+
+_current_timer: ContextVar[Optional["RequestTimer"]] = ContextVar("request_timer", default=None)
+
+
+class RequestTimer:
+    """Monotonic timestamps for the stages of one request.
+
+    Each stage keeps the first time it is marked, so a stage can be marked
+    both where it is known precisely (the model stream) and where it is seen
+    by this request (a joined or cached answer) without double counting.
+    """
+    __slots__ = ("start", "marks", "info")
+
+    def __init__(self, start: float = None):
+        self.start = start if start is not None else time.perf_counter()
+        self.marks: Dict[str, float] = {}
+        self.info: Dict[str, Any] = {}
+
+    def mark(self, stage: str):
+        if stage not in self.marks:
+            self.marks[stage] = time.perf_counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Milliseconds from the start of the request to each recorded stage."""
+        stages = {
+            stage: round((self.marks[stage] - self.start) * 1000, 3)
+            for stage in STAGES if stage in self.marks
+        }
+        return {**self.info, "stages_ms": stages, "total_ms": round((time.perf_counter() - self.start) * 1000, 3)}
+
+
+class StartupProfile:
+    """Milliseconds from the start of the app import to each startup milestone."""
+    __slots__ = ("start", "marks")
+
+    def __init__(self, start: float = None):
+        self.start = start if start is not None else time.perf_counter()
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, milestone: str):
+        self.marks[milestone] = round((time.perf_counter() - self.start) * 1000, 3)
+
+    def to_dict(self) -> Dict[str, float]:
+        return dict(self.marks)
+
+
+def current_timer() -> Optional[RequestTimer]:
+    """The timer bound to the running task by bind_timer, if any."""
+    return _current_timer.get()
+
+
+def bind_timer(timer: Optional[RequestTimer]):
+    """Make timer visible to code running later in this task, such as HTTP client hooks."""
+    _current_timer.set(timer)
+
+
+def log_access(timer: RequestTimer, **fields):
+    """Write one structured access log line with the request's stage timings."""
+    if access_logger.isEnabledFor(logging.INFO):
+        access_logger.info(json.dumps({**fields, **timer.to_dict()}, separators=(",", ":")))